@@ -0,0 +1,226 @@
+# audio_bus.py
+from threading import Condition, Lock
+
+import numpy as np
+import speech_recognition as sr
+
+from tracing import traced
+
+
+class AudioCaptureBus:
+    """Single microphone stream written into a preallocated ring buffer
+
+    Sample positions are absolute (total samples captured since start), so
+    every consumer keeps its own cursor and reads numpy views of the buffer
+    without copying. Ambient noise is measured once here and shared.
+    """
+
+    def __init__(self, sample_rate=16000, chunk_size=480, capacity_seconds=30):
+        self.sample_rate = sample_rate
+        self.sample_width = 2  # int16
+        self.chunk_size = chunk_size
+        self.capacity = int(sample_rate * capacity_seconds)
+        self.buffer = np.zeros(self.capacity, dtype=np.int16)
+
+        self.written = 0
+        self.condition = Condition()
+        self.noise_rms = None
+
+        self.audio = None
+        self.stream = None
+        self.running = False
+
+    def start(self):
+        """Open the microphone once; safe to call repeatedly"""
+        if self.running:
+            return
+        import pyaudio
+
+        print("[DEBUG] Opening shared microphone stream...")
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._on_audio,
+        )
+        self.running = True
+        self.stream.start_stream()
+
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        import pyaudio
+
+        self.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, pyaudio.paContinue)
+
+    def write(self, samples):
+        """Append samples to the ring buffer and wake up waiting readers"""
+        samples = samples[-self.capacity :]
+        count = len(samples)
+        start = self.written % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start : start + first] = samples[:first]
+        if first < count:
+            self.buffer[: count - first] = samples[first:]
+
+        with self.condition:
+            self.written += count
+            self.condition.notify_all()
+
+    def views(self, start, end):
+        """Return zero-copy views covering absolute samples [start, end)"""
+        if end <= start:
+            return []
+        if end - start > self.capacity:
+            start = end - self.capacity
+        begin, finish = start % self.capacity, end % self.capacity
+        if begin < finish:
+            return [self.buffer[begin:finish]]
+        return [self.buffer[begin:], self.buffer[:finish]]
+
+    def wait_for(self, position, timeout=None):
+        """Block until the stream has written past position; True on success"""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.written >= position or not self.running, timeout
+            ) and self.written >= position
+
+    def reader(self, from_now=True):
+        """Create a consumer cursor at the live position (or oldest sample)"""
+        position = self.written if from_now else max(0, self.written - self.capacity)
+        return AudioReader(self, position)
+
+    @traced("calibration")
+    def calibrate(self, duration=0.5):
+        """Measure ambient noise once for every consumer of this stream"""
+        if self.noise_rms is not None:
+            return self.noise_rms
+        print("[DEBUG] Measuring ambient noise on shared stream...")
+        reader = self.reader()
+        samples = reader.read_array(
+            int(self.sample_rate * duration), timeout=duration + 1
+        )
+        self.noise_rms = rms(samples) if len(samples) else 0.0
+        print(f"[DEBUG] Ambient noise RMS: {round(self.noise_rms, 1)}")
+        return self.noise_rms
+
+    def calibrate_recognizer(self, recognizer):
+        """Set a recognizer's energy threshold from the shared noise estimate
+
+        Replaces per-consumer `adjust_for_ambient_noise` calls, which would
+        each block on the microphone for another second.
+        """
+        noise_rms = self.calibrate()
+        recognizer.energy_threshold = max(
+            noise_rms * recognizer.dynamic_energy_ratio, 50
+        )
+        return recognizer.energy_threshold
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+
+class AudioReader:
+    """Independent read cursor on an AudioCaptureBus"""
+
+    def __init__(self, bus, position):
+        self.bus = bus
+        self.position = position
+        self.overruns = 0
+
+    def available(self):
+        return self.bus.written - self.position
+
+    def read_views(self, count, timeout=None):
+        """Return views over the next `count` samples, waiting for them to arrive"""
+        if not self.bus.wait_for(self.position + count, timeout):
+            count = self.available()
+
+        # Skip ahead if we fell further behind than the buffer holds
+        oldest = self.bus.written - self.bus.capacity
+        if self.position < oldest:
+            self.overruns += 1
+            self.position = oldest
+
+        views = self.bus.views(self.position, self.position + count)
+        self.position += sum(len(view) for view in views)
+        return views
+
+    def read_array(self, count, timeout=None):
+        """Like read_views, but joined into one array (copies only on wrap-around)"""
+        views = self.read_views(count, timeout)
+        if len(views) == 1:
+            return views[0]
+        if not views:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(views)
+
+    def read_bytes(self, count, timeout=None):
+        """Raw little-endian int16 bytes, for speech_recognition AudioData"""
+        return b"".join(view.tobytes() for view in self.read_views(count, timeout))
+
+
+class BusAudioSource(sr.AudioSource):
+    """speech_recognition AudioSource that reads from the shared capture bus
+
+    Lets `Recognizer.listen` run on the shared stream instead of opening its
+    own `sr.Microphone`.
+    """
+
+    def __init__(self, bus, from_now=True):
+        self.bus = bus
+        self.SAMPLE_RATE = bus.sample_rate
+        self.SAMPLE_WIDTH = bus.sample_width
+        self.CHUNK = bus.chunk_size
+        self.from_now = from_now
+        self.stream = None
+
+    def __enter__(self):
+        self.bus.start()
+        self.stream = _ReaderStream(self.bus.reader(self.from_now))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+
+class _ReaderStream:
+    """File-like wrapper speech_recognition expects on AudioSource.stream"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def read(self, size):
+        return self.reader.read_bytes(size, timeout=1.0)
+
+
+def rms(samples):
+    """Root-mean-square level of int16 samples, same scale as audioop.rms"""
+    if len(samples) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+
+_shared_bus = None
+_shared_lock = Lock()
+
+
+def get_audio_bus():
+    """Return the process-wide capture bus, starting it on first use"""
+    global _shared_bus
+    with _shared_lock:
+        if _shared_bus is None:
+            _shared_bus = AudioCaptureBus()
+        _shared_bus.start()
+    return _shared_bus
@@ -0,0 +1,94 @@
+# audio_player.py
+from threading import Event, Lock
+
+# PortAudio's values for pyaudio.paInt16, paContinue and paComplete, so only
+# start() needs pyaudio and only when it has to create the PyAudio instance
+PA_INT16 = 8
+PA_CONTINUE = 0
+PA_COMPLETE = 1
+
+
+class PCMPlayer:
+    """Plays 16-bit mono PCM from memory as it arrives
+
+    Bytes are appended with feed() while the output stream is already running,
+    so playback starts with the first chunk. `done` is set by the audio
+    callback once finish() was called and everything has been played.
+    """
+
+    def __init__(self, sample_rate=24000, frames_per_buffer=1024, audio=None):
+        self.sample_rate = sample_rate
+        self.frames_per_buffer = frames_per_buffer
+        self.audio = audio
+        # A PyAudio instance created by start() is ours to terminate
+        self.owns_audio = False
+        self.buffer = bytearray()
+        self.lock = Lock()
+        self.finished = False
+        self.started = Event()
+        self.done = Event()
+        self.stream = None
+
+    def start(self):
+        if self.audio is None:
+            import pyaudio
+
+            self.audio = pyaudio.PyAudio()
+            self.owns_audio = True
+        self.stream = self.audio.open(
+            format=PA_INT16,
+            channels=1,
+            rate=self.sample_rate,
+            output=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._on_output,
+        )
+        self.stream.start_stream()
+        return self
+
+    def _on_output(self, in_data, frame_count, time_info, status):
+        size = frame_count * 2
+        with self.lock:
+            chunk = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            finished = self.finished and not self.buffer
+
+        if chunk:
+            self.started.set()
+        if finished:
+            self.done.set()
+            return (chunk.ljust(size, b"\0"), PA_COMPLETE)
+        # Underrun: pad with silence and keep the stream alive for more data
+        return (chunk.ljust(size, b"\0"), PA_CONTINUE)
+
+    def feed(self, data):
+        with self.lock:
+            self.buffer.extend(data)
+
+    def buffered_seconds(self):
+        with self.lock:
+            return len(self.buffer) / (2 * self.sample_rate)
+
+    def finish(self):
+        """No more data will be fed; done fires after the buffer drains"""
+        with self.lock:
+            # Keep whole samples only
+            if len(self.buffer) % 2:
+                del self.buffer[-1]
+            self.finished = True
+
+    def wait(self, timeout=None):
+        """Block until playback completes, then release the stream"""
+        completed = self.done.wait(timeout)
+        self.close()
+        return completed
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.owns_audio:
+            self.audio.terminate()
+            self.audio = None
+            self.owns_audio = False
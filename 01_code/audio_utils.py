@@ -0,0 +1,20 @@
+# audio_utils.py
+import io
+import wave
+
+import numpy as np
+
+
+def decode_audio(body, sample_rate=None):
+    """Return (int16 samples, sample_rate) from a WAV file or raw mono PCM"""
+    if body[:4] == b"RIFF":
+        with wave.open(io.BytesIO(body)) as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError("WAV audio must be 16-bit")
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            if wav.getnchannels() > 1:
+                samples = samples[:: wav.getnchannels()]
+            return samples, wav.getframerate()
+    if not sample_rate:
+        raise ValueError("Raw PCM needs a sample_rate query parameter")
+    return np.frombuffer(body[: len(body) // 2 * 2], dtype=np.int16), int(sample_rate)
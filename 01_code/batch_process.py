@@ -0,0 +1,444 @@
+# batch_process.py
+#
+# Pre-generates replies and songs for a list of inputs in one process:
+#
+#   python batch_process.py campaign.jsonl --output results.jsonl
+#   python batch_process.py corpus_dir/ --output results.jsonl --wait-songs
+#
+# A JSONL input has one object per line with an optional "id", "image"
+# (face photo), "audio" (WAV) or "text", and optionally a fixed "mood".
+# Paths are relative to the JSONL file. A directory input groups files by
+# name: alice.jpg + alice.txt (or alice.wav) form item "alice".
+#
+# Results are appended to the output as each item finishes, so an
+# interrupted run picks up where it stopped when started again.
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from audio_utils import decode_audio
+from prompt_engineering import build_user_context, generate_music_details
+from session_brief import MUSIC_FIELDS
+from song_generator import build_description_prompt, generate_song_request
+from tracing import tracer
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+AUDIO_EXTENSIONS = (".wav",)
+TEXT_EXTENSIONS = (".txt",)
+
+# Fields an interrupted item keeps, so a resumed run does not pay for them twice
+RESUMABLE_FIELDS = (
+    "mood",
+    "mood_confidence",
+    "text",
+    "details",
+    "reply",
+    "work_id",
+    "audio_url",
+)
+
+# Emotion model state of one pool worker process, loaded by its initializer
+_engine = None
+_localizer = None
+
+
+def _init_emotion_worker(detector):
+    global _engine, _localizer
+    from emotion_engine import create_emotion_engine
+    from face_localizer import FaceLocalizer
+
+    _engine = create_emotion_engine()
+    # Photos are unrelated to each other, so there is nothing to track
+    _localizer = FaceLocalizer(detector=detector, track=False)
+
+
+def detect_image_mood(path):
+    """Mood and confidence of the largest face in an image; runs in a pool worker"""
+    import cv2
+
+    from mood_estimator import MoodAggregator
+
+    frame = cv2.imread(path)
+    if frame is None:
+        raise ValueError(f"Could not read image {path}")
+    faces = _localizer.locate(frame)
+    if not faces:
+        return None, 0.0
+    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+    aggregator = MoodAggregator(_engine.target_emotions)
+    aggregator.update(_engine.predict_batch([frame[y : y + h, x : x + w]])[0])
+    mood, confidence = aggregator.estimate()
+    return mood, round(confidence, 3)
+
+
+def load_items(source):
+    """Items from a JSONL file or a directory of same-named image/audio/text files"""
+    if os.path.isdir(source):
+        grouped = {}
+        for name in sorted(os.listdir(source)):
+            stem, extension = os.path.splitext(name)
+            extension = extension.lower()
+            path = os.path.join(source, name)
+            item = grouped.setdefault(stem, {"id": stem})
+            if extension in IMAGE_EXTENSIONS:
+                item["image"] = path
+            elif extension in AUDIO_EXTENSIONS:
+                item["audio"] = path
+            elif extension in TEXT_EXTENSIONS:
+                with open(path) as text_file:
+                    item["text"] = text_file.read().strip()
+        return [item for item in grouped.values() if len(item) > 1]
+
+    items = []
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source) as source_file:
+        for line_number, line in enumerate(source_file, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(line_number))
+            item["id"] = str(item["id"])
+            for key in ("image", "audio"):
+                if item.get(key):
+                    item[key] = os.path.join(base_dir, item[key])
+            items.append(item)
+    return items
+
+
+def load_checkpoint(path):
+    """Latest result per item ID from an existing output file"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as output_file:
+        for line in output_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short when the previous run was killed
+                continue
+            records[str(record.get("id"))] = record
+    return records
+
+
+class BatchProcessor:
+    """Runs many items concurrently with one limit per provider
+
+    Emotion detection runs in a process pool whose workers load the model
+    once. Blocking provider calls run on a thread pool, each behind an
+    asyncio semaphore for its provider (openai, udio, stt). Music details
+    and the reply are requested at the same time; the song is submitted as
+    soon as the details arrive. Every finished item, and every submitted
+    song, is appended to the output file straight away.
+    """
+
+    def __init__(
+        self,
+        open_ai_key,
+        udio_key,
+        output,
+        limits=None,
+        emotion_workers=2,
+        max_in_flight=32,
+        detector="haar",
+        reply=True,
+        song=True,
+        wait_songs=False,
+        stt_backend=None,
+    ):
+        self.open_ai_key = open_ai_key
+        self.udio_key = udio_key
+        self.output = output
+        self.limits = {"openai": 8, "udio": 4, "stt": 4, **(limits or {})}
+        self.emotion_workers = emotion_workers
+        self.max_in_flight = max_in_flight
+        self.detector = detector
+        self.reply = reply
+        self.song = song
+        self.wait_songs = wait_songs
+        self.stt_backend = stt_backend
+
+        self.loop = None
+        self.semaphores = {}
+        self.io_executor = None
+        self.emotion_pool = None
+        self.ttr = None
+        self.songs = None
+        self.output_file = None
+        self.total = 0
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+
+    def is_complete(self, record):
+        """Has everything this run asks for; other items are (re)processed"""
+        if record.get("status") != "done":
+            return False
+        needed = []
+        if self.reply:
+            needed.append("reply")
+        if self.song:
+            needed.append("work_id")
+            if self.wait_songs:
+                # Songs submitted by an earlier run without waiting are collected now
+                needed.append("audio_url")
+        return all(record.get(field) for field in needed)
+
+    async def call(self, provider, function, *args):
+        """Run a blocking call on the I/O pool within its provider's limit"""
+        async with self.semaphores[provider]:
+            return await self.loop.run_in_executor(
+                self.io_executor, functools.partial(function, *args)
+            )
+
+    def write(self, record):
+        self.output_file.write(json.dumps(record) + "\n")
+        self.output_file.flush()
+
+    async def detect_mood(self, item):
+        if item.get("mood"):
+            return item["mood"], None
+        if not item.get("image"):
+            return "neutral", None
+        try:
+            mood, confidence = await self.loop.run_in_executor(
+                self.emotion_pool, detect_image_mood, item["image"]
+            )
+        except Exception as e:
+            # Like the live pipeline, a failed mood read is not fatal
+            print(f"[DEBUG] Mood detection failed for {item['id']}: {e!r}")
+            return "neutral", None
+        return mood or "neutral", confidence
+
+    async def transcribe(self, item):
+        if item.get("text"):
+            return item["text"]
+        if not item.get("audio"):
+            return None
+        with open(item["audio"], "rb") as audio_file:
+            samples, sample_rate = decode_audio(audio_file.read())
+        return await self.call("stt", self.stt_backend.recognize, samples, sample_rate)
+
+    async def make_reply(self, result):
+        reply = await self.call("openai", self.ttr.get_gpt_response, result["text"])
+        if not reply:
+            raise ValueError("Could not generate GPT response")
+        result["reply"] = reply
+
+    async def make_song(self, result):
+        if "details" not in result:
+            details = await self.call(
+                "openai",
+                generate_music_details,
+                build_user_context(result["mood"], result["text"]),
+                self.open_ai_key,
+                result["mood"],
+                result["text"],
+            )
+            if not all(details):
+                raise ValueError("Failed to generate music details")
+            result["details"] = dict(zip(MUSIC_FIELDS, details))
+
+        if "work_id" not in result:
+            details = [result["details"][field] for field in MUSIC_FIELDS]
+            work_id = await self.call(
+                "udio",
+                generate_song_request,
+                self.udio_key,
+                details[0],
+                build_description_prompt(*details),
+            )
+            if not work_id:
+                raise ValueError("Failed to initiate song generation")
+            result["work_id"] = work_id
+            # Checkpoint: a resumed run waits for this job instead of paying again
+            self.write({**result, "status": "pending"})
+
+        if self.wait_songs and not result.get("audio_url"):
+            audio_url = await self.songs.track(result["work_id"])
+            if not audio_url:
+                # The job failed or expired; a rerun submits the song again
+                del result["work_id"]
+                raise ValueError("Song generation did not complete")
+            result["audio_url"] = audio_url
+
+    async def process(self, item, previous, slots):
+        async with slots:
+            result = {"id": item["id"], "status": "failed"}
+            result.update(
+                {key: previous[key] for key in RESUMABLE_FIELDS if key in previous}
+            )
+            start_time = time.perf_counter()
+            try:
+                if "mood" not in result:
+                    result["mood"], result["mood_confidence"] = await self.detect_mood(
+                        item
+                    )
+                if not result.get("text"):
+                    result["text"] = await self.transcribe(item)
+                if not result["text"]:
+                    raise ValueError("Item has no text or recognizable audio")
+
+                tasks = []
+                if self.reply and "reply" not in result:
+                    tasks.append(self.make_reply(result))
+                if self.song:
+                    tasks.append(self.make_song(result))
+                for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                result["status"] = "done"
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["seconds"] = round(time.perf_counter() - start_time, 3)
+            self.write(result)
+
+            self.counts[result["status"]] += 1
+            finished = self.counts["done"] + self.counts["failed"]
+            print(
+                f"[DEBUG] Item {item['id']} {result['status']} "
+                f"({finished}/{self.total}, {result['seconds']}s)"
+                + (f": {result['error']}" if "error" in result else "")
+            )
+
+    async def run(self, items):
+        """Process every item not already done; returns the outcome counts"""
+        from song_job_manager import SongJobManager
+        from text_to_response import TextToResponse
+
+        checkpoint = load_checkpoint(self.output)
+        todo = [
+            item
+            for item in items
+            if not self.is_complete(checkpoint.get(item["id"], {}))
+        ]
+        self.counts["skipped"] = len(items) - len(todo)
+        self.total = len(todo)
+        if self.counts["skipped"]:
+            print(f"[DEBUG] Resuming: {self.counts['skipped']} items already done")
+
+        self.loop = asyncio.get_running_loop()
+        self.semaphores = {
+            provider: asyncio.Semaphore(limit)
+            for provider, limit in self.limits.items()
+        }
+        self.io_executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()))
+        if any(item.get("image") and not item.get("mood") for item in todo):
+            # Spawned workers each load the model once, away from this process's threads
+            self.emotion_pool = ProcessPoolExecutor(
+                max_workers=self.emotion_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_emotion_worker,
+                initargs=(self.detector,),
+            )
+        if any(item.get("audio") and not item.get("text") for item in todo):
+            from streaming_stt import GoogleBackend
+
+            self.stt_backend = self.stt_backend or GoogleBackend()
+        if self.reply:
+            self.ttr = TextToResponse()
+        if self.song and self.wait_songs:
+            self.songs = SongJobManager(self.udio_key)
+            await self.songs.start()
+
+        slots = asyncio.Semaphore(self.max_in_flight)
+        try:
+            with open(self.output, "a") as self.output_file:
+                await asyncio.gather(
+                    *(
+                        self.process(item, checkpoint.get(item["id"], {}), slots)
+                        for item in todo
+                    )
+                )
+        finally:
+            if self.songs:
+                await self.songs.stop()
+            if self.emotion_pool:
+                self.emotion_pool.shutdown()
+            self.io_executor.shutdown(wait=False)
+        return self.counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate replies and songs for many inputs"
+    )
+    parser.add_argument("source", help="JSONL file or directory of inputs")
+    parser.add_argument(
+        "--output",
+        default="batch_results.jsonl",
+        help="results JSONL, also the checkpoint",
+    )
+    parser.add_argument(
+        "--fresh", action="store_true", help="ignore earlier results in --output"
+    )
+    parser.add_argument("--openai-concurrency", type=int, default=8)
+    parser.add_argument("--udio-concurrency", type=int, default=4)
+    parser.add_argument("--stt-concurrency", type=int, default=4)
+    parser.add_argument(
+        "--emotion-workers", type=int, default=min(4, os.cpu_count() or 1)
+    )
+    parser.add_argument(
+        "--max-in-flight", type=int, default=32, help="items processed at once"
+    )
+    parser.add_argument(
+        "--no-reply", action="store_true", help="skip the spoken-reply text"
+    )
+    parser.add_argument(
+        "--no-song", action="store_true", help="skip music details and songs"
+    )
+    parser.add_argument(
+        "--wait-songs",
+        action="store_true",
+        help="wait for audio URLs, not just work IDs",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from config import OPENAI_API_KEY, UDIO_KEY, require_keys
+
+    options = parse_args(argv)
+    require_keys()
+    items = load_items(options.source)
+    if options.fresh and os.path.exists(options.output):
+        os.remove(options.output)
+    print(f"[DEBUG] {len(items)} items from {options.source}")
+
+    processor = BatchProcessor(
+        OPENAI_API_KEY,
+        UDIO_KEY,
+        options.output,
+        limits={
+            "openai": options.openai_concurrency,
+            "udio": options.udio_concurrency,
+            "stt": options.stt_concurrency,
+        },
+        emotion_workers=options.emotion_workers,
+        max_in_flight=options.max_in_flight,
+        detector=os.getenv("FACE_DETECTOR", "haar"),
+        reply=not options.no_reply,
+        song=not options.no_song,
+        wait_songs=options.wait_songs,
+    )
+    start_time = time.perf_counter()
+    try:
+        counts = asyncio.run(processor.run(items))
+    except KeyboardInterrupt:
+        print("\nBatch interrupted; run the same command again to resume")
+        return 1
+    print(
+        f"Batch finished in {round(time.perf_counter() - start_time, 1)}s: "
+        f"{counts['done']} done, {counts['failed']} failed, "
+        f"{counts['skipped']} already done"
+    )
+    tracer.print_summary()
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,599 @@
+# benchmark.py
+#
+# Offline end-to-end benchmark of the speech-to-song pipeline. Runs the real
+# stage graph from main.py against local stand-ins for OpenAI and Udio, a
+# synthetic microphone and a virtual speaker, so results are reproducible:
+#
+#   python benchmark.py --sessions 4 --rounds 3 --save-baseline bench_baseline.json
+#   python benchmark.py --sessions 4 --rounds 3 --baseline bench_baseline.json
+#
+# The second command exits with status 1 if any metric regressed.
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+from latency_model import LatencyModel
+from openai_stub_server import OpenAIStubServer, wav_bytes
+from udio_stub_server import UdioStubServer
+
+# pyaudio.paContinue; any other flag returned by a callback ends the stream
+PA_CONTINUE = 0
+
+TRANSCRIPT = [
+    "I had such a long day at work today",
+    "but my manager finally praised the project I have been building",
+    "so now I just want to relax and celebrate a little",
+]
+
+# Per-session metrics, in seconds from the moment the user stopped speaking
+METRICS = ("ttfa", "song_ready", "song_first_audio", "end_to_end")
+
+
+class VirtualAudioDevice:
+    """Stand-in for a pyaudio.PyAudio output device
+
+    Streams opened on it call their callback on a clock thread, `speed`
+    times faster than real time, and note when the first non-silent
+    buffer was played.
+    """
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.lock = Lock()
+        self.first_sound = None
+        self.frames_played = 0
+
+    def open(self, rate, frames_per_buffer=1024, stream_callback=None, **kwargs):
+        return VirtualOutputStream(self, rate, frames_per_buffer, stream_callback)
+
+    def played(self, data, frame_count):
+        with self.lock:
+            self.frames_played += frame_count
+            if self.first_sound is None and data.count(0) != len(data):
+                self.first_sound = time.perf_counter()
+
+    def terminate(self):
+        pass
+
+
+class VirtualOutputStream:
+    def __init__(self, device, rate, frames_per_buffer, callback):
+        self.device = device
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.stopped = Event()
+        self.thread = None
+
+    def start_stream(self):
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        period = self.frames_per_buffer / self.rate / self.device.speed
+        next_time = time.perf_counter()
+        while not self.stopped.is_set():
+            data, flag = self.callback(None, self.frames_per_buffer, None, 0)
+            self.device.played(data, self.frames_per_buffer)
+            if flag != PA_CONTINUE:
+                break
+            next_time += period
+            self.stopped.wait(max(0.0, next_time - time.perf_counter()))
+
+    def is_active(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop_stream(self):
+        self.stopped.set()
+
+    def close(self):
+        self.stopped.set()
+
+
+def synthetic_speech(
+    sample_rate=16000, phrases=3, phrase_seconds=1.4, gap_seconds=0.6, seed=0
+):
+    """Voiced phrases separated by pauses
+
+    Each phrase is a harmonic series under a syllable envelope.
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for _ in range(phrases):
+        t = np.arange(int(sample_rate * phrase_seconds)) / sample_rate
+        pitch = 120 + 60 * rng.random()
+        voiced = sum(np.sin(2 * math.pi * pitch * k * t) / k for k in range(1, 6))
+        syllables = 0.55 + 0.45 * np.sin(2 * math.pi * 4 * t)  # ~4 syllables/s
+        parts.append(2500 * voiced * syllables)
+        parts.append(np.zeros(int(sample_rate * gap_seconds)))
+    return np.concatenate(parts[:-1])
+
+
+class SyntheticMicrophone:
+    """Writes speech into an AudioCaptureBus in real time, over background noise
+
+    The bus is never started, so no device is opened; it is marked running
+    here so readers wait for samples as they would on a live stream. `speech_end` is the
+    perf_counter time at which the last speech sample was written: the
+    moment the user stopped talking.
+    """
+
+    def __init__(self, audio_bus, speech, lead_in=1.5, noise_rms=40, seed=0):
+        self.audio_bus = audio_bus
+        lead = np.zeros(int(audio_bus.sample_rate * lead_in))
+        self.signal = np.concatenate([lead, speech])
+        self.noise_rms = noise_rms
+        self.rng = np.random.default_rng(seed)
+        self.speech_end = None
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        self.audio_bus.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        chunk_size = self.audio_bus.chunk_size
+        period = chunk_size / self.audio_bus.sample_rate
+        position = 0
+        next_time = time.perf_counter()
+        while not self.stopped.is_set():
+            samples = self.rng.normal(0, self.noise_rms, chunk_size)
+            speech = self.signal[position : position + chunk_size]
+            samples[: len(speech)] += speech
+            self.audio_bus.write(np.clip(samples, -32768, 32767).astype(np.int16))
+            position += chunk_size
+            if self.speech_end is None and position >= len(self.signal):
+                self.speech_end = time.perf_counter()
+            next_time += period
+            self.stopped.wait(max(0.0, next_time - time.perf_counter()))
+
+    def stop(self):
+        self.stopped.set()
+
+
+class FixedMoodDetector:
+    """Mood stand-in for runs without a camera model: one mood after `delay`"""
+
+    def __init__(self, mood="happy", delay=0.5, stop_event=None):
+        self.mood = mood
+        self.delay = delay
+        self.stop_process = stop_event or Event()
+
+    def get_mood(self):
+        self.stop_process.wait(self.delay)
+        return self.mood
+
+    def close(self):
+        pass
+
+
+def load_vision_detector(audio_bus, stop_event, options):
+    """The real SimpleMoodDetector on synthetic or file face images"""
+    from frame_source import create_frame_source
+    from libcam_cv import SimpleMoodDetector
+
+    if options.faces:
+        frame_source = create_frame_source("file", paths=options.faces)
+    else:
+        frame_source = create_frame_source("synthetic", fps=options.camera_fps)
+    return SimpleMoodDetector(
+        frame_source=frame_source, audio_bus=audio_bus, stop_event=stop_event
+    )
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "p50": round(values[int(0.5 * (len(values) - 1))], 4),
+        "p90": round(values[int(0.9 * (len(values) - 1))], 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def start_stand_ins(options):
+    """Start both stub servers and point every client at them"""
+    openai_stub = OpenAIStubServer(
+        first_token=LatencyModel.parse(options.llm_latency, failure_status=500),
+        token_interval=options.token_interval,
+        reply_sentences=options.reply_sentences,
+        tts_first_byte=LatencyModel.parse(options.tts_latency, failure_status=500),
+        tts_speed=options.tts_speed,
+    ).start()
+    song_pcm = (
+        3000
+        * np.sin(
+            2 * math.pi * 330 * np.arange(int(44100 * options.song_seconds)) / 44100
+        )
+    ).astype("<i2")
+    udio_stub = UdioStubServer(
+        generation_model=LatencyModel.parse(options.udio_generation),
+        request_latency=LatencyModel.parse(options.udio_latency),
+        failure_rate=options.udio_feed_failures,
+        audio_bytes=wav_bytes(song_pcm.tobytes(), 44100),
+    ).start()
+
+    # Before any OpenAI client exists: the SDK reads these on construction
+    os.environ["OPENAI_BASE_URL"] = openai_stub.api_url
+    os.environ["OPENAI_API_KEY"] = "stand-in"
+    import http_client
+    import song_generator
+
+    http_client.OPENAI_API_URL = openai_stub.api_url
+    song_generator.UDIO_API_URL = udio_stub.api_url
+    return openai_stub, udio_stub
+
+
+def run_session(index, options, library_root, results):
+    """One full session through main.build_pipeline; appends its metrics"""
+    from audio_bus import AudioCaptureBus
+    from main import build_pipeline
+    from response_to_voice import ResponseToVoice
+    from sentence_pipeline import SentencePipeline
+    from session_brief import SessionBrief
+    from song_generator import SongJobTracker
+    from song_library import SongLibrary
+    from song_player import StreamingSongPlayer
+    from speculative_song import SpeculationStats, SpeculativeSong
+    from speech_to_text import SpeechToText
+    from startup import BackgroundLoader
+    from streaming_stt import StandInBackend, StreamingRecognizer
+    from text_to_response import TextToResponse
+    from tts_cache import TTSCache
+
+    audio_bus = AudioCaptureBus()
+    microphone = SyntheticMicrophone(
+        audio_bus,
+        synthetic_speech(audio_bus.sample_rate, phrases=len(TRANSCRIPT), seed=index),
+        lead_in=options.lead_in,
+        seed=index,
+    )
+    stop_mood_event = Event()
+    if options.vision:
+        mood_loader = BackgroundLoader(
+            "mood detector",
+            lambda: load_vision_detector(audio_bus, stop_mood_event, options),
+        )
+    else:
+        mood_loader = BackgroundLoader(
+            "mood detector",
+            lambda: FixedMoodDetector(
+                options.mood, options.mood_delay, stop_mood_event
+            ),
+        )
+    mood_loader.start()
+
+    stt = SpeechToText(audio_bus)
+    stt.streaming_recognizer = StreamingRecognizer(
+        audio_bus,
+        backend=StandInBackend(TRANSCRIPT, delay=options.stt_delay),
+        vad=stt.vad,
+    )
+    # A cold, memory-only TTS cache per session: real replies rarely repeat
+    reply_device = VirtualAudioDevice(options.playback_speed)
+    rtv = ResponseToVoice(cache=TTSCache(cache_dir=None))
+    rtv.audio = reply_device
+    song_device = VirtualAudioDevice(options.playback_speed)
+    song_tracker = SongJobTracker("stand-in")
+    speculator = None
+    if options.speculative:
+        speculator = SpeculativeSong(
+            song_tracker, "stand-in", stats=SpeculationStats(path=None)
+        )
+
+    graph = build_pipeline(
+        audio_bus,
+        stt,
+        TextToResponse(),
+        SentencePipeline(rtv),
+        mood_loader,
+        stop_mood_event,
+        song_tracker,
+        SongLibrary(root=library_root, policy=options.library_policy),
+        SessionBrief() if options.session_brief else None,
+        speculator,
+        song_player=StreamingSongPlayer(audio=song_device),
+    )
+    Thread(target=rtv.prewarm, daemon=True).start()
+    microphone.start()
+    try:
+        asyncio.run(graph.run())
+    finally:
+        microphone.stop()
+        stop_mood_event.set()
+        if mood_loader.ready():
+            mood_loader.get().close()
+        audio_bus.stop()
+
+    speech_end = microphone.speech_end
+    metrics = {
+        "session": index,
+        "ok": "playback" in graph.results and bool(song_device.first_sound),
+    }
+    if speech_end is not None:
+        if reply_device.first_sound:
+            metrics["ttfa"] = reply_device.first_sound - speech_end
+        if "song_poll" in graph.timings and graph.results.get("song_poll"):
+            metrics["song_ready"] = graph.timings["song_poll"][1] - speech_end
+        if song_device.first_sound:
+            metrics["song_first_audio"] = song_device.first_sound - speech_end
+        if metrics["ok"]:
+            metrics["end_to_end"] = graph.timings["playback"][1] - speech_end
+    metrics["critical_path"] = graph.critical_path()
+    results.append(metrics)
+
+
+def run_benchmark(options):
+    """Run every round of concurrent sessions and summarize them"""
+    from tracing import tracer
+
+    if shutil.which("ffmpeg") is None:
+        print("Warning: ffmpeg not found; songs cannot be decoded or played.")
+    openai_stub, udio_stub = start_stand_ins(options)
+    results = []
+    library_dir = tempfile.mkdtemp(prefix="bench_library_")
+    log = sys.stdout if options.verbose else open(os.devnull, "w")
+    wall_time = 0.0
+    try:
+        for round_index in range(options.rounds):
+            threads = [
+                Thread(
+                    target=run_session,
+                    args=(
+                        round_index * options.sessions + i,
+                        options,
+                        library_dir,
+                        results,
+                    ),
+                    daemon=True,
+                )
+                for i in range(options.sessions)
+            ]
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(log):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(options.session_timeout)
+            wall_time += time.perf_counter() - start_time
+            done = sum(1 for r in results if r["ok"])
+            print(
+                f"Round {round_index + 1}/{options.rounds}: "
+                f"{done}/{len(results)} sessions ok so far"
+            )
+    finally:
+        openai_stub.close()
+        udio_stub.close()
+        shutil.rmtree(library_dir, ignore_errors=True)
+        if log is not sys.stdout:
+            log.close()
+
+    total = options.sessions * options.rounds
+    completed = [r for r in results if r["ok"]]
+    stages = tracer.snapshot()["stages"]
+    return {
+        "config": {
+            key: value
+            for key, value in vars(options).items()
+            if key
+            not in (
+                "baseline",
+                "save_baseline",
+                "output",
+                "tolerance",
+                "slack",
+                "verbose",
+            )
+        },
+        "sessions": total,
+        "failure_rate": round(1 - len(completed) / total, 4) if total else 0.0,
+        "throughput_per_min": (
+            round(60 * len(completed) / wall_time, 3) if wall_time else 0.0
+        ),
+        "peak_rss_mb": peak_rss_mb(),
+        "metrics": {
+            metric: percentiles([r[metric] for r in results if metric in r])
+            for metric in METRICS
+        },
+        "stages": {
+            stage: {key: stats[key] for key in ("count", "errors", "p50", "p90", "max")}
+            for stage, stats in stages.items()
+        },
+        "requests": {"openai": openai_stub.requests, "udio": udio_stub.requests},
+    }
+
+
+def print_summary(summary):
+    print(
+        f"\n{summary['sessions']} sessions, failure rate {summary['failure_rate']}, "
+        f"{summary['throughput_per_min']} sessions/min, "
+        f"peak RSS {summary['peak_rss_mb']} MB"
+    )
+    print("Latency from end of speech (p50 / p90 / max seconds):")
+    for metric, stats in summary["metrics"].items():
+        if stats:
+            print(
+                f"  {metric:<18} {stats['p50']:8.3f} {stats['p90']:8.3f} "
+                f"{stats['max']:8.3f}"
+            )
+        else:
+            print(f"  {metric:<18} no data")
+    print("Stage latency (count, p50 / p90 / max seconds):")
+    for stage, stats in summary["stages"].items():
+        print(
+            f"  {stage:<28} {stats['count']:5d}  {stats['p50']:8.3f} "
+            f"{stats['p90']:8.3f} {stats['max']:8.3f}"
+        )
+
+
+def compare(baseline, summary, tolerance=0.2, slack=0.05, max_failure_increase=0.05):
+    """Regressions of summary against baseline, as readable strings
+
+    Latency percentiles may grow by `tolerance` (relative) plus `slack`
+    seconds; throughput may drop and peak RSS may grow by `tolerance`.
+    """
+    regressions = []
+    for metric, stats in summary["metrics"].items():
+        old = baseline.get("metrics", {}).get(metric, {})
+        for quantile in ("p50", "p90"):
+            if quantile not in stats or quantile not in old:
+                continue
+            limit = old[quantile] * (1 + tolerance) + slack
+            if stats[quantile] > limit:
+                regressions.append(
+                    f"{metric} {quantile}: {stats[quantile]:.3f}s > {limit:.3f}s "
+                    f"(baseline {old[quantile]:.3f}s)"
+                )
+
+    old_throughput = baseline.get("throughput_per_min")
+    if old_throughput and summary["throughput_per_min"] < old_throughput * (
+        1 - tolerance
+    ):
+        regressions.append(
+            f"throughput: {summary['throughput_per_min']}/min < "
+            f"{round(old_throughput * (1 - tolerance), 3)}/min "
+            f"(baseline {old_throughput}/min)"
+        )
+    old_rss = baseline.get("peak_rss_mb")
+    if old_rss and summary["peak_rss_mb"] > old_rss * (1 + tolerance):
+        regressions.append(
+            f"peak RSS: {summary['peak_rss_mb']} MB > "
+            f"{round(old_rss * (1 + tolerance), 1)} MB "
+            f"(baseline {old_rss} MB)"
+        )
+    old_failures = baseline.get("failure_rate", 0.0)
+    if summary["failure_rate"] > old_failures + max_failure_increase:
+        regressions.append(
+            f"failure rate: {summary['failure_rate']} > "
+            f"{old_failures} + {max_failure_increase}"
+        )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end pipeline benchmark"
+    )
+    parser.add_argument(
+        "--sessions", type=int, default=1, help="concurrent sessions per round"
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--session-timeout", type=float, default=300)
+    # Stand-in service behaviour; latency specs are
+    # distribution:mean[:jitter[:failure_rate]]
+    parser.add_argument(
+        "--llm-latency", default="lognormal:0.5:0.3", help="chat time to first token"
+    )
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--reply-sentences", type=int, default=8)
+    parser.add_argument(
+        "--tts-latency", default="lognormal:0.3:0.3", help="speech time to first byte"
+    )
+    parser.add_argument(
+        "--tts-speed", type=float, default=4.0, help="synthesis speed vs real time"
+    )
+    parser.add_argument(
+        "--udio-generation", default="uniform:8:2", help="song generation time"
+    )
+    parser.add_argument(
+        "--udio-latency", default="fixed:0.05", help="per-request Udio latency"
+    )
+    parser.add_argument("--udio-feed-failures", type=float, default=0.0)
+    parser.add_argument("--song-seconds", type=float, default=20)
+    # Devices and sources
+    parser.add_argument(
+        "--stt-delay",
+        type=float,
+        default=0.3,
+        help="stand-in recognition time per phrase",
+    )
+    parser.add_argument(
+        "--lead-in", type=float, default=1.5, help="seconds of room noise before speech"
+    )
+    parser.add_argument(
+        "--playback-speed",
+        type=float,
+        default=8.0,
+        help="virtual speaker speed vs real time",
+    )
+    parser.add_argument("--mood", default="happy")
+    parser.add_argument("--mood-delay", type=float, default=0.5)
+    parser.add_argument(
+        "--vision",
+        action="store_true",
+        help="run the real mood detector on synthetic faces",
+    )
+    parser.add_argument("--faces", help="directory of face images for --vision")
+    parser.add_argument("--camera-fps", type=float, default=15)
+    # Pipeline modes
+    parser.add_argument("--session-brief", action="store_true")
+    parser.add_argument("--speculative", action="store_true")
+    parser.add_argument("--library-policy", default="generate")
+    # Baselines
+    parser.add_argument(
+        "--baseline", help="compare against this summary; exit 1 on regression"
+    )
+    parser.add_argument(
+        "--save-baseline", help="write this run's summary as the new baseline"
+    )
+    parser.add_argument("--output", help="write this run's summary as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--slack", type=float, default=0.05, help="absolute latency slack in seconds"
+    )
+    parser.add_argument("--verbose", action="store_true", help="show pipeline logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    summary = run_benchmark(options)
+    print_summary(summary)
+
+    for path in (options.output, options.save_baseline):
+        if path:
+            with open(path, "w") as summary_file:
+                json.dump(summary, summary_file, indent=2)
+            print(f"Summary written to {path}")
+
+    if baseline is not None:
+        if baseline.get("config") != summary["config"]:
+            print("Warning: baseline was recorded with different settings.")
+        regressions = compare(baseline, summary, options.tolerance, options.slack)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# compare_emotion_backends.py
+#
+# Accuracy, latency and memory of each emotion backend on labelled faces:
+#
+#   python compare_emotion_backends.py fer_test/ --backends deepface tflite onnx
+#
+# The directory holds face crops in one folder per emotion label (angry,
+# disgust, fear, happy, sad, surprise, neutral), like the FER-2013 test set.
+# Each backend runs in its own process so its memory is measured alone.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS
+
+TARGET_EMOTIONS = ["happy", "sad", "angry", "neutral"]
+
+
+def rss_mb():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # No procfs (macOS): the peak is the best we have
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_faces(faces_dir, limit=None):
+    """(paths, labels) of the labelled face crops, in a stable order"""
+    paths, labels = [], []
+    for label in EMOTION_LABELS:
+        label_dir = os.path.join(faces_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        names = sorted(
+            name
+            for name in os.listdir(label_dir)
+            if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))
+        )
+        for name in names[:limit]:
+            paths.append(os.path.join(label_dir, name))
+            labels.append(label)
+    return paths, labels
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def measure_backend(backend, model_path, faces_dir, limit, batch_size):
+    """Load one backend and score every face; runs in a child process"""
+    import cv2
+
+    from emotion_engine import create_emotion_engine
+
+    faces, labels = [], []
+    for path, label in zip(*load_faces(faces_dir, limit)):
+        face = cv2.imread(path)
+        if face is not None:
+            faces.append(face)
+            labels.append(label)
+    if not faces:
+        raise ValueError(f"No readable images in {faces_dir}")
+
+    rss_before = rss_mb()
+    start_time = time.perf_counter()
+    engine = create_emotion_engine(
+        TARGET_EMOTIONS, backend=backend, model_path=model_path
+    )
+    load_seconds = time.perf_counter() - start_time
+    rss_loaded = rss_mb()
+
+    # One face per call, as in single-frame mood detection
+    latencies, scores = [], []
+    for face in faces:
+        start_time = time.perf_counter()
+        scores.append(engine.predict_batch([face])[0])
+        latencies.append(time.perf_counter() - start_time)
+
+    # Batched, as in burst mode and the batch command
+    start_time = time.perf_counter()
+    for i in range(0, len(faces), batch_size):
+        engine.predict_batch(faces[i : i + batch_size])
+    batched_seconds = time.perf_counter() - start_time
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_loaded_mb": round(rss_loaded, 1),
+        "rss_after_mb": round(rss_mb(), 1),
+        "model_mb": round(rss_loaded - rss_before, 1),
+        "latency_p50_ms": round(1000 * percentile(latencies, 0.5), 3),
+        "latency_p90_ms": round(1000 * percentile(latencies, 0.9), 3),
+        "batched_ms_per_face": round(1000 * batched_seconds / len(faces), 3),
+        "labels": labels,
+        "predictions": [EMOTION_LABELS[int(np.argmax(s))] for s in scores],
+        "moods": [engine.to_result(s)["mood"] for s in scores],
+    }
+
+
+def run_worker(backend, options):
+    """Measure one backend in a fresh interpreter and return its results"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+        result_path = result_file.name
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        options.faces_dir,
+        "--worker",
+        backend,
+        "--result",
+        result_path,
+        "--batch-size",
+        str(options.batch_size),
+    ]
+    if options.limit:
+        command += ["--limit", str(options.limit)]
+    model_path = getattr(options, f"{backend}_model", None)
+    if model_path:
+        command += ["--model", model_path]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            print(f"[DEBUG] Backend {backend} failed (exit {completed.returncode})")
+            return None
+        with open(result_path) as result_file:
+            return json.load(result_file)
+    finally:
+        os.remove(result_path)
+
+
+def summarize(results):
+    """Accuracy per backend, plus agreement with the DeepFace reference
+
+    Labels come from each worker, which skips images it could not read.
+    """
+    reference = next((r for r in results if r["backend"] == "deepface"), None)
+    for result in results:
+        predictions, moods = result.pop("predictions"), result.pop("moods")
+        labels = result.pop("labels")
+        folded = [label if label in TARGET_EMOTIONS else "neutral" for label in labels]
+        result["accuracy"] = round(
+            np.mean([p == l for p, l in zip(predictions, labels)]), 4
+        )
+        result["mood_accuracy"] = round(
+            np.mean([m == l for m, l in zip(moods, folded)]), 4
+        )
+        result["_predictions"] = predictions
+    if reference:
+        for result in results:
+            result["agreement_with_deepface"] = round(
+                np.mean(
+                    [
+                        a == b
+                        for a, b in zip(
+                            result["_predictions"], reference["_predictions"]
+                        )
+                    ]
+                ),
+                4,
+            )
+    for result in results:
+        del result["_predictions"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare emotion backends")
+    parser.add_argument("faces_dir", help="face crops in one folder per emotion label")
+    parser.add_argument("--backends", nargs="+", default=["deepface", "tflite", "onnx"])
+    parser.add_argument("--tflite-model", default="emotion_int8.tflite")
+    parser.add_argument("--onnx-model", default="emotion_int8.onnx")
+    parser.add_argument("--limit", type=int, help="faces per label")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--output", help="write the comparison as JSON")
+    # Internal: measure a single backend in this process
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.worker:
+        result = measure_backend(
+            options.worker,
+            options.model,
+            options.faces_dir,
+            options.limit,
+            options.batch_size,
+        )
+        with open(options.result, "w") as result_file:
+            json.dump(result, result_file)
+        return 0
+
+    _, labels = load_faces(options.faces_dir, options.limit)
+    if not labels:
+        print(f"No labelled faces found in {options.faces_dir}")
+        return 1
+    print(f"Comparing {', '.join(options.backends)} on {len(labels)} faces...")
+    results = [run_worker(backend, options) for backend in options.backends]
+    results = summarize([r for r in results if r])
+
+    print(
+        f"{'backend':<10} {'acc':>6} {'mood':>6} {'agree':>6} {'p50 ms':>8} "
+        f"{'p90 ms':>8} {'batch ms':>9} {'model MB':>9} {'RSS MB':>8} {'load s':>7}"
+    )
+    for r in results:
+        agreement = r.get("agreement_with_deepface")
+        print(
+            f"{r['backend']:<10} {r['accuracy']:6.3f} {r['mood_accuracy']:6.3f} "
+            f"{agreement if agreement is not None else '-':>6} "
+            f"{r['latency_p50_ms']:8.2f} "
+            f"{r['latency_p90_ms']:8.2f} {r['batched_ms_per_face']:9.2f} "
+            f"{r['model_mb']:9.1f} {r['rss_after_mb']:8.1f} {r['load_seconds']:7.2f}"
+        )
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump({"faces": len(labels), "results": results}, output_file, indent=2)
+        print(f"Comparison written to {options.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
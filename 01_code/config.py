@@ -8,6 +8,8 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 UDIO_KEY = os.getenv("UDIO_KEY")
 
-# You can raise an error if the key isn't found for security
-if OPENAI_API_KEY is None or UDIO_KEY is None:
-    raise ValueError("OpenAI/UDIO API key not found. Please set it in the .env file.")
\ No newline at end of file
+
+def require_keys():
+    """Raise if a key is missing; entry points call this instead of failing at import"""
+    if OPENAI_API_KEY is None or UDIO_KEY is None:
+        raise ValueError("OpenAI/UDIO API key not found. Please set it in the .env file.")
@@ -0,0 +1,131 @@
+# convert_emotion_model.py
+#
+# Converts DeepFace's emotion model to int8 TFLite and ONNX for the
+# lightweight emotion backends. Run it once on a development machine with
+# TensorFlow installed (plus tf2onnx and onnxruntime for ONNX), then copy the
+# model to the device and select it with EMOTION_BACKEND / EMOTION_MODEL_PATH:
+#
+#   python convert_emotion_model.py --faces calibration_faces/ --format tflite onnx
+#
+# Quantization is calibrated on face crops from --faces (a few hundred
+# cover it); random inputs are used if none are given, at some cost in
+# accuracy.
+import argparse
+import os
+
+import numpy as np
+
+from emotion_engine import load_deepface_emotion_model
+
+INPUT_SIZE = 48
+
+
+def load_calibration_faces(faces_dir, limit=300, seed=0):
+    """(N, 48, 48, 1) float32 batch of face crops
+
+    Scaled like EmotionEngine.preprocess.
+    """
+    import cv2
+
+    if not faces_dir:
+        print("[DEBUG] No calibration faces given; using random inputs")
+        rng = np.random.default_rng(seed)
+        return rng.random((100, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.float32)
+
+    paths = []
+    for root, _, names in os.walk(faces_dir):
+        paths += [
+            os.path.join(root, name)
+            for name in names
+            if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))
+        ]
+    np.random.default_rng(seed).shuffle(paths)
+    faces = []
+    for path in paths[:limit]:
+        face = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if face is not None:
+            face = cv2.resize(face, (INPUT_SIZE, INPUT_SIZE))
+            faces.append(face.astype(np.float32) / 255.0)
+    if not faces:
+        raise ValueError(f"No readable images in {faces_dir}")
+    print(f"[DEBUG] Calibrating on {len(faces)} faces")
+    return np.stack(faces)[..., np.newaxis]
+
+
+def convert_tflite(model, faces, output):
+    """Full-integer quantization: int8 weights, activations, input and output"""
+    import tensorflow as tf
+
+    def representative_dataset():
+        for face in faces:
+            yield [face[np.newaxis]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    with open(output, "wb") as model_file:
+        model_file.write(converter.convert())
+
+
+def convert_onnx(model, faces, output):
+    """Export to ONNX, then quantize statically to int8 in QDQ format"""
+    import tensorflow as tf
+    import tf2onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    float_path = output.replace(".onnx", "") + "_fp32.onnx"
+    spec = [tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 1), tf.float32, name="input")]
+    tf2onnx.convert.from_keras(
+        model, input_signature=spec, opset=13, output_path=float_path
+    )
+
+    class FaceReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(faces[i : i + 1] for i in range(len(faces)))
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {"input": batch}
+
+    quantize_static(
+        float_path,
+        output,
+        FaceReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+    )
+    os.remove(float_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the emotion model to int8")
+    parser.add_argument("--faces", help="directory of face crops for calibration")
+    parser.add_argument(
+        "--format", nargs="+", choices=["tflite", "onnx"], default=["tflite"]
+    )
+    parser.add_argument("--output-dir", default=".")
+    options = parser.parse_args()
+
+    model = load_deepface_emotion_model()
+    faces = load_calibration_faces(options.faces)
+    for model_format in options.format:
+        output = os.path.join(options.output_dir, f"emotion_int8.{model_format}")
+        if model_format == "tflite":
+            convert_tflite(model, faces, output)
+        else:
+            convert_onnx(model, faces, output)
+        size_kb = os.path.getsize(output) / 1024
+        print(f"Wrote {output} ({round(size_kb)} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# emotion_engine.py
+import os
+import time
+
+import numpy as np
+
+from tracing import traced
+
+
+# Output order of DeepFace's facial expression model
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+def load_deepface_emotion_model():
+    """Build DeepFace's emotion model and return the underlying Keras model"""
+    from deepface import DeepFace
+
+    try:
+        # deepface >= 0.0.90
+        client = DeepFace.build_model(task="facial_attribute", model_name="Emotion")
+    except TypeError:
+        client = DeepFace.build_model("Emotion")
+    return getattr(client, "model", client)
+
+
+class EmotionEngine:
+    """Keeps the emotion model in memory and scores face crops directly
+
+    Runs DeepFace's Keras model. Subclasses swap in a lighter runtime by
+    overriding load_model() and run_model(); preprocessing and the mapping
+    to moods are shared.
+    """
+
+    backend = "deepface"
+
+    def __init__(self, target_emotions=None, input_size=48, model_path=None):
+        print(f"[DEBUG] Loading emotion model ({self.backend})...")
+        start_time = time.time()
+        self.target_emotions = target_emotions or ["happy", "sad", "angry", "neutral"]
+        self.input_size = input_size
+        self.model_path = model_path
+        self.model = self.load_model()
+
+        # Run one dummy inference so graph setup isn't paid on the first user
+        self.predict_batch([np.zeros((input_size, input_size), dtype=np.uint8)])
+        print(
+            f"[DEBUG] Emotion model ready in {round(time.time() - start_time, 2)} seconds"
+        )
+
+    def load_model(self):
+        return load_deepface_emotion_model()
+
+    def run_model(self, batch):
+        """(N, 48, 48, 1) float32 in [0, 1] -> (N, 7) probabilities"""
+        return self.model.predict(batch, verbose=0)
+
+    def preprocess(self, face):
+        """Convert a BGR or gray face crop to the model's 48x48 gray input"""
+        import cv2
+
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        face = cv2.resize(face, (self.input_size, self.input_size))
+        return face.astype(np.float32) / 255.0
+
+    @traced("emotion_inference")
+    def predict_batch(self, faces):
+        """Return an (N, 7) array of emotion probabilities for N face crops"""
+        batch = np.stack([self.preprocess(face) for face in faces])[..., np.newaxis]
+        return np.asarray(self.run_model(batch), dtype=np.float32)
+
+    def to_result(self, scores):
+        """Build a DeepFace-style result dict from one probability vector"""
+        emotion = {label: float(score) for label, score in zip(EMOTION_LABELS, scores)}
+        dominant_emotion = max(emotion, key=emotion.get)
+
+        # Map to our target emotions, defaulting to neutral
+        if dominant_emotion in self.target_emotions:
+            mood = dominant_emotion
+        else:
+            mood = "neutral"
+        return {"emotion": emotion, "dominant_emotion": dominant_emotion, "mood": mood}
+
+    def analyze_faces(self, frame, faces):
+        """Score the face boxes found by the cascade on an in-memory frame"""
+        crops = [frame[y : y + h, x : x + w] for (x, y, w, h) in faces]
+        crops = [crop for crop in crops if crop.size > 0]
+        if not crops:
+            return []
+        return [self.to_result(scores) for scores in self.predict_batch(crops)]
+
+
+class TFLiteEmotionEngine(EmotionEngine):
+    """The emotion model converted to (int8) TFLite, without TensorFlow
+
+    Uses the standalone tflite-runtime (or ai-edge-litert) interpreter.
+    Quantized inputs and outputs are converted with the tensors' own scale
+    and zero point, so float and int8 I/O models both work.
+    """
+
+    backend = "tflite"
+
+    def load_model(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from ai_edge_litert.interpreter import Interpreter
+
+        interpreter = Interpreter(
+            model_path=self.model_path or "emotion_int8.tflite",
+            num_threads=int(os.getenv("EMOTION_THREADS", "2")),
+        )
+        interpreter.allocate_tensors()
+        self.input_detail = interpreter.get_input_details()[0]
+        self.output_detail = interpreter.get_output_details()[0]
+        self.batch_size = int(self.input_detail["shape"][0])
+        return interpreter
+
+    def run_model(self, batch):
+        if len(batch) != self.batch_size:
+            self.model.resize_tensor_input(self.input_detail["index"], batch.shape)
+            self.model.allocate_tensors()
+            self.input_detail = self.model.get_input_details()[0]
+            self.output_detail = self.model.get_output_details()[0]
+            self.batch_size = len(batch)
+
+        dtype = self.input_detail["dtype"]
+        if dtype != np.float32:
+            scale, zero_point = self.input_detail["quantization"]
+            info = np.iinfo(dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+        self.model.set_tensor(self.input_detail["index"], batch.astype(dtype))
+        self.model.invoke()
+
+        scores = self.model.get_tensor(self.output_detail["index"])
+        if scores.dtype != np.float32:
+            scale, zero_point = self.output_detail["quantization"]
+            scores = (scores.astype(np.float32) - zero_point) * scale
+        return scores
+
+
+class ONNXEmotionEngine(EmotionEngine):
+    """The emotion model exported to (int8 QDQ) ONNX, on ONNX Runtime's CPU provider"""
+
+    backend = "onnx"
+
+    def load_model(self):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("EMOTION_THREADS", "2"))
+        session = onnxruntime.InferenceSession(
+            self.model_path or "emotion_int8.onnx",
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_name = session.get_inputs()[0].name
+        return session
+
+    def run_model(self, batch):
+        return self.model.run(None, {self.input_name: batch})[0]
+
+
+EMOTION_BACKENDS = {
+    "deepface": EmotionEngine,
+    "tflite": TFLiteEmotionEngine,
+    "onnx": ONNXEmotionEngine,
+}
+
+
+def create_emotion_engine(target_emotions=None, backend=None, model_path=None):
+    """Build the emotion engine chosen by EMOTION_BACKEND (deepface, tflite or onnx)
+
+    EMOTION_MODEL_PATH points the lightweight backends at a converted model
+    (see convert_emotion_model.py).
+    """
+    backend = backend or os.getenv("EMOTION_BACKEND", "deepface")
+    if backend not in EMOTION_BACKENDS:
+        raise ValueError(f"Unknown emotion backend: {backend}")
+    return EMOTION_BACKENDS[backend](
+        target_emotions, model_path=model_path or os.getenv("EMOTION_MODEL_PATH")
+    )
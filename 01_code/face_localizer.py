@@ -0,0 +1,185 @@
+# face_localizer.py
+import os
+import time
+
+import cv2
+
+
+class FaceLocalizer:
+    """Finds face boxes with downscaled detection and cheap ROI tracking
+
+    Detection (Haar cascade or OpenCV's DNN SSD detector) runs on a frame
+    shrunk by `downscale` and the boxes are mapped back to full size. Between
+    detections the last face is followed by template matching in a small
+    search window, and a full detection only runs when tracking is lost or
+    every `redetect_interval` frames.
+    """
+
+    def __init__(
+        self,
+        detector="haar",
+        downscale=0.5,
+        track=True,
+        redetect_interval=15,
+        track_threshold=0.6,
+        scale_factor=1.1,
+        min_neighbors=5,
+        min_size=30,
+        dnn_confidence=0.6,
+        dnn_prototxt=None,
+        dnn_model=None,
+    ):
+        self.downscale = downscale
+        self.track = track
+        self.redetect_interval = redetect_interval
+        self.track_threshold = track_threshold
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.dnn_confidence = dnn_confidence
+
+        # Tracking state, in full-resolution coordinates
+        self.template = None
+        self.last_box = None
+        self.frames_since_detect = 0
+
+        # Timing of the most recent locate() call
+        self.last_detect_ms = 0.0
+        self.last_method = None
+
+        self.detector = detector
+        self.net = None
+        if detector == "dnn":
+            dnn_prototxt = dnn_prototxt or os.getenv(
+                "DNN_FACE_PROTOTXT", "deploy.prototxt"
+            )
+            dnn_model = dnn_model or os.getenv(
+                "DNN_FACE_MODEL", "res10_300x300_ssd_iter_140000.caffemodel"
+            )
+            if os.path.exists(dnn_prototxt) and os.path.exists(dnn_model):
+                self.net = cv2.dnn.readNetFromCaffe(dnn_prototxt, dnn_model)
+                print("[DEBUG] Using OpenCV DNN face detector")
+            else:
+                print("[DEBUG] DNN face model files not found, using Haar cascade")
+                self.detector = "haar"
+
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+
+    def reset(self):
+        """Forget the tracked face so the next frame runs a full detection"""
+        self.template = None
+        self.last_box = None
+        self.frames_since_detect = 0
+
+    def detect_haar(self, small):
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        min_size = max(8, int(self.min_size * self.downscale))
+        faces = self.face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size),
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def detect_dnn(self, small):
+        height, width = small.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(small, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0)
+        )
+        self.net.setInput(blob)
+        detections = self.net.forward()
+
+        faces = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < self.dnn_confidence:
+                continue
+            x1, y1, x2, y2 = detections[0, 0, i, 3:7] * [width, height, width, height]
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(width, int(x2)), min(height, int(y2))
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+
+    def detect(self, frame):
+        """Run a full detection on the downscaled frame, boxes in full size"""
+        if self.downscale and self.downscale != 1.0:
+            small = cv2.resize(
+                frame,
+                None,
+                fx=self.downscale,
+                fy=self.downscale,
+                interpolation=cv2.INTER_AREA,
+            )
+        else:
+            small = frame
+
+        if self.detector == "dnn":
+            faces = self.detect_dnn(small)
+        else:
+            faces = self.detect_haar(small)
+
+        scale = 1.0 / self.downscale if self.downscale else 1.0
+        return [
+            (int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+            for (x, y, w, h) in faces
+        ]
+
+    def track_face(self, frame):
+        """Follow the last face by template matching near its old position"""
+        x, y, w, h = self.last_box
+        frame_h, frame_w = frame.shape[:2]
+
+        # Search a window twice the size of the face around its last position
+        x1, y1 = max(0, x - w // 2), max(0, y - h // 2)
+        x2, y2 = min(frame_w, x + w + w // 2), min(frame_h, y + h + h // 2)
+        window = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+
+        result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(result)
+        if score < self.track_threshold:
+            return None
+        return (x1 + location[0], y1 + location[1], w, h)
+
+    def remember(self, frame, box):
+        x, y, w, h = box
+        self.template = cv2.cvtColor(frame[y : y + h, x : x + w], cv2.COLOR_BGR2GRAY)
+        self.last_box = box
+
+    def locate(self, frame):
+        """Return face boxes (x, y, w, h) for a full-resolution BGR frame"""
+        start_time = time.perf_counter()
+        faces = []
+
+        if (
+            self.track
+            and self.last_box is not None
+            and self.frames_since_detect < self.redetect_interval
+        ):
+            box = self.track_face(frame)
+            if box is not None:
+                faces = [box]
+                self.frames_since_detect += 1
+                self.last_method = "track"
+            else:
+                print("[DEBUG] Face tracking lost, running full detection")
+
+        if not faces:
+            faces = self.detect(frame)
+            self.frames_since_detect = 0
+            self.last_method = self.detector
+            if faces and self.track:
+                self.remember(frame, max(faces, key=lambda box: box[2] * box[3]))
+            elif not faces:
+                self.reset()
+
+        self.last_detect_ms = (time.perf_counter() - start_time) * 1000
+        print(
+            f"[DEBUG] Face localisation ({self.last_method}): "
+            f"{round(self.last_detect_ms, 1)} ms, {len(faces)} faces"
+        )
+        return faces
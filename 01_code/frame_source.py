@@ -0,0 +1,236 @@
+# frame_source.py
+import os
+import time
+from threading import Lock
+
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    """Base class for persistent camera sources that return BGR numpy frames"""
+
+    def __init__(self, width=640, height=480):
+        self.width = width
+        self.height = height
+        self.lock = Lock()
+        self.opened = False
+
+    def open(self):
+        """Open the underlying device; subclasses keep it open between reads"""
+        self.opened = True
+
+    def read(self):
+        """Return the latest frame as a BGR ndarray, or None on failure"""
+        raise NotImplementedError
+
+    def close(self):
+        self.opened = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OpenCVFrameSource(FrameSource):
+    """Frame source backed by a long-lived cv2.VideoCapture"""
+
+    def __init__(self, device=0, width=640, height=480, warmup_frames=2):
+        super().__init__(width, height)
+        self.device = device
+        self.warmup_frames = warmup_frames
+        self.capture = None
+
+    def open(self):
+        if self.opened:
+            return
+        print(f"[DEBUG] Opening VideoCapture device {self.device}...")
+        self.capture = cv2.VideoCapture(self.device)
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        # Keep the driver queue short so reads return a fresh frame
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Could not open camera device {self.device}")
+
+        # Let auto exposure settle once, not on every capture
+        for _ in range(self.warmup_frames):
+            self.capture.read()
+        self.opened = True
+
+    def read(self):
+        if not self.opened:
+            self.open()
+        with self.lock:
+            ok, frame = self.capture.read()
+        if not ok:
+            print("[DEBUG] VideoCapture returned no frame")
+            return None
+        return frame
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        self.opened = False
+
+
+class PiCameraFrameSource(FrameSource):
+    """Frame source backed by a running picamera2 (libcamera) stream"""
+
+    def __init__(self, width=640, height=480, rotation=0):
+        super().__init__(width, height)
+        self.rotation = rotation
+        self.camera = None
+
+    def open(self):
+        if self.opened:
+            return
+        # picamera2 is only available on Raspberry Pi OS
+        from picamera2 import Picamera2
+
+        print("[DEBUG] Starting picamera2 stream...")
+        self.camera = Picamera2()
+        config = self.camera.create_video_configuration(
+            main={"size": (self.width, self.height), "format": "RGB888"}
+        )
+        self.camera.configure(config)
+        self.camera.start()
+        self.opened = True
+
+    def read(self):
+        if not self.opened:
+            self.open()
+        with self.lock:
+            # RGB888 in picamera2 is laid out as BGR, which is what OpenCV expects
+            frame = self.camera.capture_array("main")
+        if frame is None:
+            return None
+        if self.rotation == 180:
+            frame = cv2.rotate(frame, cv2.ROTATE_180)
+        elif self.rotation == 90:
+            frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+        elif self.rotation == 270:
+            frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        return frame
+
+    def close(self):
+        if self.camera is not None:
+            self.camera.stop()
+            self.camera.close()
+            self.camera = None
+        self.opened = False
+
+
+class FileFrameSource(FrameSource):
+    """Frame source that cycles through image files, decoded once up front"""
+
+    def __init__(self, paths, width=640, height=480, loop=True):
+        super().__init__(width, height)
+        if isinstance(paths, str):
+            if os.path.isdir(paths):
+                paths = sorted(
+                    os.path.join(paths, name)
+                    for name in os.listdir(paths)
+                    if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))
+                )
+            else:
+                paths = [paths]
+        self.paths = list(paths)
+        self.loop = loop
+        self.frames = []
+        self.index = 0
+
+    def open(self):
+        if self.opened:
+            return
+        for path in self.paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"[DEBUG] Could not read image file: {path}")
+                continue
+            self.frames.append(frame)
+        self.opened = True
+
+    def read(self):
+        if not self.opened:
+            self.open()
+        with self.lock:
+            if not self.frames:
+                return None
+            if self.index >= len(self.frames):
+                if not self.loop:
+                    return None
+                self.index = 0
+            frame = self.frames[self.index]
+            self.index += 1
+        return frame.copy()
+
+
+class SyntheticFrameSource(FrameSource):
+    """Frame source that draws a simple face-like pattern, for offline runs"""
+
+    def __init__(self, width=640, height=480, fps=None, draw_face=True):
+        super().__init__(width, height)
+        self.fps = fps
+        self.draw_face = draw_face
+        self.last_read = 0.0
+
+    def read(self):
+        if self.fps:
+            # Pace reads like a real sensor would
+            wait = (1.0 / self.fps) - (time.time() - self.last_read)
+            if wait > 0:
+                time.sleep(wait)
+            self.last_read = time.time()
+
+        frame = np.full((self.height, self.width, 3), 90, dtype=np.uint8)
+        if self.draw_face:
+            center = (self.width // 2, self.height // 2)
+            radius = min(self.width, self.height) // 4
+            cv2.circle(frame, center, radius, (170, 190, 220), -1)
+            eye_offset = radius // 3
+            for dx in (-eye_offset, eye_offset):
+                cv2.circle(
+                    frame,
+                    (center[0] + dx, center[1] - radius // 4),
+                    radius // 8,
+                    (40, 40, 40),
+                    -1,
+                )
+            cv2.ellipse(
+                frame,
+                (center[0], center[1] + radius // 3),
+                (radius // 2, radius // 6),
+                0,
+                0,
+                180,
+                (40, 40, 120),
+                3,
+            )
+        return frame
+
+
+def create_frame_source(backend="picamera2", **kwargs):
+    """Build a frame source by backend name: picamera2, opencv, file or synthetic
+
+    The file backend reads its images from `paths`, or from FRAME_SOURCE_PATH
+    (a file or a directory) when it is selected through the environment.
+    """
+    if backend == "picamera2":
+        return PiCameraFrameSource(**kwargs)
+    if backend == "opencv":
+        return OpenCVFrameSource(**kwargs)
+    if backend == "file":
+        if "paths" not in kwargs:
+            paths = os.getenv("FRAME_SOURCE_PATH")
+            if not paths:
+                raise ValueError("The file frame source needs FRAME_SOURCE_PATH")
+            kwargs["paths"] = paths
+        return FileFrameSource(**kwargs)
+    if backend == "synthetic":
+        return SyntheticFrameSource(**kwargs)
+    raise ValueError(f"Unknown frame source backend: {backend}")
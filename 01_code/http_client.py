@@ -0,0 +1,240 @@
+# http_client.py
+import os
+import time
+from collections import defaultdict, deque
+from threading import Lock
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds for every outbound call
+DEFAULT_TIMEOUT = (3.05, 30)
+
+# Base URL for raw OpenAI calls; the SDK reads the same variable itself
+OPENAI_API_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+# Idempotent requests are retried on connection errors and these statuses
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RequestTimings:
+    """Rolling record of per-request latency, grouped by host"""
+
+    def __init__(self, max_records=500):
+        self.records = deque(maxlen=max_records)
+        self.lock = Lock()
+
+    def record(self, method, url, status, elapsed):
+        with self.lock:
+            self.records.append(
+                {
+                    "method": method,
+                    "host": urlparse(url).netloc,
+                    "status": status,
+                    "elapsed": elapsed,
+                    "time": time.time(),
+                }
+            )
+
+    def summary(self):
+        """Per-host request count, mean and max latency in seconds"""
+        by_host = defaultdict(list)
+        with self.lock:
+            for record in self.records:
+                by_host[record["host"]].append(record["elapsed"])
+        return {
+            host: {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "max": max(values),
+            }
+            for host, values in by_host.items()
+        }
+
+
+timings = RequestTimings()
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies default timeouts and records request timings"""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        start_time = time.perf_counter()
+        status = None
+        try:
+            response = super().request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            # For streamed bodies this is time to headers
+            timings.record(method, url, status, time.perf_counter() - start_time)
+
+
+def build_session(pool_maxsize=10, retries=3, backoff_factor=0.5):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=10, pool_maxsize=pool_maxsize, max_retries=retry
+    )
+    session = TimeoutSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_polling_session = None
+_async_client = None
+_openai_client = None
+_async_openai_client = None
+_lock = Lock()
+
+
+def get_session(retry=True):
+    """Process-wide keep-alive session; one connection pool per host
+
+    retry=False returns a session without adapter retries, for pollers that
+    already retry on their own schedule (the song feed), so the two retry
+    loops don't multiply.
+    """
+    global _session, _polling_session
+    with _lock:
+        if not retry:
+            if _polling_session is None:
+                _polling_session = build_session(retries=0)
+            return _polling_session
+        if _session is None:
+            _session = build_session()
+    return _session
+
+
+def get(url, retry=True, **kwargs):
+    return get_session(retry).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return get_session().post(url, **kwargs)
+
+
+def _mark_start(request):
+    request.extensions["start_time"] = time.perf_counter()
+
+
+def _record_response(response):
+    request = response.request
+    start_time = request.extensions.get("start_time", time.perf_counter())
+    elapsed = time.perf_counter() - start_time
+    timings.record(request.method, str(request.url), response.status_code, elapsed)
+
+
+def get_async_client():
+    """Shared httpx.AsyncClient with the same timeouts, for asyncio code
+
+    Create and use it from a single event loop.
+    """
+    global _async_client
+    import httpx
+
+    with _lock:
+        if _async_client is None:
+
+            async def mark_start(request):
+                _mark_start(request)
+
+            async def record(response):
+                _record_response(response)
+
+            _async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+                transport=httpx.AsyncHTTPTransport(retries=2),
+                event_hooks={"request": [mark_start], "response": [record]},
+            )
+    return _async_client
+
+
+async def async_get(url, retries=3, backoff_factor=0.5, **kwargs):
+    """GET with retries on transient statuses, mirroring the sync session"""
+    import asyncio
+
+    import httpx
+
+    client = get_async_client()
+    for attempt in range(retries + 1):
+        try:
+            response = await client.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(backoff_factor * (2**attempt))
+
+
+async def async_post(url, **kwargs):
+    return await get_async_client().post(url, **kwargs)
+
+
+def get_openai_client():
+    """One OpenAI client (and connection pool) shared by every component"""
+    global _openai_client
+    import httpx
+    from openai import OpenAI
+
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=httpx.Timeout(60.0, connect=DEFAULT_TIMEOUT[0]),
+                max_retries=2,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_keepalive_connections=10, max_connections=20
+                    ),
+                    event_hooks={
+                        "request": [_mark_start],
+                        "response": [_record_response],
+                    },
+                ),
+            )
+    return _openai_client
+
+
+def get_async_openai_client():
+    """Shared AsyncOpenAI client for asyncio code, with the same pool limits
+
+    Create and use it from a single event loop.
+    """
+    global _async_openai_client
+    import httpx
+    from openai import AsyncOpenAI
+
+    with _lock:
+        if _async_openai_client is None:
+
+            async def mark_start(request):
+                _mark_start(request)
+
+            async def record(response):
+                _record_response(response)
+
+            _async_openai_client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=httpx.Timeout(60.0, connect=DEFAULT_TIMEOUT[0]),
+                max_retries=2,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_keepalive_connections=10, max_connections=20
+                    ),
+                    event_hooks={"request": [mark_start], "response": [record]},
+                ),
+            )
+    return _async_openai_client
@@ -0,0 +1,64 @@
+# latency_model.py
+import math
+import random
+
+
+class LatencyModel:
+    """Latency and failure distribution for the local stand-in servers
+
+    `distribution` is "fixed" (always `mean`), "uniform" (`mean` +/- `jitter`)
+    or "lognormal" (mean `mean`, `jitter` as the sigma of the log, so a long
+    tail like real APIs). `failure_rate` of requests fail with `failure_status`.
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+    def __init__(
+        self,
+        mean=0.0,
+        jitter=0.0,
+        distribution="fixed",
+        failure_rate=0.0,
+        failure_status=503,
+        seed=None,
+    ):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.mean = mean
+        self.jitter = jitter
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec, **kwargs):
+        """Build from "distribution:mean[:jitter[:failure_rate]]"
+
+        For example "lognormal:0.8:0.4:0.02"; a bare number is a fixed latency.
+        """
+        parts = str(spec).split(":")
+        if parts[0] not in cls.DISTRIBUTIONS:
+            parts.insert(0, "fixed")
+        values = [float(part) for part in parts[1:]]
+        mean, jitter, failure_rate = (values + [0.0, 0.0, 0.0])[:3]
+        return cls(mean, jitter, parts[0], failure_rate, **kwargs)
+
+    def sample(self):
+        """One latency in seconds, never negative"""
+        if self.distribution == "uniform":
+            return max(0.0, self.mean + self.random.uniform(-self.jitter, self.jitter))
+        if self.distribution == "lognormal" and self.mean > 0:
+            # Shift mu so the distribution's mean stays at `mean`
+            mu = math.log(self.mean) - self.jitter**2 / 2
+            return self.random.lognormvariate(mu, self.jitter)
+        return max(0.0, self.mean)
+
+    def fails(self):
+        return self.random.random() < self.failure_rate
+
+    def __repr__(self):
+        return (
+            f"LatencyModel({self.distribution}, mean={self.mean}, "
+            f"jitter={self.jitter}, failure_rate={self.failure_rate})"
+        )
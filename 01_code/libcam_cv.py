@@ -1,76 +1,91 @@
 # libcaam_cv.py
 import cv2
 import numpy as np
-from deepface import DeepFace
 import time
 from threading import Thread, Event
 import speech_recognition as sr
-import subprocess
 import os
+from frame_source import create_frame_source
+from emotion_engine import create_emotion_engine
+from mood_estimator import MoodAggregator
+from face_localizer import FaceLocalizer
+from audio_bus import BusAudioSource, get_audio_bus
+from tracing import traced
+
+# Longest a continuous (max_frames=None) mood estimate samples the camera
+STREAM_TIMEOUT = 10
 
 
 class SimpleMoodDetector:
-    def __init__(self):
+    def __init__(
+        self,
+        frame_source=None,
+        emotion_engine=None,
+        face_localizer=None,
+        audio_bus=None,
+        mood_mode=None,
+        aggregation="vote",
+        confidence_threshold=0.7,
+        stop_event=None,
+    ):
         print("[DEBUG] Initializing SimpleMoodDetector...")
         # Initialize face detection
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        self.face_localizer = face_localizer or FaceLocalizer(
+            detector=os.getenv("FACE_DETECTOR", "haar")
         )
 
-        # Set up speech recognition
+        # Set up speech recognition on the shared microphone stream
         self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+        self.audio_bus = audio_bus or get_audio_bus()
         print("[DEBUG] Speech recognition initialized")
 
-        # Threading events
-        self.stop_process = Event()
+        # Threading events; the stop event may be shared with a caller that
+        # needs to stop detection before the detector has finished loading
+        self.stop_process = stop_event or Event()
         self.speaking = Event()
 
         # We'll only keep these emotions
         self.target_emotions = ["happy", "sad", "angry", "neutral"]
         self.detected_mood = None
+        self.emotion_scores = None
+        self.mood_confidence = 0.0
+
+        # "single" scores the first frame with a face, "burst" aggregates a
+        # batch of frames into a steadier mood
+        self.mood_mode = mood_mode or os.getenv("MOOD_MODE", "single")
+        self.aggregation = aggregation
+        self.confidence_threshold = confidence_threshold
+
+        # Load the emotion model once so every mood read runs on a warm model
+        self.emotion_engine = emotion_engine or create_emotion_engine(
+            self.target_emotions
+        )
 
-        # Image paths
-        self.image_path = "captured_image.jpg"
-        self.resized_image_path = "resized_image.jpg"
+        # Persistent camera stream, opened once and reused for every capture
+        self.frame_source = frame_source or create_frame_source(
+            os.getenv("FRAME_SOURCE", "picamera2")
+        )
 
+    @traced("camera_capture")
     def capture_image(self):
-        """Capture image using libcamera-still with reduced resolution"""
+        """Grab the latest frame from the persistent frame source"""
         try:
-            print("[DEBUG] Capturing image with libcamera-still...")
-            # Use libcamera-still to capture a lower resolution image
-            subprocess.run(
-                [
-                    "libcamera-still",
-                    "-n",  # No preview
-                    "-t",
-                    "1000",  # Timeout 1 second
-                    "--immediate",  # Take picture immediately
-                    "--width",
-                    "640",  # Reduced width
-                    "--height",
-                    "480",  # Reduced height
-                    "--rotation",
-                    "0",  # Add rotation if needed
-                    "--output",
-                    self.image_path,
-                ],
-                check=True,
-            )
-
-            print(f"[DEBUG] Image captured successfully: {self.image_path}")
-            return True
-        except subprocess.CalledProcessError as e:
+            print("[DEBUG] Capturing frame from frame source...")
+            frame = self.frame_source.read()
+            if frame is None:
+                print("[DEBUG] Frame source returned no frame")
+                return None
+
+            print(f"[DEBUG] Frame captured successfully: {frame.shape}")
+            return frame
+        except Exception as e:
             print(f"[DEBUG] Error capturing image: {e}")
-            return False
+            return None
 
-    def resize_image(self, max_size=640):
-        """Resize image if it's too large"""
+    def resize_image(self, frame, max_size=640):
+        """Resize frame in memory if it's too large"""
         try:
-            print("[DEBUG] Resizing image...")
-            # Read image
-            img = cv2.imread(self.image_path)
-            height, width = img.shape[:2]
+            height, width = frame.shape[:2]
 
             # Calculate new dimensions while maintaining aspect ratio
             if width > max_size or height > max_size:
@@ -82,72 +97,111 @@ class SimpleMoodDetector:
                     new_width = int(width * (max_size / height))
 
                 # Resize image
-                resized_img = cv2.resize(img, (new_width, new_height))
-                cv2.imwrite(self.resized_image_path, resized_img)
+                resized_img = cv2.resize(frame, (new_width, new_height))
                 print(f"[DEBUG] Image resized to {new_width}x{new_height}")
-                return self.resized_image_path
+                return resized_img
 
-            return self.image_path
+            return frame
         except Exception as e:
             print(f"[DEBUG] Error resizing image: {e}")
-            return self.image_path
+            return frame
 
-    def detect_mood(self, image_path):
-        """Detect mood using DeepFace with memory optimization"""
+    def detect_mood(self, frame, faces):
+        """Detect mood on the cascade's face boxes with the warm emotion engine"""
         try:
-            print("[DEBUG] Starting mood detection with DeepFace...")
-            # DeepFace analyze returns emotions with confidence scores
-            result = DeepFace.analyze(
-                image_path,
-                actions=["emotion"],
-                enforce_detection=False,
-                detector_backend="opencv",
-            )
-
-            # Get the emotion with highest confidence score
-            emotion = result[0]["dominant_emotion"]
-            print(f"[DEBUG] DeepFace detected emotion: {emotion}")
-            print(f"[DEBUG] All emotions detected: {result[0]['emotion']}")
-
-            # Map to our target emotions, defaulting to neutral
-            if emotion in self.target_emotions:
-                print(f"[DEBUG] Returning target emotion: {emotion}")
-                return emotion
-            print("[DEBUG] Emotion not in target list, defaulting to neutral")
-            return "neutral"
+            print("[DEBUG] Starting mood detection on face ROI...")
+            # Score only the largest face, which is the person talking to us
+            x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+            results = self.emotion_engine.analyze_faces(frame, [(x, y, w, h)])
+            if not results:
+                print("[DEBUG] Empty face crop, skipping mood detection")
+                return None
+
+            result = results[0]
+            self.emotion_scores = result["emotion"]
+            print(f"[DEBUG] Detected emotion: {result['dominant_emotion']}")
+            print(f"[DEBUG] All emotions detected: {result['emotion']}")
+            print(f"[DEBUG] Returning target emotion: {result['mood']}")
+            return result["mood"]
 
         except Exception as e:
             print(f"[DEBUG] Error in mood detection: {e}")
             return None
-        finally:
-            # Clear memory
-            import gc
 
-            gc.collect()
+    @traced("face_detection")
+    def find_faces(self, frame):
+        """Return face boxes for a BGR frame, tracking between calls"""
+        return self.face_localizer.locate(frame)
+
+    def estimate_mood(self, max_frames=12, batch_size=4, timeout=None):
+        """Sample frames in batches and aggregate their emotions into one mood
+
+        Stops early once the aggregator is confident. With max_frames=None the
+        camera is sampled as a continuous stream until confident or timeout,
+        which then defaults to STREAM_TIMEOUT seconds.
+        """
+        if max_frames is None and timeout is None:
+            timeout = STREAM_TIMEOUT
+        aggregator = MoodAggregator(
+            self.target_emotions,
+            strategy=self.aggregation,
+            confidence_threshold=self.confidence_threshold,
+        )
+        start_time = time.time()
+        sampled = 0
+        try:
+            while max_frames is None or sampled < max_frames:
+                if timeout is not None and time.time() - start_time > timeout:
+                    print("[DEBUG] Mood estimation timed out")
+                    break
+
+                # Collect the largest face of each frame in this batch
+                crops = []
+                for _ in range(batch_size):
+                    frame = self.capture_image()
+                    sampled += 1
+                    if frame is None:
+                        continue
+                    frame = self.resize_image(frame)
+                    faces = self.find_faces(frame)
+                    if len(faces) == 0:
+                        continue
+                    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+                    crops.append(frame[y : y + h, x : x + w])
+
+                # One model call for the whole batch
+                if crops:
+                    for scores in self.emotion_engine.predict_batch(crops):
+                        aggregator.update(scores)
+                    mood, confidence = aggregator.estimate()
+                    print(
+                        f"[DEBUG] {aggregator.frames} faces scored, "
+                        f"mood {mood} ({round(confidence, 2)})"
+                    )
+                    if aggregator.is_confident():
+                        print("[DEBUG] Mood confidence reached, stopping early")
+                        break
+
+            mood, confidence = aggregator.estimate()
+            self.mood_confidence = confidence
+            return mood
+        except Exception as e:
+            print(f"[DEBUG] Error estimating mood: {e}")
+            return None
 
-    def process_image(self):
-        """Process the captured image"""
+    def process_image(self, frame):
+        """Process the captured frame"""
         try:
-            # Read the captured image
-            frame = cv2.imread(self.image_path)
             if frame is None:
-                print("[DEBUG] Failed to read captured image")
+                print("[DEBUG] No frame to process")
                 return False
-
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Detect faces using OpenCV
-            faces = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-            )
+            frame = self.resize_image(frame)
+            faces = self.find_faces(frame)
 
             # If face detected, process mood
             if len(faces) > 0:
                 print(f"[DEBUG] Detected {len(faces)} faces")
-                # Process resized image for mood detection
-                image_to_process = self.resize_image()
-                self.detected_mood = self.detect_mood(image_to_process)
+                self.detected_mood = self.detect_mood(frame, faces)
                 return True
             else:
                 print("[DEBUG] No faces detected in the image")
@@ -160,10 +214,10 @@ class SimpleMoodDetector:
     def listen_for_speech(self):
         """Listen for speech and trigger image capture"""
         print("[DEBUG] Starting speech recognition")
-        with self.microphone as source:
-            print("[DEBUG] Adjusting for ambient noise...")
-            self.recognizer.adjust_for_ambient_noise(source)
-            print("[DEBUG] Ambient noise adjustment complete")
+        with BusAudioSource(self.audio_bus) as source:
+            # Ambient noise is measured once per stream, not per consumer
+            self.audio_bus.calibrate_recognizer(self.recognizer)
+            print("[DEBUG] Ambient noise threshold applied")
 
             while not self.stop_process.is_set():
                 try:
@@ -172,10 +226,14 @@ class SimpleMoodDetector:
                     print("[DEBUG] Speech detected!")
 
                     # Capture and process image
-                    if self.capture_image():
-                        if self.process_image():
+                    if self.mood_mode == "burst":
+                        self.detected_mood = self.estimate_mood()
+                        if self.detected_mood:
                             self.stop_process.set()
                             break
+                    elif self.process_image(self.capture_image()):
+                        self.stop_process.set()
+                        break
 
                     time.sleep(0.5)
 
@@ -196,20 +254,20 @@ class SimpleMoodDetector:
             speech_thread.start()
             print("[DEBUG] Speech thread started")
 
-            # Wait for mood detection
-            while not self.stop_process.is_set():
-                time.sleep(0.1)
+            # Wait for mood detection (or for a caller to stop it)
+            self.stop_process.wait()
 
         finally:
-            # Clean up
-            print("[DEBUG] Cleaning up resources")
-            # Remove temporary image files
-            for path in [self.image_path, self.resized_image_path]:
-                if os.path.exists(path):
-                    os.remove(path)
+            # The frame source stays open so the next call skips sensor warm-up
+            print("[DEBUG] Mood detection pipeline finished")
 
         return self.detected_mood
 
+    def close(self):
+        """Release the camera stream"""
+        print("[DEBUG] Cleaning up resources")
+        self.frame_source.close()
+
 
 def main():
     print("[DEBUG] Starting main program")
@@ -217,7 +275,10 @@ def main():
     detector = SimpleMoodDetector()
 
     # Get the mood
-    detected_mood = detector.get_mood()
+    try:
+        detected_mood = detector.get_mood()
+    finally:
+        detector.close()
 
     # Process the detected mood
     if detected_mood:
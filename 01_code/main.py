@@ -1,147 +1,419 @@
+from startup import profiler  # first, so every later import is timed
+import asyncio
 import os
-import io
 import threading
-import requests
-from pydub import AudioSegment
-from pydub.playback import play
 from dotenv import load_dotenv
-from libcam_cv import SimpleMoodDetector
+from startup import BackgroundLoader
+from audio_bus import get_audio_bus
 from speech_to_text import SpeechToText
 from text_to_response import TextToResponse
 from response_to_voice import ResponseToVoice
-from prompt_engineering import generate_music_details
-from song_generator import generate_song_request, poll_song_status
-from config import OPENAI_API_KEY, UDIO_KEY
+from sentence_pipeline import SentencePipeline
+from song_player import StreamingSongPlayer
+from song_library import POLICY_GENERATE, POLICY_REUSE_AND_GENERATE, SongLibrary
+from prompt_engineering import build_user_context, generate_music_details
+from session_brief import SessionBrief
+from song_generator import (
+    SongCallbackReceiver,
+    SongJobTracker,
+    build_description_prompt,
+)
+from speculative_song import SpeculativeSong
+from stage_graph import Stage, StageGraph
+from tracing import new_session, tracer
+from config import OPENAI_API_KEY, UDIO_KEY, require_keys
 
 # Load environment variables
 load_dotenv()
 
 
-def play_song(audio_url):
-    """Play the generated song from the URL."""
+# Library refreshes still generating; joined before exit so they get stored
+refresh_threads = []
+
+
+def play_song(audio_url, song_player=None, on_audio=None):
+    """Play the generated song from the URL while it downloads."""
     print("Playing generated song...")
     try:
-        # Download the audio data into memory
-        audio_data = requests.get(audio_url)
-        audio_data.raise_for_status()  # Raise an error for bad responses
+        (song_player or StreamingSongPlayer()).play(audio_url, on_audio)
+    except Exception as e:
+        print(f"An error occurred while playing the song: {str(e)}")
 
-        # Load the audio data into an AudioSegment
-        audio_segment = AudioSegment.from_file(
-            io.BytesIO(audio_data.content), format="mp3"
-        )
 
-        # Play the audio
-        play(audio_segment)
+def store_song(song_library, detected_mood, details, audio_url, audio_bytes=None):
+    """Add a finished song to the library, downloading it unless given."""
+    try:
+        song_library.add(detected_mood, *details, audio_url, audio_bytes)
     except Exception as e:
-        print(f"An error occurred while playing the song: {str(e)}")
+        print(f"Could not store song in library: {str(e)}")
 
 
-def generate_song(user_text, detected_mood, audio_url_container):
-    """Generate the song and return the audio URL."""
-    # Generate music details based on user text and detected mood
-    user_context = f"The user looks like they are feeling {detected_mood} by their face. {user_text}"
-    generated_prompt, singer_name, music_genre = generate_music_details(
-        user_context, OPENAI_API_KEY
-    )
+def submit_song(song_tracker, details, gpt_description_prompt):
+    """Start song generation and wait for its audio URL."""
+    work_id = song_tracker.submit(details[0], gpt_description_prompt)
+    if not work_id:
+        print("Failed to initiate song generation.")
+        return None
+
+    print("Generating song...")
+    # Adaptive polling (and the webhook, if configured) until done or deadline
+    audio_url = song_tracker.wait(work_id)
+    if audio_url:
+        print(f"Generated Song URL: {audio_url}")
+    else:
+        print("Song generation did not complete.")
+    return audio_url
+
+
+def refresh_song(
+    song_tracker, song_library, detected_mood, details, gpt_description_prompt
+):
+    """Generate a new song purely to add it to the library."""
+    audio_url = submit_song(song_tracker, details, gpt_description_prompt)
+    if audio_url:
+        store_song(song_library, detected_mood, details, audio_url)
+
+
+def prepare_song(
+    user_text,
+    detected_mood,
+    song_tracker,
+    song_library=None,
+    details=None,
+    work_id=None,
+):
+    """Pick the music details and start the song, or find one in the library."""
+    if details is None:
+        # Generate music details based on user text and detected mood
+        user_context = build_user_context(detected_mood, user_text)
+        details = generate_music_details(
+            user_context, OPENAI_API_KEY, detected_mood, user_text
+        )
+    generated_prompt, singer_name, music_genre = details
     if not all([generated_prompt, singer_name, music_genre]):
         print("Failed to generate music details.")
-        audio_url_container.append(None)  # Append None for consistency
-        return
+        return None
     else:
         print("Generated Prompt: ", generated_prompt)
         print("Singer Name:", singer_name)
         print("Music Genre:", music_genre)
 
     # Prepare the song description prompt
-    gpt_description_prompt = (
-        f"The song should feature the singing voice closest to {singer_name} "
-        f"in the style of {music_genre}. {generated_prompt}. "
-        "Limit the song generated to be as short as possible."
-    )
+    gpt_description_prompt = build_description_prompt(*details)
+
+    # Serve a close-enough song from the library if the policy allows it,
+    # unless a speculative job for this session is already running
+    if work_id is None and song_library and song_library.policy != POLICY_GENERATE:
+        cached, _ = song_library.lookup(detected_mood, *details)
+        if cached:
+            print("Playing a similar song from the library.")
+            if song_library.policy == POLICY_REUSE_AND_GENERATE:
+                # Still generate a fresh song in the background for next time
+                refresh = threading.Thread(
+                    target=refresh_song,
+                    args=(
+                        song_tracker,
+                        song_library,
+                        detected_mood,
+                        details,
+                        gpt_description_prompt,
+                    ),
+                    daemon=True,
+                )
+                refresh.start()
+                refresh_threads.append(refresh)
+            return {"details": details, "audio_url": cached["audio_path"]}
 
     # Start song generation
-    work_id = generate_song_request(UDIO_KEY, generated_prompt, gpt_description_prompt)
-
-    if work_id:
-        print("Generating song...")
-        while True:
-            audio_url = poll_song_status(UDIO_KEY, work_id)
-            if audio_url:
-                print(f"Generated Song URL: {audio_url}")
-                audio_url_container.append(audio_url)  # Store the URL in the container
-                break  # Exit loop when the URL is obtained
-            else:
-                print("Waiting for song generation...")
-            pygame.time.delay(500)  # Wait for a bit before checking again
-    else:
+    if work_id is None:
+        work_id = song_tracker.submit(details[0], gpt_description_prompt)
+    if not work_id:
         print("Failed to initiate song generation.")
-        audio_url_container.append(None)  # Append None if failed
+        return None
+    return {"details": details, "work_id": work_id}
 
 
-def main():
-    """Main function to run the pipeline."""
-    # Initialize components
-    stt = SpeechToText()
-    ttr = TextToResponse()
-    rtv = ResponseToVoice()
-    mood_detector = SimpleMoodDetector()
+def wait_for_refreshes():
+    """Let background library refreshes finish, so paid songs get stored."""
+    for refresh in refresh_threads:
+        if refresh.is_alive():
+            print("Waiting for a new library song to finish generating...")
+        refresh.join()
+    refresh_threads.clear()
 
-    print("Starting the speech-to-song pipeline system...")
-    print("Detecting mood and listening for your message...")
 
-    try:
-        # Detect mood
-        detected_mood = mood_detector.get_mood()
+def finish_song(song_job, song_tracker):
+    """Wait for a submitted song and return its audio URL."""
+    if not song_job:
+        return None
+    if song_job.get("audio_url"):
+        return song_job["audio_url"]
+
+    print("Generating song...")
+    # Adaptive polling (and the webhook, if configured) until done or deadline
+    audio_url = song_tracker.wait(song_job["work_id"])
+    if not audio_url:
+        print("Song generation did not complete.")
+        return None
+    print(f"Generated Song URL: {audio_url}")
+    return audio_url
+
+
+def build_pipeline(
+    audio_bus,
+    stt,
+    ttr,
+    speech_pipeline,
+    mood_loader,
+    stop_mood_event,
+    song_tracker,
+    song_library=None,
+    session_brief=None,
+    speculator=None,
+    song_player=None,
+):
+    """Declare the pipeline stages; the graph runs each once its inputs are ready."""
+    graph = StageGraph()
+    stop_mood = stop_mood_event.set
+
+    # 1. Calibrate once on the shared microphone stream
+    graph.add(Stage("calibrate", audio_bus.calibrate, timeout=10, fallback=None))
+
+    # 2. Detect mood while the user is speaking
+    def detect_mood(calibrate):
+        # Usually loaded in the background by now
+        detected_mood = mood_loader.get().get_mood()
         if not detected_mood:
             print("Could not detect mood. Defaulting to 'neutral'.")
             detected_mood = "neutral"  # Default mood if detection fails
+        return detected_mood
+
+    graph.add(
+        Stage(
+            "mood",
+            detect_mood,
+            inputs=["calibrate"],
+            timeout=float(os.getenv("MOOD_TIMEOUT", "60")),
+            fallback="neutral",
+            on_cancel=stop_mood,
+        )
+    )
+
+    # 3. Speech to Text, recorded from the same stream as the mood trigger
+    def on_partial(event):
+        print(f"Heard so far: {event['transcript']}")
+        if speculator and "mood" in graph.results:
+            speculator.offer(graph.result("mood"), event["transcript"])
 
-        # 1. Speech to Text
-        user_text = stt.get_user_text()
+    def transcribe(calibrate):
+        user_text = stt.stream_user_text(on_partial=on_partial)
+        # Give mood detection a moment to finish, then stop waiting for it
+        threading.Timer(5, stop_mood).start()
         if user_text is None:
-            print("Could not understand audio. Please try again later.")
-            return
+            raise ValueError("Could not understand audio. Please try again later.")
         print(f"You said: {user_text}")
+        return user_text
 
-        # 2. Prepare a container for the song URL
-        audio_url_container = []  # List to hold the audio URL
+    graph.add(Stage("transcript", transcribe, inputs=["calibrate"], timeout=120))
 
-        # 3. Start song generation in a separate thread with mood input
-        song_thread = threading.Thread(
-            target=generate_song, args=(user_text, detected_mood, audio_url_container)
+    # 4. Song: music details and submission, then waiting for the audio URL
+    song_inputs = ["transcript", "mood"]
+    if speculator:
+        # Keep the speculative song if the final transcript still matches it
+        graph.add(
+            Stage(
+                "speculation",
+                lambda transcript, mood: speculator.resolve(mood, transcript),
+                inputs=["transcript", "mood"],
+                timeout=30,
+                fallback=None,
+            )
         )
-        song_thread.start()
+        song_inputs.append("speculation")
+    if session_brief:
+        # Supplied by the reply stage as soon as the music fields stream in
+        graph.add(Stage("brief_details"))
+        song_inputs.append("brief_details")
 
-        # 4. Get GPT response while song generation is happening
-        gpt_response = ttr.get_gpt_response(user_text)
-        if gpt_response is None:
-            print("Could not generate GPT response.")
-            return
-        print(f"GPT Response: {gpt_response}")
+    def submit(transcript, mood, speculation=None, brief_details=None):
+        if speculation:
+            return prepare_song(transcript, mood, song_tracker, song_library, **speculation)
+        return prepare_song(
+            transcript, mood, song_tracker, song_library, details=brief_details
+        )
 
-        # 5. Read text response
-        voice_success = rtv.read_text(gpt_response)
+    graph.add(
+        Stage("song_submit", submit, inputs=song_inputs, timeout=60, fallback=None)
+    )
+    graph.add(
+        Stage(
+            "song_poll",
+            lambda song_submit: finish_song(song_submit, song_tracker),
+            inputs=["song_submit"],
+            fallback=None,
+        )
+    )
+
+    # 5. Stream the GPT response and speak it sentence by sentence while the
+    # song is being generated
+    def reply(transcript, mood=None):
+        try:
+            if session_brief:
+                # One completion for both the reply and the music brief
+                tokens = session_brief.stream(
+                    transcript,
+                    mood,
+                    lambda *details: graph.resolve("brief_details", details),
+                )
+            else:
+                tokens = ttr.stream_gpt_response(transcript)
+            gpt_response, voice_success = speech_pipeline.speak_stream(tokens)
+        finally:
+            # No usable music fields; the song falls back to the separate call
+            if session_brief:
+                graph.resolve("brief_details", None)
+
+        if not gpt_response:
+            raise ValueError("Could not generate GPT response.")
+        print(f"GPT Response: {gpt_response}")
         if not voice_success:
-            print("Failed to convert response to speech.")
+            raise ValueError("Failed to convert response to speech.")
+        return gpt_response
+
+    graph.add(
+        Stage(
+            "reply",
+            reply,
+            inputs=["transcript", "mood"] if session_brief else ["transcript"],
+            timeout=180,
+            on_cancel=(
+                (lambda: graph.resolve("brief_details", None)) if session_brief else None
+            ),
+        )
+    )
+
+    # 6. Play the song once the reply has been spoken
+    def playback(reply, song_poll, song_submit, mood):
+        if not song_poll:
+            print("No song URL was generated.")
             return
+        on_audio = None
+        if song_library and not song_submit.get("audio_url"):
+            # A new song: store the bytes the player downloads, not a second copy
+            def on_audio(audio_bytes):
+                store_song(
+                    song_library, mood, song_submit["details"], song_poll, audio_bytes
+                )
 
-        # 6. Wait for the song thread to finish
-        song_thread.join()  # Wait for song generation to complete
+        # Play the generated song from the URL
+        play_song(song_poll, song_player, on_audio)
 
-        # 7. Retrieve the audio URL after song generation completes
-        audio_url = audio_url_container[0] if audio_url_container else None
+    graph.add(
+        Stage(
+            "playback", playback, inputs=["reply", "song_poll", "song_submit", "mood"]
+        )
+    )
+    return graph
 
-        if audio_url:
-            # Play the generated song from the URL
-            play_song(audio_url)
-        else:
-            print("No song URL was generated.")
+
+def load_mood_detector(audio_bus, stop_event):
+    """Import OpenCV and DeepFace and warm the emotion model."""
+    from libcam_cv import SimpleMoodDetector
+
+    return SimpleMoodDetector(audio_bus=audio_bus, stop_event=stop_event)
+
+
+def main():
+    """Main function to run the pipeline."""
+    require_keys()
+    # Initialize components on one shared microphone stream
+    with profiler.phase("audio bus"):
+        audio_bus = get_audio_bus()
+
+    # The camera and emotion model load while everything else starts up and
+    # the user begins talking; set PREWARM=0 to load them on first use
+    stop_mood_event = threading.Event()
+    mood_loader = BackgroundLoader(
+        "mood detector", lambda: load_mood_detector(audio_bus, stop_mood_event)
+    )
+    if os.getenv("PREWARM", "1") == "1":
+        mood_loader.start()
+
+    with profiler.phase("speech to text"):
+        stt = SpeechToText(audio_bus)
+    with profiler.phase("text to response"):
+        ttr = TextToResponse()
+    with profiler.phase("response to voice"):
+        rtv = ResponseToVoice()
+        speech_pipeline = SentencePipeline(rtv)
+
+    with profiler.phase("song services"):
+        # Receive Udio completion callbacks if this device is reachable
+        callback_url = os.getenv("SONG_CALLBACK_URL")
+        callback_receiver = (
+            SongCallbackReceiver(callback_url) if callback_url else None
+        )
+        song_tracker = SongJobTracker(UDIO_KEY, callback_receiver)
+        song_library = SongLibrary(
+            policy=os.getenv("SONG_LIBRARY_POLICY", POLICY_GENERATE)
+        )
+
+    # Optional single-call mode: reply and music brief from one completion
+    session_brief = SessionBrief() if os.getenv("SESSION_BRIEF") == "1" else None
+
+    # Optionally submit the song from a partial transcript while still listening
+    speculator = None
+    if os.getenv("SPECULATIVE_SONG") == "1":
+        speculator = SpeculativeSong(
+            song_tracker,
+            OPENAI_API_KEY,
+            divergence_threshold=float(os.getenv("SPECULATION_DIVERGENCE", "0.5")),
+        )
+
+    # Open the audio output and fill the TTS cache while the user is talking
+    threading.Thread(target=rtv.prewarm, daemon=True).start()
+    profiler.report()
+
+    # Spans are tagged with this session; METRICS_PORT serves /metrics
+    session_id = new_session()
+    if os.getenv("METRICS_PORT"):
+        tracer.start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+    print(f"Starting the speech-to-song pipeline system (session {session_id})...")
+    print("Detecting mood and listening for your message...")
+
+    graph = build_pipeline(
+        audio_bus,
+        stt,
+        ttr,
+        speech_pipeline,
+        mood_loader,
+        stop_mood_event,
+        song_tracker,
+        song_library,
+        session_brief,
+        speculator,
+    )
+    try:
+        asyncio.run(graph.run())
+        graph.print_report()
+        tracer.print_summary()
 
     except KeyboardInterrupt:
         print("\nProgram interrupted by user")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
     finally:
+        stop_mood_event.set()
+        wait_for_refreshes()
+        if mood_loader.ready():
+            mood_loader.get().close()
+        audio_bus.stop()
+        if callback_receiver:
+            callback_receiver.close()
+        if os.getenv("METRICS_FILE"):
+            tracer.write_snapshot(os.getenv("METRICS_FILE"))
+        tracer.close()
         print("System ended")
 
 
@@ -1,19 +1,17 @@
 # main_song.py
 
+from startup import profiler  # first, so every later import is timed
 from prompt_engineering import generate_music_details
 from song_generator import generate_song_request, poll_song_status
-from config import OPENAI_API_KEY, UDIO_KEY
-import openai
-
-# Set up the API key for OpenAI
-openai.api_key = OPENAI_API_KEY
-udio_api_key = UDIO_KEY
+from config import OPENAI_API_KEY, UDIO_KEY, require_keys
 
 
 def main():
+    require_keys()
+    profiler.report()
     # Set your API token for both OpenAI and song generation services
-    openai_api_token = openai.api_key
-    udio_token = udio_api_key
+    openai_api_token = OPENAI_API_KEY
+    udio_token = UDIO_KEY
     # Define context for generating music details
     context = (
         "I had such a fantastic day today! Everything seemed to go right, and I couldn’t stop smiling. "
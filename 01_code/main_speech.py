@@ -1,5 +1,7 @@
 # main_speech.py
 
+from threading import Thread
+from startup import profiler  # first, so every later import is timed
 from speech_to_text import SpeechToText
 from text_to_response import TextToResponse
 from response_to_voice import ResponseToVoice
@@ -8,9 +10,15 @@ from response_to_voice import ResponseToVoice
 def main():
     """Main function to coordinate the speech processing chain"""
     # Initialize components
-    stt = SpeechToText()
-    ttr = TextToResponse()
-    rtv = ResponseToVoice()
+    with profiler.phase("SpeechToText"):
+        stt = SpeechToText()
+    with profiler.phase("TextToResponse"):
+        ttr = TextToResponse()
+    with profiler.phase("ResponseToVoice"):
+        rtv = ResponseToVoice()
+    # Open the audio output and cache common phrases while the user speaks
+    Thread(target=rtv.prewarm, daemon=True).start()
+    profiler.report()
 
     print("Starting the conversation system...")
     print("Speak something (or say 'quit' to exit)")
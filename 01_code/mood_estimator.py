@@ -0,0 +1,84 @@
+# mood_estimator.py
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS
+
+
+class MoodAggregator:
+    """Combines per-frame emotion scores into one stable mood with a confidence"""
+
+    def __init__(
+        self,
+        target_emotions=None,
+        strategy="vote",
+        alpha=0.4,
+        confidence_threshold=0.7,
+        min_frames=3,
+    ):
+        self.target_emotions = target_emotions or ["happy", "sad", "angry", "neutral"]
+        if strategy not in ("vote", "ema"):
+            raise ValueError(f"Unknown aggregation strategy: {strategy}")
+        self.strategy = strategy
+        self.alpha = alpha
+        self.confidence_threshold = confidence_threshold
+        self.min_frames = min_frames
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.votes = dict.fromkeys(self.target_emotions, 0.0)
+        self.score_sums = np.zeros(len(self.target_emotions), dtype=np.float32)
+        self.ema = None
+
+    def to_target_scores(self, scores):
+        """Fold the 7 model emotions onto our targets; the rest count as neutral"""
+        target_scores = np.zeros(len(self.target_emotions), dtype=np.float32)
+        for label, score in zip(EMOTION_LABELS, scores):
+            if label in self.target_emotions:
+                index = self.target_emotions.index(label)
+            else:
+                index = self.target_emotions.index("neutral")
+            target_scores[index] += score
+        total = target_scores.sum()
+        return target_scores / total if total > 0 else target_scores
+
+    def update(self, scores):
+        """Add one frame's probability vector"""
+        target_scores = self.to_target_scores(scores)
+        self.frames += 1
+
+        if self.strategy == "vote":
+            # Each frame votes for its top mood, weighted by how sure it was
+            top = int(np.argmax(target_scores))
+            self.votes[self.target_emotions[top]] += float(target_scores[top])
+            self.score_sums += target_scores
+        elif self.ema is None:
+            self.ema = target_scores
+        else:
+            self.ema = self.alpha * target_scores + (1 - self.alpha) * self.ema
+
+    def estimate(self):
+        """Return (mood, confidence), or (None, 0.0) before any frame arrived"""
+        if self.frames == 0:
+            return None, 0.0
+
+        if self.strategy == "vote":
+            total = sum(self.votes.values())
+            mood = max(self.votes, key=self.votes.get)
+            # The winner's mean probability, not its vote share: three
+            # unanimous frames at 0.3 are still only 0.3 sure
+            index = self.target_emotions.index(mood)
+            confidence = (
+                float(self.score_sums[index]) / self.frames if total > 0 else 0.0
+            )
+        else:
+            top = int(np.argmax(self.ema))
+            mood = self.target_emotions[top]
+            confidence = float(self.ema[top])
+        return mood, confidence
+
+    def is_confident(self):
+        """True once enough frames agree strongly enough to stop sampling"""
+        if self.frames < self.min_frames:
+            return False
+        return self.estimate()[1] >= self.confidence_threshold
@@ -0,0 +1,276 @@
+# openai_stub_server.py
+import io
+import json
+import math
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlparse
+
+import numpy as np
+
+from latency_model import LatencyModel
+
+CLOSING_LINE = "I have written a song for you, here it is."
+
+REPLY_SENTENCES = [
+    "That sounds like a lot to carry, and I'm really glad you told me about it.",
+    "It makes complete sense that you feel this way after a day like that.",
+    "You handled more than most people would have, even if it didn't feel like it.",
+    "Take a slow breath with me and let the rest of the day settle for a moment.",
+    "Whatever comes next, you don't have to figure it all out tonight.",
+]
+
+MUSIC_DETAILS = {
+    "prompt": "A warm, uplifting song about finding calm after a long and "
+    "demanding day. Gentle guitars build into a hopeful chorus.",
+    "singer_name": "Norah Jones",
+    "music_genre": "Acoustic pop",
+}
+
+# OpenAI's "pcm" speech format: 24 kHz, 16-bit, mono
+PCM_SAMPLE_RATE = 24000
+
+
+class OpenAIStubServer:
+    """Local stand-in for the OpenAI chat completions and speech endpoints
+
+    Point OPENAI_BASE_URL (the SDK) and http_client.OPENAI_API_URL (raw
+    calls) at `api_url` to run replies, music details, session briefs and
+    TTS offline. Chat replies stream word by word after `first_token`
+    latency, one word every `token_interval` seconds. Speech returns a tone
+    of `speech_seconds_per_word` per input word as 24 kHz PCM (or WAV),
+    first byte after `tts_first_byte`, streamed `tts_speed` times faster
+    than real time. Failures from either LatencyModel are returned as that
+    model's `failure_status`.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        first_token=None,
+        token_interval=0.02,
+        reply_sentences=8,
+        tts_first_byte=None,
+        tts_speed=4.0,
+        speech_seconds_per_word=0.35,
+    ):
+        self.first_token = first_token or LatencyModel(0.4)
+        self.token_interval = token_interval
+        self.reply_sentences = reply_sentences
+        self.tts_first_byte = tts_first_byte or LatencyModel(0.3)
+        self.tts_speed = tts_speed
+        self.speech_seconds_per_word = speech_seconds_per_word
+        self.requests = {"chat": 0, "speech": 0, "failed": 0}
+        self.lock = Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.handle_post(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self.api_url = f"{self.base_url}/v1"
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _send_json(self, handler, status, body):
+        data = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _fail(self, handler, model):
+        with self.lock:
+            self.requests["failed"] += 1
+        self._send_json(
+            handler,
+            model.failure_status,
+            {"error": {"message": "stand-in failure", "type": "server_error"}},
+        )
+
+    def reply_text(self):
+        sentences = [
+            REPLY_SENTENCES[i % len(REPLY_SENTENCES)]
+            for i in range(max(0, self.reply_sentences - 1))
+        ]
+        return " ".join(sentences + [CLOSING_LINE])
+
+    def completion_text(self, body):
+        """What the real model would be asked for
+
+        Brief JSON, music details or a reply, depending on the request.
+        """
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            values = dict(MUSIC_DETAILS, reply=self.reply_text())
+            # Fields come out in schema order, as the real model emits them
+            return json.dumps({field: values[field] for field in schema["properties"]})
+
+        last_message = (body.get("messages") or [{}])[-1].get("content", "")
+        if "Output Format" in last_message:
+            return (
+                f"Prompt: {MUSIC_DETAILS['prompt']}\n"
+                f"Singer_Name: {MUSIC_DETAILS['singer_name']}\n"
+                f"Music_genre: {MUSIC_DETAILS['music_genre']}"
+            )
+        return self.reply_text()
+
+    def handle_post(self, handler):
+        path = urlparse(handler.path).path
+        length = int(handler.headers.get("Content-Length", 0))
+        body = json.loads(handler.rfile.read(length) or b"{}")
+
+        if path == "/v1/chat/completions":
+            with self.lock:
+                self.requests["chat"] += 1
+            return self.handle_chat(handler, body)
+        if path == "/v1/audio/speech":
+            with self.lock:
+                self.requests["speech"] += 1
+            return self.handle_speech(handler, body)
+        self._send_json(handler, 404, {"error": {"message": "not found"}})
+
+    def handle_chat(self, handler, body):
+        time.sleep(self.first_token.sample())
+        if self.first_token.fails():
+            return self._fail(handler, self.first_token)
+
+        text = self.completion_text(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "gpt-3.5-turbo")
+        # Split after spaces so the tokens join back into the exact text
+        tokens = [token for token in text.replace(" ", " \0").split("\0") if token]
+
+        if not body.get("stream"):
+            time.sleep(self.token_interval * len(tokens))
+            return self._send_json(
+                handler,
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            )
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        # No Content-Length: the body ends when the connection closes
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        try:
+            events = [chunk({"role": "assistant", "content": ""})]
+            events += [chunk({"content": token}) for token in tokens]
+            events.append(chunk({}, "stop"))
+            for i, event in enumerate(events):
+                if 1 < i < len(events) - 1:
+                    time.sleep(self.token_interval)
+                handler.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                handler.wfile.flush()
+            handler.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def speech_pcm(self, text):
+        """A soft tone as long as the text would take to say"""
+        seconds = max(0.5, len(text.split()) * self.speech_seconds_per_word)
+        t = np.arange(int(PCM_SAMPLE_RATE * seconds)) / PCM_SAMPLE_RATE
+        tone = 3000 * np.sin(2 * math.pi * 220 * t)
+        return tone.astype("<i2").tobytes()
+
+    def handle_speech(self, handler, body):
+        time.sleep(self.tts_first_byte.sample())
+        if self.tts_first_byte.fails():
+            return self._fail(handler, self.tts_first_byte)
+
+        response_format = body.get("response_format", "mp3")
+        if response_format not in ("pcm", "wav"):
+            return self._send_json(
+                handler,
+                400,
+                {
+                    "error": {
+                        "message": f"Unsupported stand-in format: {response_format}"
+                    }
+                },
+            )
+        data = self.speech_pcm(body.get("input", ""))
+        if response_format == "wav":
+            data = wav_bytes(data, PCM_SAMPLE_RATE)
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"audio/{response_format}")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        # Pace the body like a synthesizer running tts_speed x real time
+        chunk_size = PCM_SAMPLE_RATE * 2 // 10
+        try:
+            for start in range(0, len(data), chunk_size):
+                handler.wfile.write(data[start : start + chunk_size])
+                handler.wfile.flush()
+                time.sleep(0.1 / self.tts_speed)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def wav_bytes(pcm, sample_rate, channels=1):
+    """Wrap 16-bit PCM in a WAV header"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    # Run a stand-in on a fixed port for manual runs:
+    #   OPENAI_BASE_URL=http://127.0.0.1:8767/v1 OPENAI_API_KEY=stand-in python main.py
+    stub = OpenAIStubServer(port=8767).start()
+    print(f"OpenAI stand-in listening on {stub.api_url}")
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.close()
@@ -1,16 +1,53 @@
 # prompt_engineering.py
 
-import openai
 import json
-import requests
+import re
+import http_client
+from response_cache import get_response_cache
+from tracing import traced
 
-# Set up your OpenAI API key
-openai.api_key = "your_openai_api_key"
+MUSIC_LABELS = ("Prompt", "Singer_Name", "Music_genre")
 
 
-def generate_music_details(context, open_ai_key):
+def build_user_context(detected_mood, user_text):
+    return f"The user looks like they are feeling {detected_mood} by their face. {user_text}"
 
-    openai.api_key = open_ai_key
+
+def parse_music_details(content):
+    """Pull the labelled lines out of a reply; missing labels come back as None"""
+    values = {}
+    for line in content.split("\n"):
+        # Tolerate bullets, bold markers and label case changes
+        match = re.match(r"^[\s*\-#]*([A-Za-z_ ]+?)\**\s*:\s*(.+)$", line)
+        if not match:
+            continue
+        label = match.group(1).strip().replace(" ", "_").lower()
+        for expected in MUSIC_LABELS:
+            if label == expected.lower() and expected not in values:
+                values[expected] = match.group(2).strip().strip("*").strip()
+    return tuple(values.get(label) for label in MUSIC_LABELS)
+
+
+def generate_music_details(context, open_ai_key, mood=None, user_text=None):
+    """(prompt, singer, genre) for the context; (None, None, None) on failure
+
+    Callers that pass the detected mood and the user's own words get results
+    from the response cache (RESPONSE_CACHE=1) when someone has said the
+    same or something very similar in that mood.
+    """
+    cache = get_response_cache() if user_text else None
+    if cache:
+        cached = cache.get("music_details", mood, user_text)
+        if cached:
+            return tuple(cached)
+    details = request_music_details(context, open_ai_key)
+    if cache and all(details):
+        cache.put("music_details", mood, user_text, list(details))
+    return details
+
+
+@traced("llm_music_details")
+def request_music_details(context, open_ai_key):
 
     # Define the prompt to send to the API
     prompt = (
@@ -26,7 +63,7 @@ def generate_music_details(context, open_ai_key):
     )
 
     # Define the API endpoint
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{http_client.OPENAI_API_URL}/chat/completions"
 
     # Define the data for the POST request
     data = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": prompt}]}
@@ -34,11 +71,11 @@ def generate_music_details(context, open_ai_key):
     # Define the headers
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {openai.api_key}",
+        "Authorization": f"Bearer {open_ai_key}",
     }
 
     # Send the POST request
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = http_client.post(url, headers=headers, data=json.dumps(data))
 
     # Check if the request was successful
     if response.status_code == 200:
@@ -46,32 +83,8 @@ def generate_music_details(context, open_ai_key):
         response_content = response_data["choices"][0]["message"]["content"]
 
         # Extract the values from the response content
-        prompt_line = (
-            next(
-                line
-                for line in response_content.split("\n")
-                if line.startswith("Prompt:")
-            )
-            .replace("Prompt: ", "")
-            .strip()
-        )
-        singer_name_line = (
-            next(
-                line
-                for line in response_content.split("\n")
-                if line.startswith("Singer_Name:")
-            )
-            .replace("Singer_Name: ", "")
-            .strip()
-        )
-        music_genre_line = (
-            next(
-                line
-                for line in response_content.split("\n")
-                if line.startswith("Music_genre:")
-            )
-            .replace("Music_genre: ", "")
-            .strip()
+        prompt_line, singer_name_line, music_genre_line = parse_music_details(
+            response_content
         )
 
         # Return the extracted values
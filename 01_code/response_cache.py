@@ -0,0 +1,223 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+from text_embedding import cosine_similarities, embed_text, tokenize
+
+# Words a similar match may add or drop without changing the meaning.
+# Everything else (a negation, "praised" vs "yelled", who did what to whom)
+# must be the same words in the same order.
+FILLER_WORDS = {
+    "a", "an", "the", "and", "so", "very", "really", "just", "quite",
+    "pretty", "bit", "little", "kind", "of", "sort", "um", "uh", "oh",
+    "well", "like", "is", "am", "are", "was", "were", "be", "been",
+    "feel", "feeling", "felt", "today",
+}  # fmt: skip
+
+
+def normalize_query(text):
+    """Lower-case words without punctuation, so "I'm tired!" and "im tired" match exactly"""
+    return " ".join(tokenize(text.replace("'", "").replace("’", "")))
+
+
+def content_words(normalized):
+    return [word for word in normalized.split() if word not in FILLER_WORDS]
+
+
+class ResponseCache:
+    """Persistent cache of LLM results keyed by the user's words and mood
+
+    Lookups first try an exact hash of (kind, mood, normalized text), then
+    the most similar cached text of the same kind and mood by hashed
+    embedding, if it is at least `threshold` similar and only filler words
+    differ. Bag-of-words similarity stays high on a long utterance when one
+    word changes its meaning, so the threshold alone isn't enough. Entries
+    expire `ttl` seconds after they were stored; beyond `max_entries` the
+    least recently used go first. The index is kept as JSON plus a vector
+    matrix, like the song library.
+    """
+
+    def __init__(
+        self,
+        root=".response_cache",
+        threshold=0.85,
+        ttl=7 * 24 * 3600,
+        max_entries=1000,
+        save_interval=60,
+    ):
+        self.root = root
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.lock = Lock()
+        self.index_path = os.path.join(root, "index.json")
+        self.vectors_path = os.path.join(root, "vectors.npy")
+        self.hits = {"exact": 0, "similar": 0}
+        self.misses = 0
+        self.last_save = 0.0
+
+        os.makedirs(root, exist_ok=True)
+        self.entries = []
+        self.vectors = np.zeros((0, 512), dtype=np.float32)
+        self.by_key = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as index_file:
+                self.entries = json.load(index_file)
+            self.vectors = np.load(self.vectors_path)
+            if len(self.vectors) != len(self.entries):
+                raise ValueError("index and vectors are out of sync")
+        except (OSError, ValueError) as e:
+            print(f"[DEBUG] Could not load response cache, starting empty: {e}")
+            self.entries = []
+            self.vectors = np.zeros((0, 512), dtype=np.float32)
+        self._expire(time.time())
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(tmp_path, self.index_path)
+        with open(self.vectors_path + ".tmp", "wb") as vectors_file:
+            np.save(vectors_file, self.vectors)
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        self.last_save = time.time()
+
+    def key(self, kind, mood, text):
+        raw = "\0".join([kind, mood or "", normalize_query(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _keep(self, order):
+        self.entries = [self.entries[i] for i in order]
+        self.vectors = self.vectors[order]
+        self.by_key = {entry["key"]: i for i, entry in enumerate(self.entries)}
+
+    def _expire(self, now):
+        order = [
+            i for i, entry in enumerate(self.entries) if now - entry["created"] <= self.ttl
+        ]
+        self._keep(order)
+
+    def _nearest(self, kind, mood, normalized):
+        """(index, similarity) of the closest usable entry, or (None, best score)"""
+        scores = cosine_similarities(self.vectors, embed_text(normalized))
+        query_words = content_words(normalized)
+        best, best_score = None, 0.0
+        for i, entry in enumerate(self.entries):
+            if (
+                entry["kind"] == kind
+                and entry["mood"] == (mood or "")
+                and scores[i] > best_score
+                and content_words(entry["text"]) == query_words
+            ):
+                best, best_score = i, float(scores[i])
+        if best is None or best_score < self.threshold:
+            return None, best_score
+        return best, best_score
+
+    def get(self, kind, mood, text):
+        """The cached value for this input, or None"""
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            index, score, match = self.by_key.get(self.key(kind, mood, text)), 1.0, "exact"
+            if index is None:
+                index, score = self._nearest(kind, mood, normalize_query(text))
+                match = "similar"
+            if index is None:
+                self.misses += 1
+                return None
+            entry = self.entries[index]
+            entry["last_used"] = now
+            entry["hits"] += 1
+            self.hits[match] += 1
+            # Recency only matters for eviction, so it is saved lazily
+            if now - self.last_save > self.save_interval:
+                self._save()
+        print(f"[DEBUG] Response cache {match} hit ({round(score, 3)}): {entry['text']}")
+        return entry["value"]
+
+    def put(self, kind, mood, text, value):
+        """Store a result, replacing any entry with the same exact key"""
+        normalized = normalize_query(text)
+        if not normalized:
+            return
+        now = time.time()
+        key = self.key(kind, mood, text)
+        entry = {
+            "key": key,
+            "kind": kind,
+            "mood": mood or "",
+            "text": normalized,
+            "value": value,
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        with self.lock:
+            if key in self.by_key:
+                self.entries[self.by_key[key]] = entry
+            else:
+                self.entries.append(entry)
+                self.vectors = np.vstack([self.vectors, embed_text(normalized)[np.newaxis, :]])
+            self._expire(now)
+            self._evict()
+            try:
+                self._save()
+            except OSError as e:
+                print(f"[DEBUG] Could not save response cache: {e}")
+
+    def _evict(self):
+        """Drop the least recently used entries beyond max_entries"""
+        if len(self.entries) <= self.max_entries:
+            return
+        order = sorted(
+            range(len(self.entries)), key=lambda i: self.entries[i]["last_used"]
+        )[-self.max_entries :]
+        self._keep(sorted(order))
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.hits["exact"],
+                "similar_hits": self.hits["similar"],
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+            }
+
+
+_shared_cache = None
+_shared_lock = Lock()
+
+
+def get_response_cache():
+    """The process-wide cache, configured from the environment
+
+    Off unless RESPONSE_CACHE=1; RESPONSE_CACHE_DIR, _THRESHOLD, _TTL_HOURS
+    and _MAX_ENTRIES tune it.
+    """
+    global _shared_cache
+    if os.getenv("RESPONSE_CACHE") != "1":
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(
+                root=os.getenv("RESPONSE_CACHE_DIR", ".response_cache"),
+                threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.85")),
+                ttl=float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "168")) * 3600,
+                max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            )
+    return _shared_cache
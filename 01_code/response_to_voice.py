@@ -1,46 +1,127 @@
+import io
 import os
-import tempfile
-import pygame
 import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from http_client import get_openai_client
+from audio_player import PCMPlayer
+from tts_cache import TTSCache
+from tracing import span, traced, tracer
+
+# OpenAI's "pcm" format is raw 24 kHz, 16-bit, mono little-endian samples
+PCM_SAMPLE_RATE = 24000
+
+# Lines we say in (almost) every session, worth synthesizing ahead of time
+COMMON_PHRASES = [
+    "I have written a song for you, here it is.",
+]
 
 
 class ResponseToVoice:
-    def __init__(self):
+    def __init__(
+        self, model="tts-1-hd", voice="nova", response_format="pcm", cache=None
+    ):
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        pygame.mixer.init()
+        self.model = model
+        self.voice = voice
+        # "pcm" needs no decoding; anything else is decoded in memory by pydub
+        self.response_format = response_format
+        self.client = get_openai_client()
+        self.audio = None
+        self.cache = cache if cache is not None else TTSCache()
 
-    def read_text(self, text):
-        """Convert text to speech using OpenAI's Nova voice"""
+    def cache_key(self, text):
+        return self.cache.key(self.model, self.voice, self.response_format, text)
+
+    def prewarm(self, phrases=COMMON_PHRASES):
+        """Open the output device and cache recurring phrases ahead of time"""
         try:
-            print("\nConverting text to speech using Nova voice...")
+            self._output()
+        except Exception as e:
+            print(f"[DEBUG] Could not open audio output: {e}")
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase)
+            except Exception as e:
+                print(f"[DEBUG] Could not pre-warm TTS phrase: {e}")
+        print(f"[DEBUG] TTS cache pre-warmed: {self.cache.stats()}")
 
-            response = self.client.audio.speech.create(
-                model="tts-1-hd",
-                voice="nova",
-                input=text,
-            )
+    def _output(self):
+        """Reuse one PortAudio instance for every reply"""
+        if self.audio is None:
+            import pyaudio
 
-            # Create a temporary file to avoid access issues
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-                self.output_file = tmp_file.name
-                response.stream_to_file(self.output_file)
+            self.audio = pyaudio.PyAudio()
+        return self.audio
 
-            print("Playing audio...")
-            pygame.mixer.music.load(self.output_file)
-            pygame.mixer.music.play()
+    def _iter_audio(self, text, chunk_size=4096):
+        """Yield the TTS response body in chunks as it comes off the wire"""
+        with self.client.audio.speech.with_streaming_response.create(
+            model=self.model,
+            voice=self.voice,
+            input=text,
+            response_format=self.response_format,
+        ) as response:
+            yield from response.iter_bytes(chunk_size)
 
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
+    def to_pcm(self, data):
+        """Decode a non-PCM response held in memory to 24 kHz mono PCM"""
+        if self.response_format == "pcm":
+            return data
+        from pydub import AudioSegment
 
-            # Delay to ensure the file is no longer in use
-            time.sleep(1)  # Adjust as needed
+        segment = AudioSegment.from_file(io.BytesIO(data), format=self.response_format)
+        segment = segment.set_frame_rate(PCM_SAMPLE_RATE).set_channels(1)
+        return segment.set_sample_width(2).raw_data
 
-            # No file deletion logic since we want to keep the file
-            print(f"Audio file is kept at: {self.output_file}")
+    def synthesize(self, text):
+        """Synthesize text with OpenAI's Nova voice and return PCM bytes"""
+        key = self.cache_key(text)
+        data = self.cache.get(key)
+        if data is None:
+            with span("tts_synthesis", chars=len(text)):
+                data = b"".join(self._iter_audio(text))
+            self.cache.put(key, data)
+        return self.to_pcm(data)
 
+    @traced("tts_playback")
+    def play_audio(self, pcm):
+        """Play in-memory PCM and block until the completion event fires"""
+        player = PCMPlayer(PCM_SAMPLE_RATE, audio=self._output()).start()
+        player.feed(pcm)
+        player.finish()
+        player.wait()
+
+    def read_text(self, text):
+        """Convert text to speech using OpenAI's Nova voice"""
+        try:
+            print("\nConverting text to speech using Nova voice...")
+            key = self.cache_key(text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.play_audio(self.to_pcm(cached))
+                return True
+            if self.response_format != "pcm":
+                self.play_audio(self.synthesize(text))
+                return True
+
+            # Start playing with the first chunk of the HTTP response
+            player = PCMPlayer(PCM_SAMPLE_RATE, audio=self._output()).start()
+            print("Playing audio...")
+            received = bytearray()
+            start_time = time.perf_counter()
+            try:
+                for chunk in self._iter_audio(text):
+                    if not received:
+                        tracer.record(
+                            "tts_first_chunk", time.perf_counter() - start_time
+                        )
+                    player.feed(chunk)
+                    received.extend(chunk)
+                self.cache.put(key, bytes(received))
+                tracer.record("tts_synthesis", time.perf_counter() - start_time)
+            finally:
+                player.finish()
+            player.wait()
             return True
         except Exception as e:
             print(f"Error in text-to-speech conversion: {str(e)}")
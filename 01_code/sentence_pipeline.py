@@ -0,0 +1,89 @@
+# sentence_pipeline.py
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+from tracing import tracer
+
+# A sentence ends at . ! ? (optionally followed by quotes/brackets) then space
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+
+def split_sentences(tokens, min_chars=20):
+    """Group a stream of text tokens into sentences as soon as each one ends
+
+    Very short sentences ("Oh!") are merged into the next one so we don't pay
+    a TTS round trip for a single word.
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if match.end() - start >= min_chars:
+                yield buffer[start : match.end()].strip()
+                start = match.end()
+        buffer = buffer[start:]
+
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class SentencePipeline:
+    """Speaks a streamed reply sentence by sentence
+
+    Sentences are synthesized on up to `max_concurrency` worker threads and
+    played strictly in order on a playback thread, so the first sentence is
+    heard while later ones are still being generated and synthesized. At most
+    `max_pending` clips wait for playback, which bounds TTS spend if the
+    reply is abandoned.
+    """
+
+    def __init__(self, response_to_voice, max_concurrency=2, max_pending=4):
+        self.rtv = response_to_voice
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.time_to_first_audio = None
+
+    def speak_stream(self, tokens):
+        """Play a token stream as it arrives; returns (full_text, success)"""
+        start_time = time.time()
+        self.time_to_first_audio = None
+        clips = queue.Queue(maxsize=self.max_pending)
+        errors = []
+
+        def play_in_order():
+            while True:
+                future = clips.get()
+                if future is None:
+                    break
+                try:
+                    clip = future.result()
+                    if self.time_to_first_audio is None:
+                        self.time_to_first_audio = time.time() - start_time
+                        tracer.record("time_to_first_audio", self.time_to_first_audio)
+                    self.rtv.play_audio(clip)
+                except Exception as e:
+                    print(f"Error in text-to-speech conversion: {str(e)}")
+                    errors.append(e)
+
+        player = Thread(target=play_in_order)
+        player.daemon = True
+        player.start()
+
+        sentences = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            try:
+                for sentence in split_sentences(tokens):
+                    print(f"[DEBUG] Sentence ready for TTS: {sentence}")
+                    sentences.append(sentence)
+                    # Blocks once max_pending clips are waiting to be played
+                    clips.put(executor.submit(self.rtv.synthesize, sentence))
+            finally:
+                clips.put(None)
+                player.join()
+
+        full_text = " ".join(sentences)
+        return full_text, bool(sentences) and not errors
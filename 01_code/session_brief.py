@@ -0,0 +1,219 @@
+# session_brief.py
+import json
+import re
+import time
+
+from http_client import get_openai_client
+from prompt_engineering import build_user_context, parse_music_details
+from tracing import tracer
+
+MUSIC_FIELDS = ("prompt", "singer_name", "music_genre")
+
+CLOSING_LINE = "I have written a song for you, here it is."
+
+
+def brief_schema(reply_first):
+    # Properties are generated in schema order, which decides what streams first
+    fields = ["reply", *MUSIC_FIELDS] if reply_first else [*MUSIC_FIELDS, "reply"]
+    descriptions = {
+        "prompt": "2-3 sentence music prompt reflecting the emotional experience",
+        "singer_name": "Singer or band whose voice fits the mood",
+        "music_genre": "Music genre or style suiting the emotions conveyed",
+        "reply": "Spoken empathetic reply of about one minute",
+    }
+    return {
+        "name": "session_brief",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                field: {"type": "string", "description": descriptions[field]}
+                for field in fields
+            },
+            "required": fields,
+            "additionalProperties": False,
+        },
+    }
+
+
+def build_brief_messages(user_text, detected_mood):
+    context = build_user_context(detected_mood, user_text)
+    instructions = (
+        f'User Input: "{context}"\n\n'
+        "Fill in every field of the JSON object.\n"
+        "reply: Respond as an empathetic and friendly conversational partner. Your response should be engaging, supportive, "
+        "and continuous for approximately one minute, speaking as a comforting friend who listens, reassures, and "
+        f"validates the user's emotions or experience. Make sure to conclude the response with: '{CLOSING_LINE}'\n"
+        "prompt: A music prompt 2-3 sentences in length that reflects the emotional experience described.\n"
+        "singer_name: If any popular singer/band's name is mentioned in any positive context, use that; otherwise "
+        "select a popular singer (could be any gender) whose singing voice aligns with the emotions and genre, "
+        "avoiding overused selections.\n"
+        "music_genre: A suitable music genre or style based on the emotions conveyed."
+    )
+    return [
+        {
+            "role": "system",
+            "content": "You are an empathetic and friendly AI that responds thoughtfully to user inputs.",
+        },
+        {"role": "user", "content": instructions},
+    ]
+
+
+class PartialJSONFields:
+    """Reads top-level string fields out of a JSON object while it streams in
+
+    Completed fields are available as soon as their closing quote arrives,
+    and the text of a field still being written can be read incrementally.
+    """
+
+    KEY = re.compile(r'"(\w+)"\s*:\s*"')
+    ESCAPES = {
+        '"': '"',
+        "\\": "\\",
+        "/": "/",
+        "b": "\b",
+        "f": "\f",
+        "n": "\n",
+        "r": "\r",
+        "t": "\t",
+    }
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.partial = {}
+        # Only look for keys after the last finished value, never inside one
+        self.scan_from = 0
+
+    def feed(self, text):
+        self.buffer += text
+        while True:
+            match = self.KEY.search(self.buffer, self.scan_from)
+            if not match:
+                break
+            key = match.group(1)
+            value, end = self._read_string(match.end())
+            if end is None:
+                self.partial[key] = value
+                break
+            self.fields[key] = value
+            self.partial.pop(key, None)
+            self.scan_from = end + 1
+
+    def _read_string(self, start):
+        """Decode a JSON string from start; returns (text, closing quote index)"""
+        chars = []
+        i = start
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                return "".join(chars), i
+            if char == "\\":
+                if i + 1 >= len(self.buffer):
+                    break  # escape split across chunks
+                code = self.buffer[i + 1]
+                if code == "u":
+                    if i + 6 > len(self.buffer):
+                        break
+                    chars.append(chr(int(self.buffer[i + 2 : i + 6], 16)))
+                    i += 6
+                    continue
+                chars.append(self.ESCAPES.get(code, code))
+                i += 2
+                continue
+            chars.append(char)
+            i += 1
+        return "".join(chars), None
+
+    def text(self, key):
+        """Everything decoded so far for key, finished or not"""
+        return self.fields.get(key, self.partial.get(key, ""))
+
+
+class SessionBrief:
+    """One structured completion that yields the reply and the music brief
+
+    stream() yields reply text as it is generated and calls
+    on_music_details(prompt, singer_name, music_genre) the moment all three
+    music fields are complete, so the song can be submitted mid-stream. By
+    default the short music fields are generated before the reply, which
+    starts the song several seconds earlier for well under a second of extra
+    delay before the first spoken word; pass reply_first=True to invert.
+    """
+
+    def __init__(self, client=None, model="gpt-4o-mini", reply_first=False):
+        self.client = client or get_openai_client()
+        self.model = model
+        self.reply_first = reply_first
+        self.result = None
+
+    def stream(self, user_text, detected_mood, on_music_details=None):
+        self.result = None
+        parser = PartialJSONFields()
+        sent = 0
+        details_sent = False
+        start_time = time.perf_counter()
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=build_brief_messages(user_text, detected_mood),
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": brief_schema(self.reply_first),
+                },
+                max_tokens=700,
+                temperature=0.7,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if not parser.buffer:
+                    tracer.record(
+                        "llm_brief_first_token", time.perf_counter() - start_time
+                    )
+                parser.feed(chunk.choices[0].delta.content)
+
+                reply = parser.text("reply")
+                if len(reply) > sent:
+                    yield reply[sent:]
+                    sent = len(reply)
+
+                if not details_sent and all(f in parser.fields for f in MUSIC_FIELDS):
+                    details_sent = True
+                    tracer.record(
+                        "llm_brief_music_details", time.perf_counter() - start_time
+                    )
+                    if on_music_details:
+                        on_music_details(*(parser.fields[f] for f in MUSIC_FIELDS))
+        except Exception as e:
+            print(f"Error streaming session brief: {e}")
+
+        tracer.record("llm_brief", time.perf_counter() - start_time)
+        self.result = self._finalize(parser)
+        reply = self.result["reply"] or ""
+        if len(reply) > sent:
+            yield reply[sent:]
+
+        if not details_sent and on_music_details:
+            details = [self.result[f] for f in MUSIC_FIELDS]
+            if all(details):
+                on_music_details(*details)
+
+    def _finalize(self, parser):
+        """Best effort: strict JSON, then streamed fields, then labelled lines"""
+        try:
+            data = json.loads(parser.buffer)
+            if isinstance(data, dict):
+                return {key: data.get(key) for key in ("reply", *MUSIC_FIELDS)}
+        except ValueError:
+            pass
+
+        result = {key: parser.fields.get(key) for key in ("reply", *MUSIC_FIELDS)}
+        result["reply"] = result["reply"] or parser.text("reply") or None
+        if not all(result[f] for f in MUSIC_FIELDS):
+            # The model ignored the schema; try the plain-text label format
+            labelled = parse_music_details(parser.buffer)
+            for field, value in zip(MUSIC_FIELDS, labelled):
+                result[field] = result[field] or value
+        return result
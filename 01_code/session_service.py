@@ -0,0 +1,522 @@
+# session_service.py
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from audio_utils import decode_audio
+from http_client import get_async_openai_client
+from prompt_engineering import build_user_context, generate_music_details
+from song_generator import build_description_prompt
+from song_job_manager import SongJobManager
+from streaming_stt import GoogleBackend
+from text_to_response import TextToResponse
+from tracing import session_scope, tracer
+from tts_cache import TTSCache
+
+# OpenAI's "pcm" TTS format: 24 kHz, 16-bit, mono little-endian
+REPLY_SAMPLE_RATE = 24000
+
+
+class ServiceBusy(Exception):
+    """Admission control turned a request away; carries the HTTP status"""
+
+    def __init__(self, message, status=503, retry_after=5):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Session:
+    """Per-kiosk state: face tracker, mood votes and the latest turn"""
+
+    def __init__(self, session_id, face_localizer, mood_aggregator):
+        self.session_id = session_id
+        self.face_localizer = face_localizer
+        self.mood_aggregator = mood_aggregator
+        self.created = self.last_seen = time.time()
+        # Frames of one session share tracker state, so score them in order
+        self.lock = Lock()
+        self.turn_active = False
+
+        self.mood = None
+        self.mood_confidence = 0.0
+        self.transcript = None
+        self.reply = None
+        self.reply_audio = None
+        self.song_status = None
+        self.audio_url = None
+        self.song_task = None
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def status(self):
+        return {
+            "session_id": self.session_id,
+            "mood": self.mood,
+            "mood_confidence": round(self.mood_confidence, 3),
+            "transcript": self.transcript,
+            "reply": self.reply,
+            "reply_audio": (
+                f"/sessions/{self.session_id}/reply.pcm" if self.reply_audio else None
+            ),
+            "song": {"status": self.song_status, "audio_url": self.audio_url},
+        }
+
+
+class SessionService:
+    """Long-running HTTP service that serves many kiosks from warm resources
+
+    The emotion model, face cascade, TTS cache, OpenAI clients and the song
+    job manager are built once in start() and shared by every session.
+    Face scoring runs on a `cv_workers` thread pool; chat, TTS and song
+    polling are async I/O on one event loop, with the remaining blocking
+    calls (speech recognition, music details) on an `io_workers` pool.
+    Admission control caps open sessions, queued frames and concurrent
+    turns, answering 503/429 with Retry-After instead of queueing forever.
+    """
+
+    def __init__(
+        self,
+        udio_key,
+        open_ai_key,
+        host="0.0.0.0",
+        port=8080,
+        max_sessions=8,
+        session_ttl=300,
+        cv_workers=2,
+        max_pending_frames=16,
+        io_workers=8,
+        max_turns=4,
+        stt_backend=None,
+        chat_model="gpt-3.5-turbo",
+        tts_model="tts-1-hd",
+        voice="nova",
+        detector="haar",
+        emotion_engine=None,
+    ):
+        self.udio_key = udio_key
+        self.open_ai_key = open_ai_key
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_pending_frames = max_pending_frames
+        self.max_turns = max_turns
+        self.chat_model = chat_model
+        self.tts_model = tts_model
+        self.voice = voice
+        self.detector = detector
+        self.stt_backend = stt_backend or GoogleBackend()
+
+        self.cv_executor = ThreadPoolExecutor(max_workers=cv_workers)
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers)
+        self.sessions = {}
+        self.lock = Lock()
+        self.model_lock = Lock()
+        self.pending_frames = 0
+        self.active_turns = 0
+
+        self.loop = None
+        self.server = None
+        # Built in start() unless one is given (e.g. a stand-in for tests)
+        self.emotion_engine = emotion_engine
+        self.songs = None
+
+    def start(self):
+        """Warm every shared resource, then start the loop and HTTP server"""
+        from emotion_engine import create_emotion_engine
+
+        start_time = time.time()
+        self.emotion_engine = self.emotion_engine or create_emotion_engine()
+        self.ttr = TextToResponse()
+        self.tts_cache = TTSCache()
+
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        self.songs = SongJobManager(
+            self.udio_key, multi_id_param=os.getenv("UDIO_MULTI_ID_PARAM")
+        )
+        self.run(self.songs.start())
+        self.client = get_async_openai_client()
+
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service.handle(self, "GET")
+
+            def do_POST(self):
+                service.handle(self, "POST")
+
+            def do_DELETE(self):
+                service.handle(self, "DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        print(
+            f"[DEBUG] Session service ready on {self.host}:{self.port} "
+            f"in {round(time.time() - start_time, 2)} seconds"
+        )
+        return self
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the service loop from a handler thread
+
+        On timeout the coroutine is cancelled too, so it cannot outlive the
+        caller (a timed-out turn would otherwise overlap the next one).
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.songs:
+            self.run(self.songs.stop())
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.cv_executor.shutdown(wait=False)
+        self.io_executor.shutdown(wait=False)
+
+    # Sessions and admission control
+
+    def _reap(self):
+        """Drop sessions idle for longer than session_ttl; call with the lock"""
+        now = time.time()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_seen > self.session_ttl and not session.turn_active:
+                print(f"[DEBUG] Session {session_id} expired")
+                self._drop(session_id)
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session and session.song_task:
+            self.loop.call_soon_threadsafe(session.song_task.cancel)
+
+    def create_session(self):
+        from face_localizer import FaceLocalizer
+        from mood_estimator import MoodAggregator
+
+        with self.lock:
+            self._reap()
+            if len(self.sessions) >= self.max_sessions:
+                raise ServiceBusy("All session slots are in use", 503, 10)
+            session_id = uuid.uuid4().hex
+            # Tracker and vote state are per camera, the models are shared
+            self.sessions[session_id] = Session(
+                session_id,
+                FaceLocalizer(detector=self.detector),
+                MoodAggregator(),
+            )
+        print(f"[DEBUG] Session {session_id} opened ({len(self.sessions)} active)")
+        return session_id
+
+    def get_session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        session.touch()
+        return session
+
+    def close_session(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                raise KeyError(session_id)
+            self._drop(session_id)
+
+    # Frames: CPU-bound, on the CV pool
+
+    def score_frame(self, session, data):
+        with self.lock:
+            if self.pending_frames >= self.max_pending_frames:
+                raise ServiceBusy("Too many frames queued", 429, 1)
+            self.pending_frames += 1
+        try:
+            return self.cv_executor.submit(self._score_frame, session, data).result()
+        finally:
+            with self.lock:
+                self.pending_frames -= 1
+
+    def _score_frame(self, session, data):
+        import cv2
+
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Could not decode image")
+        with session.lock, session_scope(session.session_id):
+            faces = session.face_localizer.locate(frame)
+            if faces:
+                x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+                # Keras inference is not guaranteed to be thread-safe
+                with self.model_lock:
+                    scores = self.emotion_engine.predict_batch(
+                        [frame[y : y + h, x : x + w]]
+                    )[0]
+                session.mood_aggregator.update(scores)
+            session.mood, session.mood_confidence = (
+                session.mood_aggregator.estimate()
+            )
+        return {
+            "faces": len(faces),
+            "mood": session.mood,
+            "confidence": round(session.mood_confidence, 3),
+        }
+
+    # Turns: async I/O on the service loop
+
+    def take_turn(self, session, samples, sample_rate):
+        with self.lock:
+            if session.turn_active:
+                raise ServiceBusy("A turn is already running for this session", 409, 1)
+            if self.active_turns >= self.max_turns:
+                raise ServiceBusy("Too many turns in progress", 429, 2)
+            self.active_turns += 1
+            session.turn_active = True
+        # This turn uses the mood from the frames seen so far; frames after
+        # it vote afresh, so one early mood doesn't stick to the session
+        with session.lock:
+            mood = session.mood or "neutral"
+            session.mood_aggregator.reset()
+        try:
+            return self.run(
+                self._turn(session, samples, sample_rate, mood), timeout=180
+            )
+        finally:
+            with self.lock:
+                self.active_turns -= 1
+                session.turn_active = False
+
+    async def _blocking(self, function, *args):
+        # Carry the session ID into the worker thread for tracing
+        context = contextvars.copy_context()
+        return await self.loop.run_in_executor(
+            self.io_executor, functools.partial(context.run, function, *args)
+        )
+
+    async def _turn(self, session, samples, sample_rate, mood):
+        with session_scope(session.session_id):
+            return await self._traced_turn(session, samples, sample_rate, mood)
+
+    async def _traced_turn(self, session, samples, sample_rate, mood):
+        transcript = await self._blocking(
+            self.stt_backend.recognize, samples, sample_rate
+        )
+        if not transcript:
+            raise ValueError("Could not understand audio")
+        session.transcript = transcript
+
+        # The song starts now and keeps generating after this turn returns.
+        # A song still running from the previous turn is abandoned.
+        if session.song_task and not session.song_task.done():
+            session.song_task.cancel()
+        session.song_status, session.audio_url = "pending", None
+        song_task = asyncio.ensure_future(self._song(session, transcript, mood))
+        session.song_task = song_task
+        try:
+            session.reply = await self._reply(transcript)
+            session.reply_audio = await self._speak(session.reply)
+        except asyncio.CancelledError:
+            # A timed-out turn takes its song with it
+            song_task.cancel()
+            raise
+        return session.status()
+
+    async def _reply(self, transcript):
+        cache = self.ttr.cache
+        cached = cache.get("reply", None, transcript) if cache else None
+        if cached:
+            return cached
+        with tracer.span("llm_reply"):
+            response = await self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=self.ttr.build_messages(transcript),
+                max_tokens=500,
+                temperature=0.7,
+            )
+        reply = response.choices[0].message.content.strip()
+        if cache and reply:
+            cache.put("reply", None, transcript, reply)
+        return reply
+
+    async def _speak(self, text):
+        key = self.tts_cache.key(self.tts_model, self.voice, "pcm", text)
+        data = self.tts_cache.get(key)
+        if data is None:
+            with tracer.span("tts_synthesis", chars=len(text)):
+                async with self.client.audio.speech.with_streaming_response.create(
+                    model=self.tts_model,
+                    voice=self.voice,
+                    input=text,
+                    response_format="pcm",
+                ) as response:
+                    data = await response.read()
+            self.tts_cache.put(key, data)
+        return data
+
+    async def _song(self, session, transcript, mood):
+        def update(status, audio_url=None):
+            # Once a newer turn has started its song, this one owns nothing
+            if session.song_task is asyncio.current_task():
+                session.song_status, session.audio_url = status, audio_url
+
+        try:
+            details = await self._blocking(
+                generate_music_details,
+                build_user_context(mood, transcript),
+                self.open_ai_key,
+                mood,
+                transcript,
+            )
+            if not all(details):
+                update("failed")
+                return
+            audio_url = await self.songs.submit(
+                details[0], build_description_prompt(*details)
+            )
+            update("done" if audio_url else "failed", audio_url)
+        except asyncio.CancelledError:
+            update("cancelled")
+            raise
+        except Exception as e:
+            print(f"[DEBUG] Song for session {session.session_id} failed: {e}")
+            update("failed")
+
+    # HTTP
+
+    def health(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "pending_frames": self.pending_frames,
+                "active_turns": self.active_turns,
+                "songs_in_flight": len(self.songs.pending),
+                "tts_cache": self.tts_cache.stats(),
+                "response_cache": self.ttr.cache.stats() if self.ttr.cache else None,
+            }
+
+    def handle(self, request, method):
+        url = urlparse(request.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(request.headers.get("Content-Length", 0))
+        body = request.rfile.read(length) if length else b""
+
+        try:
+            if parts == ["health"] and method == "GET":
+                return self.respond(request, 200, self.health())
+            if parts == ["metrics"] and method == "GET":
+                return self.respond(
+                    request,
+                    200,
+                    tracer.to_prometheus().encode(),
+                    "text/plain; version=0.0.4",
+                )
+            if parts == ["sessions"] and method == "POST":
+                return self.respond(request, 201, {"session_id": self.create_session()})
+            if len(parts) < 2 or parts[0] != "sessions":
+                return self.respond(request, 404, {"error": "Not found"})
+
+            session_id, action = parts[1], parts[2] if len(parts) > 2 else None
+            if action is None and method == "DELETE":
+                self.close_session(session_id)
+                return self.respond(request, 200, {"closed": session_id})
+
+            session = self.get_session(session_id)
+            if action is None and method == "GET":
+                return self.respond(request, 200, session.status())
+            if action == "frames" and method == "POST":
+                return self.respond(request, 200, self.score_frame(session, body))
+            if action == "audio" and method == "POST":
+                samples, sample_rate = decode_audio(body, query.get("sample_rate"))
+                return self.respond(
+                    request, 200, self.take_turn(session, samples, sample_rate)
+                )
+            if action == "reply.pcm" and method == "GET" and session.reply_audio:
+                return self.respond(
+                    request,
+                    200,
+                    session.reply_audio,
+                    f"audio/L16; rate={REPLY_SAMPLE_RATE}; channels=1",
+                )
+            return self.respond(request, 404, {"error": "Not found"})
+        except ServiceBusy as e:
+            return self.respond(
+                request, e.status, {"error": str(e)}, retry_after=e.retry_after
+            )
+        except KeyError:
+            return self.respond(request, 404, {"error": "Unknown session"})
+        except ValueError as e:
+            return self.respond(request, 400, {"error": str(e)})
+        except Exception as e:
+            print(f"[DEBUG] Error handling {method} {url.path}: {e}")
+            return self.respond(request, 500, {"error": str(e)})
+
+    def respond(
+        self,
+        request,
+        status,
+        payload,
+        content_type="application/json",
+        retry_after=None,
+    ):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        if retry_after:
+            request.send_header("Retry-After", str(retry_after))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    from config import OPENAI_API_KEY, UDIO_KEY, require_keys
+
+    require_keys()
+    service = SessionService(
+        UDIO_KEY,
+        OPENAI_API_KEY,
+        host=os.getenv("SERVICE_HOST", "0.0.0.0"),
+        port=int(os.getenv("SERVICE_PORT", "8080")),
+        max_sessions=int(os.getenv("SERVICE_MAX_SESSIONS", "8")),
+        cv_workers=int(os.getenv("SERVICE_CV_WORKERS", "2")),
+        max_turns=int(os.getenv("SERVICE_MAX_TURNS", "4")),
+        detector=os.getenv("FACE_DETECTOR", "haar"),
+    ).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nService interrupted by user")
+    finally:
+        service.close()
+        print("Service stopped")
+
+
+if __name__ == "__main__":
+    main()
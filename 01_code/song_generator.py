@@ -2,10 +2,29 @@
 
 import requests
 import json
+import http_client
+import os
+import random
 import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+from tracing import span, traced, tracer
+
+# Overridable so the pipeline can run against a local stand-in server
+UDIO_API_URL = os.getenv("UDIO_API_URL", "https://udioapi.pro/api")
+
+
+def build_description_prompt(prompt, singer_name, music_genre):
+    return (
+        f"The song should feature the singing voice closest to {singer_name} "
+        f"in the style of {music_genre}. {prompt}. "
+        "Limit the song generated to be as short as possible."
+    )
 
 
 # Function to start the song generation process
+@traced("song_submit")
 def generate_song_request(
     api_token,
     prompt,
@@ -13,26 +32,33 @@ def generate_song_request(
     model="chirp-v3.0",
     custom_mode=False,
     make_instrumental=False,
+    callback_url="",
 ):
-    url = "https://udioapi.pro/api/generate"
+    url = f"{UDIO_API_URL}/generate"
     payload = {
         "prompt": prompt,
         "gpt_description_prompt": gpt_description_prompt,
         "custom_mode": custom_mode,
         "make_instrumental": make_instrumental,
         "model": model,
-        "callback_url": "",
-        "disable_callback": True,
+        "callback_url": callback_url,
+        # Only ask for a callback when we have somewhere to receive it
+        "disable_callback": not callback_url,
         "token": api_token,
     }
     headers = {"Content-Type": "application/json"}
 
     # Send the POST request to start generation
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = http_client.post(url, headers=headers, data=json.dumps(payload))
 
     if response.status_code == 200:
+        try:
+            workId = response.json().get("workId")
+        except ValueError:
+            print("Song generation response was not JSON:", response.text[:200])
+            return None
         print("Song generation request sent successfully!")
-        return response.json().get("workId")
+        return workId
     else:
         print(
             "Failed to send song generation request. Status code:", response.status_code
@@ -41,35 +67,218 @@ def generate_song_request(
         return None
 
 
+def is_transient(status_code):
+    """Rate limiting and server errors are worth retrying"""
+    return status_code == 429 or status_code >= 500
+
+
+def next_interval(interval, backoff, max_interval, jitter):
+    """Grow the polling interval and spread it by +/- jitter"""
+    interval = min(interval * backoff, max_interval)
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def extract_audio_url(data):
+    """Return the audio URL from a completed feed or callback payload"""
+    if data.get("type") != "complete":
+        return None
+    for item in data.get("response_data") or []:
+        if item.get("audio_url"):
+            return item["audio_url"]
+    return None
+
+
 # Function to poll the status of the song generation
-def poll_song_status(api_token, workId, interval=10):
-    url = "https://udioapi.pro/api/feed"
+def poll_song_status(
+    api_token,
+    workId,
+    initial_interval=2.0,
+    max_interval=10.0,
+    backoff=1.5,
+    jitter=0.2,
+    deadline=600,
+    max_errors=5,
+    wake_event=None,
+    callback_result=None,
+):
+    """Poll until the song is ready, starting fast and backing off
+
+    Transient failures (network errors, 429, 5xx) are retried up to
+    max_errors times in a row. If wake_event is given, a webhook can set it to
+    end the current wait early; callback_result() is then checked before the
+    next poll.
+    """
+    url = f"{UDIO_API_URL}/feed"
     headers = {"Authorization": f"Bearer {api_token}"}
     start_time = time.time()  # Record the start time
+    interval = initial_interval
+    errors = 0
     print("Song generation is in progress...")
-    while True:
-        # Send a GET request to check the status
-        response = requests.get(f"{url}?workId={workId}", headers=headers)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            if data.get("type") == "complete":
-                audio_url = data["response_data"][0]["audio_url"]
-                print("Song generation complete!")
-                print("Audio URL:", audio_url)
-                end_time = time.time()  # Record the end time
-                total_time = end_time - start_time  # Calculate total time taken
+    while time.time() - start_time < deadline:
+        audio_url = callback_result() if callback_result else None
+
+        if audio_url is None:
+            try:
+                # Send a GET request to check the status
+                with span("song_poll"):
+                    # This loop does the retrying, so the adapter doesn't
+                    response = http_client.get(
+                        url,
+                        retry=False,
+                        params={"workId": workId},
+                        headers=headers,
+                        timeout=10,
+                    )
+                status_code = response.status_code
+                data = response.json() if status_code == 200 else None
+            except requests.RequestException as e:
+                print(f"Error polling song status: {e}")
+                status_code = None
+            except ValueError:
+                # An HTML error page or empty body, e.g. from a proxy; retry
+                print("Song status response was not JSON")
+                status_code = None
+
+            if status_code == 200:
+                errors = 0
+                audio_url = extract_audio_url(data)
+            elif status_code is None or is_transient(status_code):
+                errors += 1
+                if errors > max_errors:
+                    print("Too many errors while polling song status, giving up")
+                    return None
+                print(f"Transient error polling song status ({status_code}), retrying")
+            else:
                 print(
-                    "Total time to generate the song:", round(total_time, 2), "seconds"
+                    "Failed to retrieve the song status. Status code:", status_code
                 )
-                return audio_url
+                print("Error:", response.text)
+                return None
+
+        if audio_url:
+            print("Song generation complete!")
+            print("Audio URL:", audio_url)
+            total_time = time.time() - start_time  # Calculate total time taken
+            tracer.record("song_generation", total_time, attrs={"work_id": workId})
+            return audio_url
+
+        # Wait before polling again, unless a callback wakes us up first
+        wait = min(interval, max(0.0, deadline - (time.time() - start_time)))
+        if wake_event is not None:
+            wake_event.wait(wait)
+            wake_event.clear()
         else:
-            print(
-                "Failed to retrieve the song status. Status code:", response.status_code
-            )
-            print("Error:", response.text)
-            break
+            time.sleep(wait)
+        interval = next_interval(interval, backoff, max_interval, jitter)
+
+    print("Song generation did not finish before the deadline")
+    return None
 
-        # Wait before polling again
-        time.sleep(interval)
+
+class SongCallbackReceiver:
+    """Local HTTP endpoint that receives Udio completion callbacks
+
+    `public_url` is the address Udio should call (it must reach this device,
+    e.g. through a tunnel); the server itself listens on host:port.
+    """
+
+    def __init__(self, public_url, host="0.0.0.0", port=8765, path="/udio-callback"):
+        self.public_url = public_url.rstrip("/") + path
+        self.path = path
+        self.results = {}
+        self.events = {}
+        self.lock = Lock()
+
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?")[0] != receiver.path:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    receiver.handle_payload(json.loads(self.rfile.read(length)))
+                    self.send_response(200)
+                except ValueError:
+                    self.send_response(400)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[DEBUG] Song callback receiver listening on {host}:{port}{path}")
+
+    def event_for(self, workId):
+        with self.lock:
+            return self.events.setdefault(workId, Event())
+
+    def handle_payload(self, data):
+        """Record a completion callback; ValueError if it isn't a JSON object"""
+        if not isinstance(data, dict):
+            raise ValueError("Callback body is not a JSON object")
+        nested = data.get("data")
+        if not isinstance(nested, dict):
+            nested = {}
+        workId = data.get("workId") or nested.get("workId")
+        audio_url = extract_audio_url(data) or extract_audio_url(nested)
+        if not workId or not audio_url:
+            return
+        print(f"[DEBUG] Callback received for {workId}")
+        with self.lock:
+            self.results[workId] = audio_url
+        self.event_for(workId).set()
+
+    def result(self, workId):
+        with self.lock:
+            return self.results.get(workId)
+
+    def release(self, workId):
+        """Forget a job once its waiter is done, so a long-running service
+        doesn't keep every result and event"""
+        with self.lock:
+            self.results.pop(workId, None)
+            self.events.pop(workId, None)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SongJobTracker:
+    """Submits a song and waits for it via webhook, falling back to polling"""
+
+    def __init__(self, api_token, callback_receiver=None, **poll_options):
+        self.api_token = api_token
+        self.callback_receiver = callback_receiver
+        self.poll_options = poll_options
+
+    def submit(self, prompt, gpt_description_prompt, **kwargs):
+        callback_url = (
+            self.callback_receiver.public_url if self.callback_receiver else ""
+        )
+        return generate_song_request(
+            self.api_token,
+            prompt,
+            gpt_description_prompt,
+            callback_url=callback_url,
+            **kwargs,
+        )
+
+    def wait(self, workId):
+        if self.callback_receiver is None:
+            return poll_song_status(self.api_token, workId, **self.poll_options)
+        try:
+            return poll_song_status(
+                self.api_token,
+                workId,
+                wake_event=self.callback_receiver.event_for(workId),
+                callback_result=lambda: self.callback_receiver.result(workId),
+                **self.poll_options,
+            )
+        finally:
+            self.callback_receiver.release(workId)
@@ -0,0 +1,233 @@
+# song_job_manager.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import requests
+
+import http_client
+import song_generator
+from song_generator import extract_audio_url, generate_song_request, is_transient
+from tracing import traced, tracer
+
+
+class SongJob:
+    def __init__(self, workId, future, deadline, on_complete=None):
+        self.workId = workId
+        self.future = future
+        self.deadline = deadline
+        self.on_complete = on_complete
+        self.submitted_at = time.time()
+
+
+class SongJobManager:
+    """One asyncio loop that submits songs and polls every pending job together
+
+    - At most `max_in_flight` songs are generating at once; extra submissions
+      wait for a slot instead of hitting the provider.
+    - A single scheduler checks all pending work IDs every `poll_interval`.
+      If the feed endpoint accepts several IDs in one request, set
+      `multi_id_param` (e.g. "workIds") and `multi_id_batch`; otherwise the
+      IDs are polled individually on the same tick.
+    - Results are delivered through asyncio futures and optional callbacks.
+
+    The blocking `requests` calls run on a small thread pool so the event
+    loop never stalls on network I/O.
+    """
+
+    def __init__(
+        self,
+        api_token,
+        max_in_flight=4,
+        poll_interval=3.0,
+        deadline=600,
+        multi_id_param=None,
+        multi_id_batch=20,
+        http_workers=4,
+    ):
+        self.api_token = api_token
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.deadline = deadline
+        self.multi_id_param = multi_id_param
+        self.multi_id_batch = multi_id_batch
+        self.executor = ThreadPoolExecutor(max_workers=http_workers)
+
+        self.pending = {}
+        self.loop = None
+        self.slots = None
+        self.scheduler = None
+        self.thread = None
+
+    async def start(self):
+        """Start the shared polling scheduler on the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.scheduler = asyncio.create_task(self._poll_forever())
+
+    def start_in_thread(self):
+        """Run the manager on its own loop thread, for use from sync code"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+        return self
+
+    async def stop(self):
+        if self.scheduler:
+            self.scheduler.cancel()
+        for job in self.pending.values():
+            if not job.future.done():
+                job.future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=False)
+
+    def stop_thread(self):
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _blocking(self, function, *args, **kwargs):
+        return await self.loop.run_in_executor(
+            self.executor, lambda: function(*args, **kwargs)
+        )
+
+    async def submit(self, prompt, gpt_description_prompt, on_complete=None, **kwargs):
+        """Generate a song; returns the audio URL, or None on failure"""
+        async with self.slots:
+            workId = await self._blocking(
+                generate_song_request,
+                self.api_token,
+                prompt,
+                gpt_description_prompt,
+                **kwargs,
+            )
+            if not workId:
+                if on_complete:
+                    on_complete(None, None)
+                return None
+
+            # The slot is held until the song is finished or abandoned
+            return await self.track(workId, on_complete)
+
+    async def track(self, workId, on_complete=None):
+        """Wait for a song submitted elsewhere (e.g. before a restart)
+
+        Polled with every other pending job; does not take a slot.
+        """
+        job = SongJob(
+            workId,
+            self.loop.create_future(),
+            time.time() + self.deadline,
+            on_complete,
+        )
+        self.pending[workId] = job
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # Nobody waits for it any more: stop polling it
+            self.pending.pop(workId, None)
+            raise
+
+    def submit_threadsafe(self, prompt, gpt_description_prompt, **kwargs):
+        """submit() from another thread; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(
+            self.submit(prompt, gpt_description_prompt, **kwargs), self.loop
+        )
+
+    def _finish(self, workId, audio_url):
+        job = self.pending.pop(workId, None)
+        if job is None:
+            return
+        if not job.future.done():
+            job.future.set_result(audio_url)
+        tracer.record(
+            "song_generation",
+            time.time() - job.submitted_at,
+            error=None if audio_url else "NoAudio",
+            attrs={"work_id": workId},
+        )
+        print(f"[DEBUG] Song {workId} finished: {audio_url}")
+        if job.on_complete:
+            job.on_complete(workId, audio_url)
+
+    @traced("song_poll")
+    def _get(self, params):
+        # The scheduler polls again next tick, so the adapter doesn't retry
+        return http_client.get(
+            f"{song_generator.UDIO_API_URL}/feed",
+            retry=False,
+            params=params,
+            headers={"Authorization": f"Bearer {self.api_token}"},
+            timeout=10,
+        )
+
+    async def _poll_one(self, workId):
+        try:
+            response = await self._blocking(self._get, {"workId": workId})
+        except requests.RequestException as e:
+            print(f"[DEBUG] Error polling {workId}: {e}")
+            return
+        if response.status_code == 200:
+            try:
+                audio_url = extract_audio_url(response.json())
+            except ValueError:
+                # Not JSON (e.g. a proxy error page); poll again next tick
+                print(f"[DEBUG] Polling {workId} returned no JSON")
+                return
+            if audio_url:
+                self._finish(workId, audio_url)
+        elif not is_transient(response.status_code):
+            print(f"[DEBUG] Polling {workId} failed: {response.status_code}")
+            self._finish(workId, None)
+
+    async def _poll_many(self, workIds):
+        params = {self.multi_id_param: ",".join(workIds)}
+        try:
+            response = await self._blocking(self._get, params)
+        except requests.RequestException as e:
+            print(f"[DEBUG] Error polling batch: {e}")
+            return
+        if response.status_code != 200:
+            if not is_transient(response.status_code):
+                print(f"[DEBUG] Polling batch failed: {response.status_code}")
+                for workId in workIds:
+                    self._finish(workId, None)
+            return
+
+        try:
+            data = response.json()
+        except ValueError:
+            print("[DEBUG] Polling batch returned no JSON")
+            return
+        items = data if isinstance(data, list) else data.get("data") or []
+        for item in items:
+            audio_url = extract_audio_url(item)
+            if audio_url and item.get("workId") in self.pending:
+                self._finish(item["workId"], audio_url)
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            now = time.time()
+            for workId, job in list(self.pending.items()):
+                if now > job.deadline:
+                    print(f"[DEBUG] Song {workId} passed its deadline")
+                    self._finish(workId, None)
+
+            workIds = list(self.pending)
+            if not workIds:
+                continue
+            if self.multi_id_param:
+                batches = [
+                    workIds[i : i + self.multi_id_batch]
+                    for i in range(0, len(workIds), self.multi_id_batch)
+                ]
+                polls = [self._poll_many(batch) for batch in batches]
+            else:
+                polls = [self._poll_one(workId) for workId in workIds]
+            # One bad response must not stop the scheduler
+            for error in await asyncio.gather(*polls, return_exceptions=True):
+                if isinstance(error, Exception):
+                    print(f"[DEBUG] Error in song poll: {error}")
@@ -0,0 +1,156 @@
+# song_library.py
+import json
+import os
+import time
+import uuid
+from threading import Lock
+
+import numpy as np
+
+import http_client
+from text_embedding import cosine_similarities, embed_text
+from tracing import span
+
+# What to do when a close-enough song is already in the library
+POLICY_GENERATE = "generate"  # always generate a new song
+POLICY_REUSE = "reuse"  # serve the cached song and skip generation
+POLICY_REUSE_AND_GENERATE = "reuse_and_generate"  # serve it, generate anyway
+
+
+def song_text(prompt, singer_name, music_genre):
+    return f"{prompt} singer {singer_name} genre {music_genre}"
+
+
+class SongLibrary:
+    """Local store of generated songs with nearest-neighbour lookup
+
+    Each song keeps its audio file, its music details and an embedding of
+    prompt + singer + genre. Lookups only consider songs with the same mood
+    and return the most similar one above `threshold`. The library is kept
+    under `max_bytes` and `max_age_days` by evicting the least recently
+    played songs first.
+    """
+
+    def __init__(
+        self,
+        root=".song_library",
+        policy=POLICY_GENERATE,
+        threshold=0.8,
+        max_bytes=500 * 1024 * 1024,
+        max_age_days=30,
+    ):
+        if policy not in (POLICY_GENERATE, POLICY_REUSE, POLICY_REUSE_AND_GENERATE):
+            raise ValueError(f"Unknown song library policy: {policy}")
+        self.root = root
+        self.policy = policy
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self.lock = Lock()
+        self.index_path = os.path.join(root, "index.json")
+        self.vectors_path = os.path.join(root, "vectors.npy")
+
+        os.makedirs(root, exist_ok=True)
+        self.entries = []
+        self.vectors = np.zeros((0, 512), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as index_file:
+                self.entries = json.load(index_file)
+            self.vectors = np.load(self.vectors_path)
+            if len(self.vectors) != len(self.entries):
+                raise ValueError("index and vectors are out of sync")
+        except (OSError, ValueError) as e:
+            print(f"[DEBUG] Could not load song library, starting empty: {e}")
+            self.entries = []
+            self.vectors = np.zeros((0, 512), dtype=np.float32)
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(tmp_path, self.index_path)
+        with open(self.vectors_path + ".tmp", "wb") as vectors_file:
+            np.save(vectors_file, self.vectors)
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+
+    def lookup(self, mood, prompt, singer_name, music_genre):
+        """Return (entry, similarity) for the closest song, or (None, score)"""
+        vector = embed_text(song_text(prompt, singer_name, music_genre))
+        with self.lock:
+            scores = cosine_similarities(self.vectors, vector)
+            best, best_score = None, 0.0
+            for i, entry in enumerate(self.entries):
+                if entry["mood"] == mood and scores[i] > best_score:
+                    best, best_score = entry, float(scores[i])
+
+            if best is None or best_score < self.threshold:
+                return None, best_score
+            best["last_used"] = time.time()
+            best["plays"] = best.get("plays", 0) + 1
+            self._save()
+        print(f"[DEBUG] Song library hit ({round(best_score, 3)}): {best['prompt']}")
+        return dict(best), best_score
+
+    def add(self, mood, prompt, singer_name, music_genre, audio_url, audio_bytes=None):
+        """Download (unless given) and store a generated song"""
+        if audio_bytes is None:
+            with span("song_download"):
+                response = http_client.get(audio_url, timeout=(5, 60))
+                response.raise_for_status()
+            audio_bytes = response.content
+
+        song_id = uuid.uuid4().hex
+        audio_path = os.path.join(self.root, song_id + ".mp3")
+        with open(audio_path, "wb") as audio_file:
+            audio_file.write(audio_bytes)
+
+        now = time.time()
+        entry = {
+            "id": song_id,
+            "mood": mood,
+            "prompt": prompt,
+            "singer_name": singer_name,
+            "music_genre": music_genre,
+            "audio_url": audio_url,
+            "audio_path": audio_path,
+            "size": len(audio_bytes),
+            "created": now,
+            "last_used": now,
+            "plays": 0,
+        }
+        vector = embed_text(song_text(prompt, singer_name, music_genre))
+        with self.lock:
+            self.entries.append(entry)
+            self.vectors = np.vstack([self.vectors, vector[np.newaxis, :]])
+            self._evict()
+            self._save()
+        return entry
+
+    def _evict(self):
+        """Drop expired songs, then least recently used until under max_bytes"""
+        now = time.time()
+        keep = [
+            i
+            for i, entry in enumerate(self.entries)
+            if now - entry["created"] <= self.max_age
+        ]
+        total = sum(self.entries[i]["size"] for i in keep)
+        keep.sort(key=lambda i: self.entries[i]["last_used"])
+        while total > self.max_bytes and len(keep) > 1:
+            total -= self.entries[keep.pop(0)]["size"]
+
+        keep = set(keep)
+        for i, entry in enumerate(self.entries):
+            if i not in keep:
+                try:
+                    os.remove(entry["audio_path"])
+                except OSError:
+                    pass
+        order = [i for i in range(len(self.entries)) if i in keep]
+        self.entries = [self.entries[i] for i in order]
+        self.vectors = self.vectors[order]
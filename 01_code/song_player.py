@@ -0,0 +1,157 @@
+# song_player.py
+import os
+import queue
+import shutil
+import subprocess
+import time
+from threading import Thread
+
+import http_client
+from audio_player import PCMPlayer
+from tracing import span, traced, tracer
+
+
+class StreamingSongPlayer:
+    """Downloads, decodes and plays a song at the same time
+
+    The MP3 is read from the URL in chunks and piped into an ffmpeg decoder
+    (the same binary pydub uses), whose PCM output feeds a PCMPlayer. Output
+    starts once `jitter_buffer_ms` of audio is decoded. The download-to-decode
+    queue is bounded, so memory stays flat however long the song is.
+    """
+
+    def __init__(
+        self,
+        sample_rate=44100,
+        jitter_buffer_ms=500,
+        drain_timeout=10,
+        chunk_size=16 * 1024,
+        max_queued_chunks=32,
+        ffmpeg=None,
+        audio=None,
+    ):
+        self.sample_rate = sample_rate
+        self.jitter_buffer_bytes = int(sample_rate * 2 * jitter_buffer_ms / 1000)
+        # Slack beyond the buffered audio before giving up on a stuck device
+        self.drain_timeout = drain_timeout
+        self.chunk_size = chunk_size
+        self.max_queued_chunks = max_queued_chunks
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg") or "ffmpeg"
+        # Output device (a PyAudio instance); opened on first play when None
+        self.audio = audio
+        self.time_to_first_sample = None
+
+    def _download(self, audio_url, chunks, on_audio=None):
+        """Fetch the song in chunks; blocks when the decoder falls behind
+
+        If on_audio is given, the downloaded file is also kept and passed to
+        it once complete, so the caller doesn't have to fetch it again.
+        """
+        received = None
+        try:
+            with span("song_download"):
+                if os.path.exists(audio_url):
+                    # A song served from the local song library
+                    with open(audio_url, "rb") as audio_file:
+                        for chunk in iter(
+                            lambda: audio_file.read(self.chunk_size), b""
+                        ):
+                            chunks.put(chunk)
+                    return
+                received = bytearray() if on_audio else None
+                with http_client.get(audio_url, stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(self.chunk_size):
+                        chunks.put(chunk)
+                        if received is not None:
+                            received.extend(chunk)
+        except Exception as e:
+            print(f"An error occurred while downloading the song: {str(e)}")
+            received = None
+        finally:
+            chunks.put(None)
+        # After the end marker, so storing doesn't hold up the decoder
+        if received:
+            on_audio(bytes(received))
+
+    def _feed_decoder(self, chunks, decoder):
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                decoder.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            decoder.stdin.close()
+
+    @traced("song_playback")
+    def play(self, audio_url, on_audio=None):
+        """Stream and play the song; returns True if anything was played"""
+        start_time = time.time()
+        self.time_to_first_sample = None
+        chunks = queue.Queue(maxsize=self.max_queued_chunks)
+        decoder = subprocess.Popen(
+            [
+                self.ffmpeg,
+                "-loglevel",
+                "error",
+                "-i",
+                "pipe:0",
+                "-f",
+                "s16le",
+                "-ac",
+                "1",
+                "-ar",
+                str(self.sample_rate),
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        Thread(
+            target=self._download, args=(audio_url, chunks, on_audio), daemon=True
+        ).start()
+        Thread(target=self._feed_decoder, args=(chunks, decoder), daemon=True).start()
+
+        player = PCMPlayer(self.sample_rate, audio=self.audio)
+        played = False
+        try:
+            # Fill the jitter buffer before opening the output stream
+            prebuffer = bytearray()
+            while len(prebuffer) < self.jitter_buffer_bytes:
+                data = decoder.stdout.read1(self.chunk_size)
+                if not data:
+                    break
+                prebuffer.extend(data)
+            if not prebuffer:
+                print("No audio could be decoded from the song URL.")
+                return False
+
+            player.feed(prebuffer)
+            player.start()
+            self.time_to_first_sample = time.time() - start_time
+            tracer.record("song_first_sample", self.time_to_first_sample)
+            played = True
+
+            # Keep the player topped up; pause reading while it has plenty
+            while True:
+                data = decoder.stdout.read1(self.chunk_size)
+                if not data:
+                    break
+                while len(player.buffer) > 4 * self.jitter_buffer_bytes:
+                    time.sleep(0.05)
+                player.feed(data)
+        finally:
+            player.finish()
+            if played:
+                if not player.wait(player.buffered_seconds() + self.drain_timeout):
+                    print("[DEBUG] Song playback did not drain, closing the stream")
+            else:
+                player.close()
+            decoder.stdout.close()
+            if decoder.poll() is None:
+                decoder.kill()
+            decoder.wait()
+        return played
@@ -0,0 +1,169 @@
+# speculative_song.py
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+
+from prompt_engineering import build_user_context, generate_music_details
+from song_generator import build_description_prompt
+from text_embedding import embed_text, tokenize
+
+
+class SpeculationStats:
+    """Running hit/miss counts for speculative songs, kept across runs"""
+
+    OUTCOMES = ("hit", "miss", "not_ready")
+
+    def __init__(self, path=".speculation_stats.json"):
+        self.path = path
+        self.lock = Lock()
+        self.counts = {outcome: 0 for outcome in self.OUTCOMES}
+        self.seconds_saved = 0.0
+        if path and os.path.exists(path):
+            try:
+                with open(path) as stats_file:
+                    data = json.load(stats_file)
+                self.counts.update(data.get("counts", {}))
+                self.seconds_saved = data.get("seconds_saved", 0.0)
+            except (OSError, ValueError) as e:
+                print(f"[DEBUG] Could not load speculation stats: {e}")
+
+    def record(self, outcome, seconds_saved=0.0):
+        with self.lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.seconds_saved += seconds_saved
+            if self.path:
+                try:
+                    with open(self.path, "w") as stats_file:
+                        json.dump(
+                            {"counts": self.counts, "seconds_saved": self.seconds_saved},
+                            stats_file,
+                        )
+                except OSError as e:
+                    print(f"[DEBUG] Could not save speculation stats: {e}")
+
+    def hit_rate(self):
+        """Share of submitted speculative songs that were kept"""
+        submitted = self.counts["hit"] + self.counts["miss"]
+        return self.counts["hit"] / submitted if submitted else 0.0
+
+
+class SpeculativeSong:
+    """Submits the song from the mood and a partial transcript
+
+    offer() is called with every partial transcript; once the mood is known
+    and at least `min_words` have been heard, the music details are derived
+    and the Udio job is submitted in the background. resolve() compares that
+    speculative context with the final transcript: if the embedding distance
+    is within `divergence_threshold` (and the mood matches) the running job
+    is kept, otherwise it is dropped so the caller can submit a new one.
+    resolve() never waits for a speculation still deriving its details; that
+    one is cancelled before it submits, so no unawaited job is paid for.
+    """
+
+    def __init__(
+        self,
+        song_tracker,
+        open_ai_key,
+        divergence_threshold=0.5,
+        min_words=8,
+        stats=None,
+    ):
+        self.song_tracker = song_tracker
+        self.open_ai_key = open_ai_key
+        self.divergence_threshold = divergence_threshold
+        self.min_words = min_words
+        self.stats = stats or SpeculationStats()
+        self.lock = Lock()
+        self.thread = None
+        self.cancelled = None
+        self.job = None
+
+    def offer(self, detected_mood, transcript):
+        """Start the speculative job if it has not started and enough is known"""
+        if self.thread is not None or not detected_mood:
+            return
+        if len(tokenize(transcript or "")) < self.min_words:
+            return
+        print(f"[DEBUG] Speculatively starting song from: {transcript}")
+        # Each speculation gets its own flag, so a stale one stays cancelled
+        self.cancelled = Event()
+        self.thread = Thread(
+            target=self._submit,
+            args=(detected_mood, transcript, self.cancelled),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def _submit(self, detected_mood, transcript, cancelled):
+        try:
+            details = generate_music_details(
+                build_user_context(detected_mood, transcript),
+                self.open_ai_key,
+                detected_mood,
+                transcript,
+            )
+            if not all(details):
+                print("[DEBUG] Speculative music details were incomplete")
+                return
+            # Held across the submit so resolve() either sees the job or
+            # cancels before it exists
+            with self.lock:
+                if cancelled.is_set():
+                    print("[DEBUG] Speculation resolved first, not submitting")
+                    return
+                work_id = self.song_tracker.submit(
+                    details[0], build_description_prompt(*details)
+                )
+                if not work_id:
+                    return
+                self.job = {
+                    "mood": detected_mood,
+                    "transcript": transcript,
+                    "details": details,
+                    "work_id": work_id,
+                    "submitted": time.time(),
+                }
+        except Exception as e:
+            print(f"[DEBUG] Speculative song submission failed: {e}")
+
+    def divergence(self, job, detected_mood, user_text):
+        """0 for the same context, up to 1 for unrelated text or another mood"""
+        if job is None or job["mood"] != detected_mood:
+            return 1.0
+        similarity = float(embed_text(job["transcript"]) @ embed_text(user_text))
+        return 1.0 - similarity
+
+    def resolve(self, detected_mood, user_text):
+        """Return {"details", "work_id"} of a job worth keeping, or None
+
+        Doesn't wait: a speculation that hasn't submitted yet is cancelled
+        and counts as not_ready. Afterwards offer() can start a new one.
+        """
+        with self.lock:
+            if self.cancelled is not None:
+                self.cancelled.set()
+            self.thread = None
+            self.cancelled = None
+            job, self.job = self.job, None
+        if job is None:
+            self.stats.record("not_ready")
+            return None
+
+        divergence = self.divergence(job, detected_mood, user_text)
+        if divergence > self.divergence_threshold:
+            # Udio has no cancel endpoint; the job is simply no longer awaited
+            print(
+                f"[DEBUG] Speculative song dropped (divergence {round(divergence, 3)})"
+            )
+            self.stats.record("miss")
+            return None
+
+        seconds_saved = time.time() - job["submitted"]
+        self.stats.record("hit", seconds_saved)
+        print(
+            f"[DEBUG] Speculative song kept (divergence {round(divergence, 3)}, "
+            f"{round(seconds_saved, 2)}s head start, "
+            f"hit rate {round(self.stats.hit_rate(), 2)})"
+        )
+        return {"details": job["details"], "work_id": job["work_id"]}
@@ -1,58 +1,104 @@
 import speech_recognition as sr
 import os
 import time
+from audio_bus import get_audio_bus
+from vad import EnergyVAD, Endpointer
+from streaming_stt import GoogleBackend, StreamingRecognizer
+from tracing import traced
 
 
 class SpeechToText:
-    def __init__(self):
+    def __init__(self, audio_bus=None, hangover_ms=400, min_speech_ms=150):
         self.recognizer = sr.Recognizer()
+        # Read from the shared microphone stream instead of opening our own
+        self.audio_bus = audio_bus or get_audio_bus()
 
+        # One VAD per session; its noise floor keeps adapting between calls
+        self.vad = EnergyVAD(sample_rate=self.audio_bus.sample_rate)
+        self.endpointer = Endpointer(
+            self.vad, min_speech_ms=min_speech_ms, hangover_ms=hangover_ms
+        )
+        self.streaming_recognizer = None
+
+    def listen_for_utterance(self, reader=None, start_timeout=5, total_time_limit=20):
+        """Record one utterance, ending shortly after the user stops talking.
+
+        Returns the int16 samples of the utterance, or None if nobody spoke
+        within start_timeout seconds.
+        """
+        if self.vad.noise_floor is None:
+            # Calibrate once per session from the shared stream
+            self.vad.seed(self.audio_bus.calibrate())
+
+        reader = reader or self.audio_bus.reader()
+        self.endpointer.reset()
+        start_time = time.time()
+
+        while time.time() - start_time < total_time_limit:
+            frame = reader.read_array(self.vad.frame_size, timeout=1.0)
+            if len(frame) < self.vad.frame_size:
+                continue
+
+            event = self.endpointer.process(frame)
+            if event == "start":
+                print("Speech detected, recording...")
+            elif event == "end":
+                print("End of speech detected.")
+                return self.endpointer.utterance()
+            elif (
+                not self.endpointer.in_speech
+                and time.time() - start_time > start_timeout
+            ):
+                # Timeout waiting for user input
+                print("No input detected.")
+                return None
+
+        # Hit the overall limit mid-sentence; use what we have
+        if self.endpointer.in_speech:
+            return self.endpointer.utterance()
+        return None
+
+    def to_audio_data(self, samples):
+        """Wrap int16 samples from the bus as speech_recognition AudioData"""
+        return sr.AudioData(
+            samples.tobytes(),
+            sample_rate=self.audio_bus.sample_rate,
+            sample_width=self.audio_bus.sample_width,
+        )
+
+    @traced("stt")
     def get_user_text(self):
         """Get speech input from user and convert to text."""
         try:
-            with sr.Microphone() as source:
-                print("Please speak now...")
-                self.recognizer.adjust_for_ambient_noise(source)
-
-                # Set a limit for how long to listen in total
-                total_time_limit = 20  # seconds
-                chunks = []  # List to hold chunks of speech
-                start_time = time.time()
-
-                while time.time() - start_time < total_time_limit:
-                    try:
-                        # Listen for a chunk
-                        audio_data = self.recognizer.listen(source, timeout=5)
-                        chunks.append(audio_data)  # Store the audio chunk
-                        print("Chunk recorded. Speak more or stop.")
-                    except sr.WaitTimeoutError:
-                        # Timeout waiting for user input
-                        print("No input detected. Please continue speaking or stop.")
-                        break
-                    except Exception as e:
-                        print(f"An error occurred while listening: {e}")
-                        break
-
-                if chunks:
-                    # Create a combined audio object from the chunks
-                    combined_audio_data = b"".join(
-                        chunk.get_raw_data() for chunk in chunks
-                    )
-                    combined_audio = sr.AudioData(
-                        combined_audio_data,
-                        sample_rate=chunks[0].sample_rate,
-                        sample_width=chunks[0].sample_width,
-                    )
-
-                    # Recognize speech in the combined audio
-                    text = self.recognizer.recognize_google(combined_audio)
-                    return text
-                else:
-                    print("No audio chunks were recorded.")
-                    return None
-        except AssertionError as e:
-            print(f"Error adjusting ambient noise: {e}")
+            print("Please speak now...")
+            samples = self.listen_for_utterance()
+            if samples is None or len(samples) == 0:
+                print("No audio chunks were recorded.")
+                return None
+
+            # Recognize speech in the recorded utterance
+            text = self.recognizer.recognize_google(self.to_audio_data(samples))
+            return text
+        except sr.UnknownValueError:
+            print("Could not understand the recorded audio.")
             return None
         except Exception as e:
             print(f"An error occurred: {e}")
             return None
+
+    @traced("stt")
+    def stream_user_text(self, on_partial=None, backend=None):
+        """Like get_user_text, but recognizes each phrase while recording the next"""
+        try:
+            if self.streaming_recognizer is None:
+                self.streaming_recognizer = StreamingRecognizer(
+                    self.audio_bus,
+                    backend=backend or GoogleBackend(self.recognizer),
+                    vad=self.vad,
+                )
+            print("Please speak now...")
+            text = self.streaming_recognizer.recognize(on_partial=on_partial)
+            return text or None
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return None
@@ -0,0 +1,202 @@
+# stage_graph.py
+import asyncio
+import time
+
+from tracing import tracer
+
+# Marker for stages without a fallback value (None is a valid fallback)
+NO_FALLBACK = object()
+
+
+class StageSkipped(Exception):
+    """Raised for a stage whose inputs failed without a fallback"""
+
+
+class Stage:
+    """One node of the pipeline: a function plus the stages it needs
+
+    The function is called with the results of `inputs` as keyword
+    arguments. Blocking functions run on a worker thread, coroutine
+    functions on the event loop. If the stage fails or exceeds `timeout`,
+    `fallback` is used as its result when given; otherwise every stage
+    depending on it is skipped. `on_cancel` is called when the stage is
+    abandoned so a blocking function can be told to stop. A stage with no
+    function is external: its result is supplied through StageGraph.resolve().
+    """
+
+    def __init__(
+        self,
+        name,
+        func=None,
+        inputs=(),
+        timeout=None,
+        fallback=NO_FALLBACK,
+        on_cancel=None,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.timeout = timeout
+        self.fallback = fallback
+        self.on_cancel = on_cancel
+
+
+class StageGraph:
+    """Runs stages as soon as their inputs are ready, as concurrently as possible"""
+
+    def __init__(self):
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+        self.loop = None
+        self.futures = {}
+
+    def add(self, stage):
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage: {stage.name}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def _check(self):
+        for stage in self.stages.values():
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError(f"Stage {stage.name} needs unknown stage {name}")
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def result(self, name, default=None):
+        """Result of a finished stage; safe to call from any thread"""
+        return self.results.get(name, default)
+
+    def resolve(self, name, value):
+        """Supply the result of an external stage; safe to call from any thread"""
+        future = self.futures.get(name)
+        if future is None or self.loop is None:
+            return
+
+        def set_result():
+            if not future.done():
+                future.set_result(value)
+
+        self.loop.call_soon_threadsafe(set_result)
+
+    async def _call(self, stage, kwargs):
+        if stage.func is None:
+            return await self.futures[stage.name]
+        if asyncio.iscoroutinefunction(stage.func):
+            return await stage.func(**kwargs)
+        return await self.loop.run_in_executor(None, lambda: stage.func(**kwargs))
+
+    async def _run_stage(self, stage, tasks):
+        try:
+            kwargs = {}
+            for name in stage.inputs:
+                try:
+                    kwargs[name] = await tasks[name]
+                except Exception:
+                    raise StageSkipped(f"input {name} failed")
+        except StageSkipped as e:
+            self.errors[stage.name] = e
+            print(f"[DEBUG] Stage {stage.name} skipped: {e}")
+            raise
+
+        start_time = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._call(stage, kwargs), stage.timeout)
+        except asyncio.CancelledError:
+            if stage.on_cancel:
+                stage.on_cancel()
+            raise
+        except Exception as e:
+            if stage.on_cancel:
+                stage.on_cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                e = asyncio.TimeoutError(f"timed out after {stage.timeout}s")
+            self.errors[stage.name] = e
+            if stage.fallback is NO_FALLBACK:
+                print(f"[DEBUG] Stage {stage.name} failed: {e!r}")
+                self.timings[stage.name] = (start_time, time.perf_counter())
+                tracer.record(
+                    f"pipeline_{stage.name}",
+                    time.perf_counter() - start_time,
+                    error=type(e).__name__,
+                )
+                raise
+            print(f"[DEBUG] Stage {stage.name} fell back after: {e!r}")
+            result = stage.fallback
+        self.timings[stage.name] = (start_time, time.perf_counter())
+        tracer.record(
+            f"pipeline_{stage.name}",
+            time.perf_counter() - start_time,
+            error=type(self.errors[stage.name]).__name__
+            if stage.name in self.errors
+            else None,
+        )
+        self.results[stage.name] = result
+        return result
+
+    async def run(self):
+        """Run every stage; returns the results of those that finished"""
+        self._check()
+        self.loop = asyncio.get_running_loop()
+        self.results, self.errors, self.timings = {}, {}, {}
+        self.futures = {
+            name: self.loop.create_future()
+            for name, stage in self.stages.items()
+            if stage.func is None
+        }
+        self.start_time = time.perf_counter()
+
+        tasks = {}
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.ensure_future(self._run_stage(stage, tasks))
+        try:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self.end_time = time.perf_counter()
+        return self.results
+
+    def critical_path(self):
+        """Chain of stages that decided when the last stage finished"""
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [name]
+        while True:
+            finished = [n for n in self.stages[name].inputs if n in self.timings]
+            if not finished:
+                break
+            name = max(finished, key=lambda n: self.timings[n][1])
+            path.append(name)
+        return path[::-1]
+
+    def print_report(self):
+        print("[DEBUG] Stage timings (start -> end, seconds from pipeline start):")
+        for name, (start, end) in sorted(self.timings.items(), key=lambda t: t[1][0]):
+            status = "ok"
+            if name in self.errors:
+                status = "fallback" if name in self.results else "failed"
+            print(
+                f"  {name:<14} {start - self.start_time:7.2f} -> "
+                f"{end - self.start_time:7.2f}  ({end - start:.2f}s, {status})"
+            )
+        path = self.critical_path()
+        if path:
+            print("[DEBUG] Critical path:", " -> ".join(path))
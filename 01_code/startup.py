@@ -0,0 +1,160 @@
+# startup.py
+import builtins
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Event, Lock, Thread, current_thread, local
+
+
+class ImportTimer:
+    """Times every first import made while installed
+
+    Wraps builtins.__import__ and keeps a per-thread stack, so each module
+    gets its inclusive time and its self time (excluding the modules it
+    imported in turn). Relative imports are counted in their parent.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.lock = Lock()
+        self.stacks = local()
+        self.original = None
+
+    def install(self):
+        if self.original is None:
+            self.original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self.original is not None:
+            builtins.__import__ = self.original
+            self.original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self.original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self.stacks, "stack", None)
+        if stack is None:
+            stack = self.stacks.stack = []
+        start_time = time.perf_counter()
+        stack.append(0.0)
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            children = stack.pop()
+            elapsed = time.perf_counter() - start_time
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.times.setdefault(name, (elapsed, elapsed - children))
+
+    def by_package(self):
+        """Total self time per top-level package, slowest first"""
+        totals = defaultdict(float)
+        with self.lock:
+            for name, (_, self_time) in self.times.items():
+                totals[name.split(".")[0]] += self_time
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+class StartupProfiler:
+    """Records import and init time from process start to the first session
+
+    Enabled with STARTUP_PROFILE=1. Entry points import this module first
+    so every later import is timed, wrap component construction in phase(),
+    and call report() once they are ready to serve.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.lock = Lock()
+        self.import_timer = ImportTimer() if enabled else None
+        if self.import_timer:
+            self.import_timer.install()
+
+    @contextmanager
+    def phase(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                with self.lock:
+                    self.phases.append(
+                        (
+                            name,
+                            start_time - self.start_time,
+                            time.perf_counter() - start_time,
+                            current_thread().name,
+                        )
+                    )
+
+    def report(self, top=15):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.start_time
+        print(f"[DEBUG] Startup profile: ready after {total:.2f}s")
+        print("[DEBUG] Import time by package (self time, seconds):")
+        for package, seconds in self.import_timer.by_package()[:top]:
+            print(f"  {package:<24} {seconds:7.3f}")
+        print("[DEBUG] Init phases (start offset, duration, thread):")
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        for name, offset, seconds, thread in phases:
+            print(f"  {name:<32} {offset:7.2f} {seconds:7.3f}  {thread}")
+
+
+profiler = StartupProfiler(enabled=os.getenv("STARTUP_PROFILE") == "1")
+
+
+class BackgroundLoader:
+    """Builds an expensive object on a daemon thread; get() waits for it
+
+    Importing and initialising heavy components (DeepFace/TensorFlow,
+    OpenCV, the camera) can overlap with calibration and the user speaking.
+    If start() was never called, get() builds the object on first use.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.done = Event()
+        self.value = None
+        self.error = None
+        self.thread = None
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(
+                    target=self._load, name=f"load-{self.name}", daemon=True
+                )
+                self.thread.start()
+        return self
+
+    def _load(self):
+        try:
+            with profiler.phase(self.name):
+                self.value = self.factory()
+        except Exception as e:
+            self.error = e
+            print(f"[DEBUG] Could not load {self.name}: {e}")
+        finally:
+            self.done.set()
+
+    def ready(self):
+        return self.done.is_set() and self.error is None
+
+    def get(self, timeout=None):
+        self.start()
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"{self.name} is still loading")
+        if self.error is not None:
+            raise self.error
+        return self.value
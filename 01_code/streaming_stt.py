@@ -0,0 +1,170 @@
+# streaming_stt.py
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import speech_recognition as sr
+
+from tracing import span
+from vad import EnergyVAD, Endpointer
+
+
+class RecognitionBackend:
+    """Turns one segment of int16 samples into text"""
+
+    def recognize(self, samples, sample_rate):
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognitionBackend):
+    """speech_recognition's Google Web Speech API"""
+
+    def __init__(self, recognizer=None, sample_width=2):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.sample_width = sample_width
+
+    def recognize(self, samples, sample_rate):
+        audio = sr.AudioData(samples.tobytes(), sample_rate, self.sample_width)
+        try:
+            return self.recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            return ""
+
+
+class StandInBackend(RecognitionBackend):
+    """Offline backend returning scripted transcripts after a fixed delay"""
+
+    def __init__(self, transcripts=None, delay=0.3):
+        self.transcripts = list(transcripts or [])
+        self.delay = delay
+        self.calls = 0
+
+    def recognize(self, samples, sample_rate):
+        time.sleep(self.delay)
+        self.calls += 1
+        if self.transcripts:
+            return self.transcripts.pop(0)
+        return f"segment {self.calls} ({round(len(samples) / sample_rate, 2)} s)"
+
+
+class StreamingRecognizer:
+    """Recognizes phrase segments while the user is still speaking
+
+    The endpointer cuts the audio into phrases on short pauses. Each phrase is
+    sent to the backend on a worker thread as soon as it ends, so recognition
+    overlaps with recording of the next one. The message is over once no new
+    phrase starts within `end_silence_ms`.
+    """
+
+    def __init__(
+        self,
+        audio_bus,
+        backend=None,
+        vad=None,
+        segment_hangover_ms=300,
+        end_silence_ms=1200,
+        max_workers=2,
+    ):
+        self.audio_bus = audio_bus
+        self.backend = backend or GoogleBackend()
+        self.vad = vad or EnergyVAD(sample_rate=audio_bus.sample_rate)
+        self.endpointer = Endpointer(self.vad, hangover_ms=segment_hangover_ms)
+        self.end_silence_frames = max(1, end_silence_ms // self.vad.frame_ms)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _recognize_segment(self, samples, sample_rate):
+        with span("stt_segment", audio_seconds=round(len(samples) / sample_rate, 2)):
+            return self.backend.recognize(samples, sample_rate)
+
+    def stream(self, reader=None, start_timeout=5, total_time_limit=20):
+        """Yield {"type": "partial" | "final", "text": ...} events in order
+
+        Partial events carry the text of one phrase plus the transcript so far;
+        the last event is always a final with the full transcript.
+        """
+        if self.vad.noise_floor is None:
+            self.vad.seed(self.audio_bus.calibrate())
+
+        reader = reader or self.audio_bus.reader()
+        self.endpointer.reset()
+        futures = []
+        texts = []
+        silence_frames = 0
+        start_time = time.time()
+
+        def completed():
+            # Emit finished segments strictly in recording order
+            while len(texts) < len(futures) and futures[len(texts)].done():
+                text = self._result(futures[len(texts)])
+                texts.append(text)
+                yield {
+                    "type": "partial",
+                    "segment": len(texts) - 1,
+                    "text": text,
+                    "transcript": join(texts),
+                }
+
+        while time.time() - start_time < total_time_limit:
+            yield from completed()
+
+            frame = reader.read_array(self.vad.frame_size, timeout=1.0)
+            if len(frame) < self.vad.frame_size:
+                continue
+
+            event = self.endpointer.process(frame)
+            if event == "end":
+                segment = self.endpointer.utterance()
+                futures.append(
+                    self.executor.submit(
+                        self._recognize_segment, segment, self.audio_bus.sample_rate
+                    )
+                )
+                print(f"[DEBUG] Phrase {len(futures)} sent for recognition")
+                self.endpointer.reset()
+                silence_frames = 0
+            elif not self.endpointer.in_speech:
+                silence_frames += 1
+                if futures and silence_frames >= self.end_silence_frames:
+                    break
+                if not futures and time.time() - start_time > start_timeout:
+                    print("No input detected.")
+                    break
+
+        # Flush a phrase cut off by the overall time limit
+        if self.endpointer.in_speech:
+            futures.append(
+                self.executor.submit(
+                    self._recognize_segment,
+                    self.endpointer.utterance(),
+                    self.audio_bus.sample_rate,
+                )
+            )
+
+        wait(futures)
+        yield from completed()
+        yield {"type": "final", "text": join(texts)}
+
+    def recognize(self, on_partial=None, on_final=None, **kwargs):
+        """Callback flavour of stream(); returns the final transcript"""
+        final_text = ""
+        for event in self.stream(**kwargs):
+            if event["type"] == "partial" and on_partial:
+                on_partial(event)
+            elif event["type"] == "final":
+                final_text = event["text"]
+                if on_final:
+                    on_final(final_text)
+        return final_text
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"[DEBUG] Error recognizing phrase: {e}")
+            return ""
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def join(texts):
+    return " ".join(text for text in texts if text).strip()
@@ -0,0 +1,69 @@
+# test_response_cache.py
+from response_cache import ResponseCache
+
+
+def test_exact_match_ignores_case_and_punctuation(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    cache.put("reply", None, "I'm tired!", "Get some rest.")
+
+    assert cache.get("reply", None, "im TIRED") == "Get some rest."
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_similar_match_when_only_filler_words_differ(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    cache.put("reply", None, "I'm so tired today", "Get some rest.")
+
+    assert cache.get("reply", None, "I'm tired today") == "Get some rest."
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_one_changed_word_in_a_long_utterance_is_a_miss(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    praised = (
+        "I had such a long day at work today but my boss praised me in front "
+        "of everyone"
+    )
+    yelled = praised.replace("praised", "yelled at")
+    cache.put("reply", None, praised, "Congratulations on the praise!")
+
+    assert cache.get("reply", None, yelled) is None
+
+
+def test_negation_and_mood_are_misses(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+    cache.put("reply", None, "I'm tired", "Get some rest.")
+    cache.put("music_details", "sad", "great day", ["prompt", "singer", "genre"])
+
+    assert cache.get("reply", None, "I'm not tired") is None
+    assert cache.get("music_details", "happy", "great day") is None
+
+
+def test_swapped_roles_are_misses(tmp_path):
+    cache = ResponseCache(root=str(tmp_path), threshold=0.0)
+    cache.put("reply", None, "my friend left me", "That must hurt.")
+    cache.put("reply", None, "my dog bit me", "Ouch, are you okay?")
+
+    assert cache.get("reply", None, "I left my friend") is None
+    assert cache.get("reply", None, "I bit my dog") is None
+    assert cache.get("reply", None, "my friend just left me") == "That must hurt."
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(tmp_path):
+    cache = ResponseCache(root=str(tmp_path), max_entries=2)
+    cache.put("reply", None, "first", "1")
+    cache.put("reply", None, "second", "2")
+    cache.get("reply", None, "first")
+    cache.put("reply", None, "third", "3")
+
+    assert cache.get("reply", None, "second") is None
+    assert cache.get("reply", None, "first") == "1"
+
+    cache.ttl = 0
+    assert cache.get("reply", None, "third") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    ResponseCache(root=str(tmp_path)).put("reply", None, "great day", "Nice!")
+
+    assert ResponseCache(root=str(tmp_path)).get("reply", None, "great day") == "Nice!"
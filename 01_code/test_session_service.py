@@ -0,0 +1,87 @@
+# test_session_service.py
+#
+# Runs session turns against the local OpenAI and Udio stand-ins:
+#
+#   python -m pytest -q test_session_service.py
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+import http_client
+import song_generator
+from latency_model import LatencyModel
+from mood_estimator import MoodAggregator
+from openai_stub_server import OpenAIStubServer
+from session_service import Session, SessionService
+from streaming_stt import StandInBackend
+from udio_stub_server import UdioStubServer
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    from openai import AsyncOpenAI
+
+    openai_stub = OpenAIStubServer(
+        first_token=LatencyModel(0.01), token_interval=0, reply_sentences=2
+    ).start()
+    udio_stub = UdioStubServer(generation_time=1.0).start()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("RESPONSE_CACHE", raising=False)
+    monkeypatch.setenv("OPENAI_BASE_URL", openai_stub.api_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "stand-in")
+    monkeypatch.setattr(http_client, "OPENAI_API_URL", openai_stub.api_url)
+    monkeypatch.setattr(song_generator, "UDIO_API_URL", udio_stub.api_url)
+
+    service = SessionService(
+        "stand-in",
+        "stand-in",
+        host="127.0.0.1",
+        port=0,
+        stt_backend=StandInBackend(delay=0),
+        emotion_engine=object(),
+    ).start()
+    service.client = AsyncOpenAI(base_url=openai_stub.api_url, api_key="stand-in")
+    service.songs.poll_interval = 0.05
+    service.udio_stub = udio_stub
+    yield service
+    service.close()
+    openai_stub.close()
+    udio_stub.close()
+
+
+def open_session(service):
+    session = Session("test", None, MoodAggregator())
+    service.sessions[session.session_id] = session
+    return session
+
+
+def test_second_turn_replaces_the_first_turns_song(service):
+    session = open_session(service)
+    samples = np.zeros(16000, dtype=np.int16)
+
+    service.take_turn(session, samples, 16000)
+    first_song = session.song_task
+    wait_until(lambda: service.udio_stub.requests["generate"] == 1)
+
+    service.take_turn(session, samples, 16000)
+    wait_until(lambda: session.song_status == "done")
+
+    first_job, second_job = list(service.udio_stub.jobs)
+    assert first_song.cancelled()
+    assert second_job in session.audio_url
+    assert not service.songs.pending
+
+    # The first job would be ready by now; it must not overwrite the session
+    time.sleep(1.2)
+    assert second_job in session.audio_url and session.song_status == "done"
+    assert first_job not in service.songs.pending
@@ -0,0 +1,130 @@
+# test_song_job_manager.py
+#
+# Runs SongJobManager against the local Udio stand-in:
+#
+#   python -m pytest -q test_song_job_manager.py
+import asyncio
+import time
+
+import pytest
+
+import song_generator
+from latency_model import LatencyModel
+from song_job_manager import SongJobManager
+from udio_stub_server import UdioStubServer
+
+
+@pytest.fixture
+def stub_factory(monkeypatch):
+    stubs = []
+
+    def start(**options):
+        stub = UdioStubServer(**options).start()
+        monkeypatch.setattr(song_generator, "UDIO_API_URL", stub.api_url)
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.close()
+
+
+def record_polls(manager):
+    """Keep the params of every feed request the manager makes"""
+    polls = []
+    get = manager._get
+
+    def recording_get(params):
+        polls.append(params)
+        return get(params)
+
+    manager._get = recording_get
+    return polls
+
+
+def run(manager, work):
+    async def main():
+        await manager.start()
+        try:
+            return await work()
+        finally:
+            await manager.stop()
+
+    return asyncio.run(main())
+
+
+def submit_all(manager, count):
+    return lambda: asyncio.gather(
+        *(manager.submit(f"prompt {i}", "description") for i in range(count))
+    )
+
+
+def test_polls_each_id_separately(stub_factory):
+    stub = stub_factory(generation_time=0.2, multi_id_param=None)
+    manager = SongJobManager("token", poll_interval=0.05, deadline=5)
+    polls = record_polls(manager)
+
+    urls = run(manager, submit_all(manager, 3))
+
+    assert len(urls) == 3 and all(url.startswith(stub.base_url) for url in urls)
+    assert polls and all(set(params) == {"workId"} for params in polls)
+    assert not manager.pending
+
+
+def test_polls_all_ids_in_one_request(stub_factory):
+    stub = stub_factory(generation_time=0.2)
+    manager = SongJobManager(
+        "token", poll_interval=0.05, deadline=5, multi_id_param="workIds"
+    )
+    polls = record_polls(manager)
+
+    urls = run(manager, submit_all(manager, 3))
+
+    assert len(urls) == 3 and all(url.startswith(stub.base_url) for url in urls)
+    assert all(set(params) == {"workIds"} for params in polls)
+    assert any(len(params["workIds"].split(",")) == 3 for params in polls)
+
+
+def test_caps_songs_in_flight(stub_factory):
+    stub = stub_factory(generation_time=0.5)
+    manager = SongJobManager("token", max_in_flight=2, poll_interval=0.05, deadline=5)
+
+    async def work():
+        songs = asyncio.gather(*(manager.submit(f"p{i}", "d") for i in range(4)))
+        await asyncio.sleep(0.25)
+        submitted_early = stub.requests["generate"]
+        return submitted_early, await songs
+
+    submitted_early, urls = run(manager, work)
+
+    assert submitted_early == 2
+    assert stub.requests["generate"] == 4
+    assert all(urls)
+
+
+def test_gives_up_at_the_deadline(stub_factory):
+    stub_factory(generation_time=30)
+    manager = SongJobManager("token", poll_interval=0.05, deadline=0.3)
+
+    start_time = time.time()
+    urls = run(manager, submit_all(manager, 2))
+
+    assert urls == [None, None]
+    assert time.time() - start_time < 5
+
+
+@pytest.mark.parametrize("multi_id_param", [None, "workIds"])
+def test_permanent_poll_error_fails_the_job(stub_factory, multi_id_param):
+    stub_factory(
+        multi_id_param=multi_id_param,
+        request_latency=LatencyModel(failure_rate=1.0, failure_status=400),
+    )
+    manager = SongJobManager(
+        "token", poll_interval=0.05, deadline=30, multi_id_param=multi_id_param
+    )
+
+    start_time = time.time()
+    audio_url = run(manager, lambda: manager.track("unknown"))
+
+    assert audio_url is None
+    assert time.time() - start_time < 5
@@ -0,0 +1,44 @@
+# text_embedding.py
+import hashlib
+import re
+
+import numpy as np
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def _bucket(feature, dim):
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    # Low bits pick the bucket, one high bit picks the sign
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+def embed_text(text, dim=512):
+    """Hashing-trick embedding of words and character trigrams
+
+    No model download and stable across runs, which is all we need to spot
+    near-duplicate prompts. Returns an L2-normalised float32 vector.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    words = tokenize(text)
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+
+    for feature in features:
+        index, sign = _bucket(feature, dim)
+        vector[index] += sign
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def cosine_similarities(matrix, vector):
+    """Cosine similarity of one normalised vector against normalised rows"""
+    if len(matrix) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return matrix @ vector
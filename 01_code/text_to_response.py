@@ -1,12 +1,18 @@
-from openai import OpenAI
+from http_client import get_openai_client
+from response_cache import get_response_cache
+from tracing import traced, tracer
 import os
+import time
 from dotenv import load_dotenv
 
 
 class TextToResponse:
-    def __init__(self):
+    def __init__(self, cache=None):
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_openai_client()
+        # Earlier replies to the same or similar words (RESPONSE_CACHE=1).
+        # The reply prompt has no mood, so replies are cached without one.
+        self.cache = cache if cache is not None else get_response_cache()
 
     def generate_prompt_for_gpt(self, user_input):
         prompt = (
@@ -18,19 +24,33 @@ class TextToResponse:
         )
         return prompt
 
+    def build_messages(self, user_input):
+        prompt = self.generate_prompt_for_gpt(user_input)
+        return [
+            {
+                "role": "system",
+                "content": "You are an empathetic and friendly AI that responds thoughtfully to user inputs.",
+            },
+            {"role": "user", "content": prompt},
+        ]
+
     def get_gpt_response(self, user_input):
-        """Generate response from GPT based on user input"""
+        """Generate response from GPT based on user input, or reuse a cached one"""
+        if self.cache:
+            cached = self.cache.get("reply", None, user_input)
+            if cached:
+                return cached
+        response = self.request_gpt_response(user_input)
+        if self.cache and response:
+            self.cache.put("reply", None, user_input, response)
+        return response
+
+    @traced("llm_reply")
+    def request_gpt_response(self, user_input):
         try:
-            prompt = self.generate_prompt_for_gpt(user_input)
             response = self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an empathetic and friendly AI that responds thoughtfully to user inputs.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+                messages=self.build_messages(user_input),
                 max_tokens=500,
                 temperature=0.7,
             )
@@ -38,3 +58,39 @@ class TextToResponse:
         except Exception as e:
             print(f"Error generating response: {e}")
             return None
+
+    def stream_gpt_response(self, user_input):
+        """Yield the GPT response token by token as it is generated
+
+        A cached reply is yielded whole; a streamed one is cached once it
+        has finished without errors.
+        """
+        cached = self.cache.get("reply", None, user_input) if self.cache else None
+        if cached:
+            yield cached
+            return
+        start_time = time.perf_counter()
+        first_token = True
+        tokens = []
+        try:
+            stream = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self.build_messages(user_input),
+                max_tokens=500,
+                temperature=0.7,
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        first_token = False
+                        tracer.record(
+                            "llm_reply_first_token", time.perf_counter() - start_time
+                        )
+                    tokens.append(chunk.choices[0].delta.content)
+                    yield tokens[-1]
+            if self.cache and tokens:
+                self.cache.put("reply", None, user_input, "".join(tokens).strip())
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+        tracer.record("llm_reply", time.perf_counter() - start_time)
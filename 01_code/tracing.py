@@ -0,0 +1,289 @@
+# tracing.py
+import bisect
+import json
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+# Histogram bucket bounds in seconds, roughly x2.5 apart from 1 ms to 10 min
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 150.0, 300.0, 600.0,
+)  # fmt: skip
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# The session a span belongs to: a context value where one is set (service
+# turns, asyncio tasks), otherwise the process-wide default (kiosk mode)
+_session_id = ContextVar("session_id", default=None)
+_default_session_id = None
+
+
+def new_session():
+    """Start a new process-wide session and return its ID"""
+    global _default_session_id
+    _default_session_id = uuid.uuid4().hex[:12]
+    return _default_session_id
+
+
+def current_session():
+    return _session_id.get() or _default_session_id
+
+
+@contextmanager
+def session_scope(session_id):
+    """Attribute spans in this context (thread or task) to session_id"""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+class RollingHistogram:
+    """Cumulative Prometheus buckets plus a window of recent samples
+
+    Recording is a bisect and two appends; percentiles are only computed
+    from the window (the last `window` samples) when exported.
+    """
+
+    def __init__(self, window=1024):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds, error=False):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.errors += bool(error)
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        values = sorted(self.recent)
+        if not values:
+            return {}
+        return {
+            q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES
+        }
+
+
+class Tracer:
+    """Collects spans into per-stage histograms and an optional JSONL trace
+
+    Each finished span is one JSON line (stage, session, start, duration,
+    error and attributes) when `trace_path` is set; lines are buffered and
+    flushed every `flush_every` spans. Aggregates can be exported as a JSON
+    snapshot or in Prometheus text format.
+    """
+
+    def __init__(self, trace_path=None, window=1024, flush_every=50):
+        self.trace_path = trace_path
+        self.window = window
+        self.flush_every = flush_every
+        self.histograms = {}
+        self.lock = Lock()
+        self.pending_lines = []
+        self.metrics_server = None
+
+    def record(
+        self, stage, seconds, start=None, error=None, session_id=None, attrs=None
+    ):
+        """Add one finished span
+
+        Attributes come as one dict, so none can clash with these arguments
+        (a span attribute called `seconds`, say).
+        """
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window)
+            histogram.add(seconds, error is not None)
+            if self.trace_path:
+                entry = {
+                    "stage": stage,
+                    "session": session_id or current_session(),
+                    "start": round(
+                        start if start is not None else time.time() - seconds, 6
+                    ),
+                    "duration": round(seconds, 6),
+                }
+                if error is not None:
+                    entry["error"] = error
+                if attrs:
+                    entry["attrs"] = attrs
+                self.pending_lines.append(json.dumps(entry, default=str))
+                if len(self.pending_lines) >= self.flush_every:
+                    self._flush()
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """Time the block as one span of `stage`
+
+        Exceptions are recorded and re-raised.
+        """
+        start_wall = time.time()
+        start_time = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(
+                stage,
+                time.perf_counter() - start_time,
+                start=start_wall,
+                error=error,
+                attrs=attrs,
+            )
+
+    def traced(self, stage):
+        """Decorator form of span()"""
+
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def _flush(self):
+        if not self.pending_lines:
+            return
+        lines, self.pending_lines = self.pending_lines, []
+        try:
+            with open(self.trace_path, "a") as trace_file:
+                trace_file.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"[DEBUG] Could not write trace file: {e}")
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def snapshot(self):
+        """Per-stage count, errors, mean and rolling percentiles in seconds"""
+        with self.lock:
+            stages = {}
+            for stage, histogram in sorted(self.histograms.items()):
+                quantiles = histogram.quantiles()
+                stages[stage] = {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "mean": round(histogram.total / histogram.count, 6),
+                    **{f"p{int(q * 100)}": round(v, 6) for q, v in quantiles.items()},
+                    "max": round(max(histogram.recent), 6),
+                }
+        return {"time": time.time(), "stages": stages}
+
+    def write_snapshot(self, path):
+        """Append the current snapshot as one JSON line"""
+        try:
+            with open(path, "a") as snapshot_file:
+                snapshot_file.write(json.dumps(self.snapshot()) + "\n")
+        except OSError as e:
+            print(f"[DEBUG] Could not write metrics snapshot: {e}")
+
+    def to_prometheus(self, prefix="bobcat_stage"):
+        """Histograms and rolling quantiles in Prometheus text format"""
+        lines = [
+            f"# HELP {prefix}_duration_seconds Time spent per pipeline stage",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        quantile_lines = [
+            f"# HELP {prefix}_duration_quantile_seconds Rolling-window quantiles",
+            f"# TYPE {prefix}_duration_quantile_seconds gauge",
+        ]
+        error_lines = [
+            f"# HELP {prefix}_errors_total Spans that ended in an exception",
+            f"# TYPE {prefix}_errors_total counter",
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                label = f'stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f"{prefix}_duration_seconds_bucket"
+                        f'{{{label},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f"{prefix}_duration_seconds_bucket"
+                    f'{{{label},le="+Inf"}} {histogram.count}'
+                )
+                lines.append(
+                    f"{prefix}_duration_seconds_sum{{{label}}} {histogram.total}"
+                )
+                lines.append(
+                    f"{prefix}_duration_seconds_count{{{label}}} {histogram.count}"
+                )
+                for q, value in histogram.quantiles().items():
+                    quantile_lines.append(
+                        f"{prefix}_duration_quantile_seconds"
+                        f'{{{label},quantile="{q}"}} {value}'
+                    )
+                error_lines.append(
+                    f"{prefix}_errors_total{{{label}}} {histogram.errors}"
+                )
+        return "\n".join(lines + quantile_lines + error_lines) + "\n"
+
+    def print_summary(self):
+        stages = self.snapshot()["stages"]
+        if not stages:
+            return
+        print("[DEBUG] Stage latency (count, p50 / p90 / max seconds):")
+        for stage, stats in stages.items():
+            print(
+                f"  {stage:<24} {stats['count']:5d}  {stats['p50']:8.3f} "
+                f"{stats['p90']:8.3f} {stats['max']:8.3f}"
+            )
+
+    def start_metrics_server(self, port, host="0.0.0.0"):
+        """Serve /metrics for Prometheus scraping on a daemon thread"""
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = tracer.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.metrics_server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=self.metrics_server.serve_forever, daemon=True).start()
+        print(f"[DEBUG] Metrics available on {host}:{port}/metrics")
+        return self.metrics_server
+
+    def close(self):
+        self.flush()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+
+
+tracer = Tracer(trace_path=os.getenv("TRACE_FILE"))
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,128 @@
+# tts_cache.py
+import hashlib
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different inputs share audio"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized audio, in memory and on disk
+
+    Entries are keyed by a hash of (model, voice, format, normalized text).
+    Both tiers are bounded in bytes and evict least recently used entries.
+    """
+
+    def __init__(
+        self,
+        cache_dir=".tts_cache",
+        max_memory_bytes=32 * 1024 * 1024,
+        max_disk_bytes=256 * 1024 * 1024,
+    ):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, model, voice, response_format, text):
+        raw = "\0".join([model, voice, response_format, normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".audio")
+
+    def get(self, key):
+        """Return cached audio bytes or None, refreshing the entry's recency"""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+
+        data = None
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as audio_file:
+                    data = audio_file.read()
+                # Touch the file so disk eviction sees it as recently used
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.cache_dir:
+            # Write a private temp file, then rename, so readers never see a
+            # half-written file and concurrent puts of one key don't collide
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as audio_file:
+                    audio_file.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        with self.lock:
+            if key in self.memory:
+                self.memory_bytes -= len(self.memory.pop(key))
+            self.memory[key] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".audio"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+        }
@@ -0,0 +1,162 @@
+# udio_stub_server.py
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+from latency_model import LatencyModel
+
+
+class UdioStubServer:
+    """Local stand-in for the udioapi.pro generate/feed endpoints
+
+    Point song_generator.UDIO_API_URL (or the UDIO_API_URL env var) at
+    `api_url` to run song generation offline. Songs finish after
+    `generation_time` seconds (+/- `jitter`), and `failure_rate` of feed
+    requests return a 503 to exercise retries. `multi_id_param` enables a
+    batched feed query returning a list. For benchmarks, `generation_model`
+    (a LatencyModel) replaces the uniform generation time, and
+    `request_latency` delays (and optionally fails) every request.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        generation_time=5.0,
+        jitter=0.0,
+        failure_rate=0.0,
+        multi_id_param="workIds",
+        audio_bytes=b"ID3" + b"\0" * 1024,
+        generation_model=None,
+        request_latency=None,
+    ):
+        self.generation_model = generation_model or LatencyModel(
+            generation_time, jitter, "uniform" if jitter else "fixed"
+        )
+        self.request_latency = request_latency or LatencyModel()
+        self.failure_rate = failure_rate
+        self.multi_id_param = multi_id_param
+        self.audio_bytes = audio_bytes
+        self.jobs = {}
+        self.requests = {"generate": 0, "feed": 0, "audio": 0}
+        self.lock = Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if stub.delay_request(self):
+                    stub.handle_post(self)
+
+            def do_GET(self):
+                if stub.delay_request(self):
+                    stub.handle_get(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self.api_url = f"{self.base_url}/api"
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _send_json(self, handler, status, body):
+        data = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def delay_request(self, handler):
+        """Apply request_latency; False if the request was failed instead"""
+        time.sleep(self.request_latency.sample())
+        if self.request_latency.fails():
+            self._send_json(
+                handler, self.request_latency.failure_status, {"error": "try again"}
+            )
+            return False
+        return True
+
+    def feed_item(self, workId):
+        with self.lock:
+            ready_at = self.jobs.get(workId)
+        if ready_at is None:
+            return None
+        if time.time() < ready_at:
+            return {"workId": workId, "type": "processing", "response_data": []}
+        return {
+            "workId": workId,
+            "type": "complete",
+            "response_data": [{"audio_url": f"{self.base_url}/audio/{workId}.mp3"}],
+        }
+
+    def handle_post(self, handler):
+        if urlparse(handler.path).path != "/api/generate":
+            return self._send_json(handler, 404, {"error": "not found"})
+        length = int(handler.headers.get("Content-Length", 0))
+        json.loads(handler.rfile.read(length) or b"{}")
+
+        workId = uuid.uuid4().hex
+        duration = self.generation_model.sample()
+        with self.lock:
+            self.requests["generate"] += 1
+            self.jobs[workId] = time.time() + duration
+        self._send_json(handler, 200, {"workId": workId})
+
+    def handle_get(self, handler):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith("/audio/"):
+            with self.lock:
+                self.requests["audio"] += 1
+            handler.send_response(200)
+            handler.send_header("Content-Type", "audio/mpeg")
+            handler.send_header("Content-Length", str(len(self.audio_bytes)))
+            handler.end_headers()
+            handler.wfile.write(self.audio_bytes)
+            return
+
+        if url.path != "/api/feed":
+            return self._send_json(handler, 404, {"error": "not found"})
+
+        with self.lock:
+            self.requests["feed"] += 1
+        if random.random() < self.failure_rate:
+            return self._send_json(handler, 503, {"error": "try again"})
+
+        if self.multi_id_param and self.multi_id_param in query:
+            workIds = query[self.multi_id_param][0].split(",")
+            items = [self.feed_item(workId) for workId in workIds]
+            return self._send_json(handler, 200, [item for item in items if item])
+
+        item = self.feed_item(query.get("workId", [""])[0])
+        if item is None:
+            return self._send_json(handler, 404, {"error": "unknown workId"})
+        self._send_json(handler, 200, item)
+
+
+if __name__ == "__main__":
+    # Run a stand-in on a fixed port for manual runs:
+    #   UDIO_API_URL=http://127.0.0.1:8766/api python main_song.py
+    stub = UdioStubServer(port=8766).start()
+    print(f"Udio stand-in listening on {stub.api_url}")
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.close()
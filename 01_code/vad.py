@@ -0,0 +1,118 @@
+# vad.py
+import numpy as np
+
+
+class EnergyVAD:
+    """Energy / zero-crossing voice activity detector with an adaptive noise floor
+
+    Works on fixed-size int16 frames (e.g. 30 ms). The noise floor is seeded
+    once per session and then follows the background level during silence,
+    so callers never need to recalibrate between utterances.
+    """
+
+    def __init__(
+        self,
+        sample_rate=16000,
+        frame_ms=30,
+        energy_ratio=2.5,
+        min_energy=60.0,
+        max_zcr=0.35,
+        noise_adapt=0.05,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.noise_adapt = noise_adapt
+        self.noise_floor = None
+
+    def seed(self, noise_rms):
+        """Start the noise floor from a calibration measurement"""
+        self.noise_floor = max(float(noise_rms), 1.0)
+
+    def threshold(self):
+        return max(self.min_energy, (self.noise_floor or 0.0) * self.energy_ratio)
+
+    def is_speech(self, frame):
+        """Classify one frame and keep the noise floor up to date"""
+        samples = frame.astype(np.float32)
+        energy = float(np.sqrt(np.mean(samples**2))) if len(samples) else 0.0
+        signs = np.signbit(samples)
+        zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / max(len(samples), 1)
+
+        if self.noise_floor is None:
+            self.seed(energy)
+
+        # Loud and not hiss-like (hiss has a very high zero-crossing rate)
+        speech = energy > self.threshold() and zcr < self.max_zcr
+        if not speech:
+            self.noise_floor += self.noise_adapt * (energy - self.noise_floor)
+            self.noise_floor = max(self.noise_floor, 1.0)
+        return speech
+
+
+class Endpointer:
+    """Turns a stream of VAD decisions into utterance start/end events
+
+    - `min_speech_ms` of consecutive speech is needed to start an utterance
+    - `hangover_ms` of silence ends it, so short pauses don't cut it off
+    - `pre_roll_ms` of audio before the start is kept so onsets aren't clipped
+    """
+
+    def __init__(
+        self,
+        vad,
+        min_speech_ms=150,
+        hangover_ms=400,
+        pre_roll_ms=200,
+        max_utterance_s=20,
+    ):
+        self.vad = vad
+        self.min_speech_frames = max(1, min_speech_ms // vad.frame_ms)
+        self.hangover_frames = max(1, hangover_ms // vad.frame_ms)
+        self.pre_roll_frames = max(0, pre_roll_ms // vad.frame_ms)
+        self.max_frames = int(max_utterance_s * 1000 / vad.frame_ms)
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.frames = []
+
+    def process(self, frame):
+        """Feed one frame; returns "start", "end" or None"""
+        speech = self.vad.is_speech(frame)
+
+        if not self.in_speech:
+            self.frames.append(frame.copy())
+            self.speech_run = self.speech_run + 1 if speech else 0
+            if self.speech_run >= self.min_speech_frames:
+                self.in_speech = True
+                self.silence_run = 0
+                keep = self.pre_roll_frames + self.speech_run
+                self.frames = self.frames[-keep:]
+                return "start"
+            # Only the pre-roll and the current speech run are worth keeping
+            keep = self.pre_roll_frames + self.speech_run
+            self.frames = self.frames[-keep:] if keep else []
+            return None
+
+        self.frames.append(frame.copy())
+        self.silence_run = 0 if speech else self.silence_run + 1
+        if self.silence_run >= self.hangover_frames:
+            return "end"
+        if len(self.frames) >= self.max_frames:
+            return "end"
+        return None
+
+    def utterance(self):
+        """Audio of the current utterance without the trailing hangover silence"""
+        frames = self.frames
+        if self.silence_run and len(frames) > self.silence_run:
+            frames = frames[: -self.silence_run]
+        if not frames:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(frames)